@@ -0,0 +1,233 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Alert Log
+  Append-only NDJSON alert log with size-based rotation, a
+  sparse offset index and cursor reads, so dashboards fetch
+  only the alerts they have not seen yet
+=============================================================
+
+Layout of the log directory (segment names are the offset of
+their first alert, zero-padded so they sort):
+
+  00000000000000000000.ndjson   alerts 0 .. 51233, one JSON object per line
+  00000000000000000000.idx      sparse index: int64 (offset, byte position) pairs
+  00000000000000051234.ndjson   next segment, started when the last one filled up
+  .lock                         held by the writer appending (uvicorn workers share the log)
+
+Every alert carries its "offset". A poller passes the `next` cursor
+of one read as `since` to the next and never re-reads old alerts.
+"""
+import json
+import os
+import threading
+from bisect import bisect_right
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:          # no flock (Windows): single-process writers only
+    fcntl = None
+
+# Alert JSON key -> run_fraud_detection result column
+ALERT_FIELDS = {
+    'batch_id'         : 'Batch_ID',
+    'product'          : 'Product_Name',
+    'producer'         : 'Producer_Name',
+    'distributor_id'   : 'Distributor_ID',
+    'quantity'         : 'Quantity',
+    'last_location'    : 'Last_Location',
+    'destination'      : 'Expected_Destination',
+    'fraud_probability': 'Fraud_Probability',
+    'alert_level'      : 'Alert_Level',
+    'fraud_types'      : 'Fraud_Types',
+    'alert_timestamp'  : 'Alert_Time',
+}
+
+
+def alerts_frame(results: pd.DataFrame) -> pd.DataFrame:
+    """Flagged rows of a results frame in the alert JSON shape, built column by column."""
+    flagged = results[results['Is_Fraud_Predicted'] == 1]
+    alerts  = pd.DataFrame({key: flagged[col].to_numpy()
+                            for key, col in ALERT_FIELDS.items() if col in flagged})
+    if 'quantity' in alerts:
+        alerts['quantity'] = pd.to_numeric(alerts['quantity']).astype('int64')
+    if 'fraud_probability' in alerts:
+        alerts['fraud_probability'] = alerts['fraud_probability'].astype(float).round(4)
+    if 'fraud_types' in alerts:
+        alerts['fraud_types'] = alerts['fraud_types'].str.split(', ')
+    return alerts
+
+
+class AlertLog:
+    SEGMENT = '.ndjson'
+    INDEX   = '.idx'
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 << 20,
+                 index_interval_bytes: int = 4096, max_segments: int = None, fsync: bool = False):
+        self.directory            = directory
+        self.max_segment_bytes    = max_segment_bytes
+        self.index_interval_bytes = index_interval_bytes
+        self.max_segments         = max_segments      # oldest segments beyond this are deleted
+        self.fsync                = fsync
+        self._lock  = threading.Lock()
+        self._state = None                            # (base, size, next offset) of the active segment
+
+    # ── Files ─────────────────────────────────────────────
+    def _path(self, base: int, suffix: str) -> str:
+        return os.path.join(self.directory, f'{base:020d}{suffix}')
+
+    def _bases(self) -> list:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(n[:-len(self.SEGMENT)]) for n in names if n.endswith(self.SEGMENT))
+
+    def _index(self, base: int) -> np.ndarray:
+        try:
+            return np.fromfile(self._path(base, self.INDEX), dtype=np.int64).reshape(-1, 2)
+        except FileNotFoundError:
+            return np.empty((0, 2), dtype=np.int64)
+
+    def _seek_point(self, base: int, offset: int):
+        """Last indexed (offset, byte position) at or before `offset` in segment `base`."""
+        index = self._index(base)
+        row = np.searchsorted(index[:, 0], offset, side='right') - 1
+        return (int(index[row, 0]), int(index[row, 1])) if row >= 0 else (base, 0)
+
+    @contextmanager
+    def _writer_lock(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, '.lock'), 'a') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    # ── State ─────────────────────────────────────────────
+    def _recover(self, repair: bool = False):
+        """
+        (base, size, next offset) from disk; cheap when only this
+        process writes. With `repair` (writers, under the lock) a torn
+        last line left by a crash is cut off.
+        """
+        bases = self._bases()
+        if not bases:
+            return 0, 0, 0
+        base = bases[-1]
+        path = self._path(base, self.SEGMENT)
+        size = os.path.getsize(path)
+        if self._state is not None and self._state[:2] == (base, size):
+            return self._state
+        offset, pos = self._seek_point(base, 2 ** 62)
+        with open(path, 'rb+' if repair else 'rb') as f:
+            f.seek(pos)
+            tail = f.read()
+            end  = tail.rfind(b'\n') + 1
+            if repair and end < len(tail):
+                f.truncate(pos + end)
+        return base, pos + end, offset + tail.count(b'\n', 0, end)
+
+    @property
+    def next_offset(self) -> int:
+        return self._recover()[2]
+
+    @property
+    def first_offset(self) -> int:
+        bases = self._bases()
+        return bases[0] if bases else 0
+
+    # ── Append ────────────────────────────────────────────
+    def append(self, alerts: pd.DataFrame) -> tuple:
+        """
+        Append alert rows (see alerts_frame); returns the (first, next)
+        offsets written. Cost is proportional to the new alerts only.
+        """
+        if alerts.empty:
+            return (self.next_offset,) * 2
+        with self._writer_lock():
+            base, size, first = self._recover(repair=True)
+            alerts = alerts.reset_index(drop=True)
+            alerts.insert(0, 'offset', np.arange(first, first + len(alerts), dtype=np.int64))
+            data = alerts.to_json(orient='records', lines=True, date_format='iso').encode()
+            if not data.endswith(b'\n'):
+                data += b'\n'
+
+            if size > 0 and size + len(data) > self.max_segment_bytes:
+                base, size = first, 0
+                self._drop_old_segments(keep_after=base)
+
+            # Index the first line starting in each new index_interval_bytes block
+            ends   = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+            starts = size + np.concatenate(([0], ends[:-1] + 1))
+            blocks = starts // self.index_interval_bytes
+            last   = (size - 1) // self.index_interval_bytes if size else -1
+            new    = np.flatnonzero(np.diff(np.concatenate(([last], blocks))) != 0)
+            index  = np.stack([first + new, starts[new]], axis=1).astype(np.int64)
+
+            # Data before index, so an index entry never points past the data
+            with open(self._path(base, self.SEGMENT), 'ab') as f:
+                f.write(data)
+                self._flush(f)
+            if len(index):
+                with open(self._path(base, self.INDEX), 'ab') as f:
+                    f.write(index.tobytes())
+                    self._flush(f)
+            self._state = (base, size + len(data), first + len(alerts))
+        return first, first + len(alerts)
+
+    def _flush(self, f) -> None:
+        if self.fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _drop_old_segments(self, keep_after: int) -> None:
+        if not self.max_segments:
+            return
+        for base in [b for b in self._bases() if b < keep_after][:-(self.max_segments - 1) or None]:
+            for suffix in (self.SEGMENT, self.INDEX):
+                try:
+                    os.remove(self._path(base, suffix))
+                except FileNotFoundError:
+                    pass
+
+    # ── Cursor reads ──────────────────────────────────────
+    def read_lines(self, since: int = 0, limit: int = 1000) -> tuple:
+        """
+        Up to `limit` raw NDJSON lines with offset >= `since`, and the
+        cursor to pass next time. Readers take no lock: a line still
+        being written has no newline yet and is left for the next read.
+        """
+        bases = self._bases()
+        if not bases:
+            return [], since
+        since = max(since, bases[0])                  # older alerts were rotated away
+        lines, cursor = [], since
+        for base in bases[max(bisect_right(bases, since) - 1, 0):]:
+            offset, pos = self._seek_point(base, cursor)
+            try:
+                with open(self._path(base, self.SEGMENT), 'rb') as f:
+                    f.seek(pos)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        if offset >= cursor:
+                            lines.append(line)
+                            if len(lines) == limit:
+                                return lines, offset + 1
+                        offset += 1
+            except FileNotFoundError:                 # deleted by retention mid-read
+                continue
+            cursor = max(cursor, offset)
+        return lines, cursor
+
+    def read(self, since: int = 0, limit: int = 1000) -> dict:
+        lines, cursor = self.read_lines(since, limit)
+        return {
+            'alerts': [json.loads(line) for line in lines],
+            'next'  : cursor,
+            'first' : self.first_offset,
+        }
@@ -0,0 +1,254 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Alert Anchoring
+  One ledger transaction per batch of alerts: a Merkle tree
+  over the batch, only the root goes on-chain, and per-alert
+  inclusion proofs are kept off-chain for verification
+=============================================================
+
+Hashing (RFC 6962 style, domain-separated so a leaf can never pass
+for an interior node):
+  leaf = SHA-256(0x00 || canonical JSON of the alert as logged)
+  node = SHA-256(0x01 || left || right)
+An odd node at the end of a level is carried up unchanged.
+
+Anchor directory:
+  manifest.ndjson     one line per anchored batch: root, tx, offsets
+  <root>.json         the batch's receipt and every alert's proof
+  .lock               held while a batch is chosen, anchored and recorded
+
+Batches cover the alert log without gaps: each one starts where the
+anchored prefix of the log ends, so no alert is ever skipped.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:          # no flock (Windows): one anchoring process at a time
+    fcntl = None
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+# ─────────────────────────────────────────────
+# 1. MERKLE TREE
+# ─────────────────────────────────────────────
+def canonical_json(alert: dict) -> bytes:
+    return json.dumps(alert, sort_keys=True, separators=(',', ':'), ensure_ascii=True).encode()
+
+
+def leaf_hash(alert: dict) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + canonical_json(alert)).digest()
+
+
+def _node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    def __init__(self, leaves: list):
+        if not leaves:
+            raise ValueError('a Merkle tree needs at least one leaf')
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @classmethod
+    def from_alerts(cls, alerts: list) -> 'MerkleTree':
+        return cls([leaf_hash(a) for a in alerts])
+
+    @property
+    def root(self) -> str:
+        return self.levels[-1][0].hex()
+
+    def proof(self, index: int) -> list:
+        """Sibling hashes from leaf to root as [side, hex]; side 'L' = sibling on the left."""
+        path = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append(['L' if sibling < index else 'R', level[sibling].hex()])
+            index //= 2
+        return path
+
+
+def verify_proof(alert: dict, proof: list, root: str) -> bool:
+    """True if `alert` is a leaf of the tree with Merkle root `root`."""
+    h = leaf_hash(alert)
+    for side, sibling in proof:
+        sibling = bytes.fromhex(sibling)
+        h = _node_hash(sibling, h) if side == 'L' else _node_hash(h, sibling)
+    return h.hex() == root
+
+
+# ─────────────────────────────────────────────
+# 2. LEDGER CLIENTS
+# ─────────────────────────────────────────────
+class LedgerClient:
+    """
+    Where Merkle roots are anchored. A Fabric / Ethereum client
+    implements submit_root (one transaction storing `root`) and
+    get_anchor (look the transaction up again).
+    """
+
+    def submit_root(self, root: str, metadata: dict) -> dict:
+        raise NotImplementedError
+
+    def get_anchor(self, tx_hash: str) -> dict:
+        raise NotImplementedError
+
+
+class FileLedger(LedgerClient):
+    """Local stand-in for the chain: an append-only NDJSON file, one 'block' per root."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _records(self) -> list:
+        try:
+            with open(self.path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def submit_root(self, root: str, metadata: dict) -> dict:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        record = {
+            'root'        : root,
+            'metadata'    : metadata,
+            'block_number': len(self._records()) + 1,
+            'timestamp'   : datetime.now().isoformat(),
+        }
+        record['tx_hash'] = '0x' + hashlib.sha256(canonical_json(record)).hexdigest()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        record['status'] = 'CONFIRMED'
+        return record
+
+    def get_anchor(self, tx_hash: str) -> dict:
+        return next((r for r in self._records() if r['tx_hash'] == tx_hash), None)
+
+
+# ─────────────────────────────────────────────
+# 3. ANCHOR STORE + BATCH ANCHORING
+# ─────────────────────────────────────────────
+class AnchorStore:
+    MANIFEST = 'manifest.ndjson'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def manifest(self) -> list:
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST)) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def save(self, anchor: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{anchor['root']}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(anchor, f)
+        os.replace(path + '.tmp', path)
+        entry = {k: anchor[k] for k in ('root', 'first_offset', 'end_offset', 'count')}
+        entry['tx_hash'] = anchor['receipt'].get('tx_hash')
+        with open(os.path.join(self.directory, self.MANIFEST), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def load(self, root: str) -> dict:
+        with open(os.path.join(self.directory, f'{root}.json')) as f:
+            return json.load(f)
+
+    @contextmanager
+    def lock(self):
+        """Cross-process lock: one anchoring run reads and extends the manifest at a time."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _ranges(self) -> list:
+        return sorted((e['first_offset'], e['end_offset']) for e in self.manifest()
+                      if e['first_offset'] is not None)
+
+    def pending_range(self, start: int = 0) -> tuple:
+        """
+        (since, until): alerts from `start` (the log's oldest offset) are
+        anchored without a gap up to `since`; the next anchored batch
+        starts at `until` (None if there is none after `since`).
+        """
+        since = start
+        for first, end in self._ranges():
+            if first > since:
+                return since, first
+            since = max(since, end)
+        return since, None
+
+    def anchored_until(self, start: int = 0) -> int:
+        """Alert-log offset up to which every alert from `start` is anchored."""
+        return self.pending_range(start)[0]
+
+    def proof_for(self, offset: int) -> dict:
+        """Root, receipt and proof for the alert at alert-log `offset`; None if not anchored."""
+        # Latest-starting batch that covers it (batches from older runs may overlap)
+        entry = max((e for e in self.manifest() if e['first_offset'] is not None
+                     and e['first_offset'] <= offset < e['end_offset']),
+                    key=lambda e: e['first_offset'], default=None)
+        if entry is None:
+            return None
+        anchor = self.load(entry['root'])
+        return {
+            'root'   : anchor['root'],
+            'receipt': anchor['receipt'],
+            'proof'  : anchor['proofs'][offset - anchor['first_offset']],
+        }
+
+
+def anchor_alerts(alerts: list, ledger: LedgerClient, store: AnchorStore = None) -> dict:
+    """
+    Anchor a batch of alerts with one ledger transaction. Alerts read
+    from the alert log carry consecutive "offset"s, which key their
+    proofs in the store.
+    """
+    t0      = time.perf_counter()
+    tree    = MerkleTree.from_alerts(alerts)
+    offsets = [a.get('offset') for a in alerts]
+    first   = offsets[0] if offsets[0] is not None else None
+    receipt = ledger.submit_root(tree.root, {'alerts': len(alerts), 'first_offset': first})
+    anchor  = {
+        'root'        : tree.root,
+        'count'       : len(alerts),
+        'first_offset': first,
+        'end_offset'  : first + len(alerts) if first is not None else None,
+        'receipt'     : receipt,
+        'proofs'      : [tree.proof(i) for i in range(len(alerts))],
+        'seconds'     : round(time.perf_counter() - t0, 4),
+    }
+    if store is not None:
+        store.save(anchor)
+    return anchor
+
+
+def anchor_pending(log, ledger: LedgerClient, store: AnchorStore, max_alerts: int = 100_000) -> dict:
+    """
+    Anchor the oldest alert-log entries not yet anchored, up to
+    `max_alerts` of them (from cron, or after a run appends alerts);
+    None if there are none. Alerts rotated out of the log are skipped.
+    """
+    with store.lock():
+        since, until = store.pending_range(log.first_offset)
+        limit  = max_alerts if until is None else min(max_alerts, until - since)
+        alerts = log.read(since, limit)['alerts']
+        return anchor_alerts(alerts, ledger, store) if alerts else None
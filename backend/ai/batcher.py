@@ -0,0 +1,119 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Request Micro-Batcher
+  Coalesces concurrent /predict calls into one scoring call:
+  waits up to a few milliseconds or N records, scores the
+  batch off the event loop and resolves each caller's future
+=============================================================
+"""
+import asyncio
+import time
+
+from metrics import BATCH_QUEUE_DEPTH, BATCH_QUEUE_SECONDS, BATCH_REJECTED, BATCH_SIZE, BATCH_SPLIT
+
+
+class MicroBatcher:
+    """
+    `score_batch(items) -> results` (same length, same order) runs in
+    the loop's default executor, one batch at a time; requests that
+    arrive while a batch is scoring form the next one. submit() raises
+    asyncio.QueueFull once `max_queue` items are waiting, so callers
+    can shed load instead of queueing without bound.
+
+    One caller's bad input must not fail the others: a result that is
+    an Exception instance fails only its own caller, and if
+    score_batch raises for a whole batch, its items are rescored one
+    by one so the exception reaches only the calls that cause it.
+    """
+
+    def __init__(self, score_batch, max_records: int = 64, max_wait_ms: float = 2.0,
+                 max_queue: int = 1024):
+        self.score_batch = score_batch
+        self.max_records = max_records
+        self.max_wait    = max_wait_ms / 1e3
+        self.max_queue   = max_queue
+        self._loop  = None
+        self._queue = None
+        self._task  = None
+
+    def _ensure_running(self) -> None:
+        # One worker task per event loop (a test client may start several loops)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop  = loop
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task  = loop.create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_running()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            BATCH_REJECTED.inc()
+            raise
+        return await future
+
+    async def _collect(self) -> list:
+        """Block for the first item, then gather more until full or its wait is up."""
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_records:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [entry for entry in await self._collect() if not entry[1].done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                BATCH_QUEUE_SECONDS.observe(started - queued_at)
+            BATCH_SIZE.observe(len(batch))
+            BATCH_QUEUE_DEPTH.set(value=self._queue.qsize())
+
+            try:
+                results = await self._score(loop, [e[0] for e in batch])
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            for (_, future, _), result in zip(batch, results):
+                if future.done():            # the caller may have disconnected
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _score(self, loop, items: list) -> list:
+        """score_batch(items), with each item's exception in its place if the batch raised."""
+        try:
+            return await loop.run_in_executor(None, self.score_batch, items)
+        except Exception as exc:
+            if len(items) == 1:
+                return [exc]
+            BATCH_SPLIT.inc()
+            return [(await self._score(loop, [item]))[0] for item in items]
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
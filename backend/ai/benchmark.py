@@ -0,0 +1,712 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Fraud Scoring Benchmarks
+  Usage:  python benchmark.py fast-path [--records N]
+          python benchmark.py workers   [--workers N]
+          python benchmark.py scaling   [--rows N] [--max-workers N]
+          python benchmark.py training  [--rows N] [--new-rows N]
+          python benchmark.py cascade   [--rows N] [--score-rows N]
+          python benchmark.py wire      [--sizes 1000,100000] [--repeats N]
+          python benchmark.py batcher   [--calls N]
+          python benchmark.py suite     [--sizes 1,100,10000,1000000] [-o results.json]
+                                        [--baseline baseline.json --threshold 0.2]
+          python benchmark.py compare   baseline.json results.json [--threshold 0.2]
+=============================================================
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import fraud
+from fraud import FEATURE_COLS, engineer_features, engineer_features_single, generate_dataset
+from feature_store import FeatureStore
+
+
+def _percentiles(samples_s) -> str:
+    us = np.asarray(samples_s) * 1e6
+    return (f"p50 {np.percentile(us, 50):9.1f} µs   "
+            f"p99 {np.percentile(us, 99):9.1f} µs   "
+            f"mean {us.mean():9.1f} µs")
+
+
+# ─────────────────────────────────────────────
+# FAST PATH: parity + latency vs pandas
+# ─────────────────────────────────────────────
+def _api_records_from(df) -> list:
+    """Dataset rows as /predict request bodies."""
+    return [{
+        'Quantity'        : float(r.Quantity),
+        'Transport_Time'  : float(r.Transport_Time),
+        'Checkpoint_Count': int(r.Checkpoint_Count),
+        'Price'           : float(r.Price),
+        'Production_Date' : r.Production_Date.isoformat(),
+        'Expiry_Date'     : r.Expiry_Date.isoformat(),
+        'Timestamp'       : r.Timestamp.isoformat(),
+        'Current_Status'  : r.Current_Status,
+        'Last_Location'   : r.Last_Location,
+        'Batch_ID'        : r.Batch_ID,
+        'Distributor_ID'  : r.Distributor_ID,
+    } for r in df.itertuples()]
+
+
+def _api_records(n: int) -> list:
+    """Generated rows shaped like /predict bodies, plus edge cases."""
+    records = _api_records_from(generate_dataset(n_samples=n, fraud_ratio=0.3))
+    records += [
+        {'Quantity': 0.0, 'Transport_Time': 0.0, 'Checkpoint_Count': 0, 'Price': 10.0},
+        {'Quantity': 9000.0, 'Transport_Time': 500.0, 'Checkpoint_Count': 0, 'Price': 50.0,
+         'Last_Location': 'Unknown', 'Current_Status': 'Lost'},
+        {'Quantity': 300.0, 'Transport_Time': 12.0, 'Checkpoint_Count': 5, 'Price': 120.0,
+         'Production_Date': '2024-01-01', 'Expiry_Date': '2024-01-01T00:00:00',
+         'Timestamp': '2024-03-05T23:59:59.999999'},
+    ]
+    return records
+
+
+def _pandas_single(record: dict, store: FeatureStore) -> np.ndarray:
+    """What /predict did before the fast path: one-row DataFrame through engineer_features."""
+    payload = fraud.PredictionInput(**record)
+    df_feat = engineer_features(fraud.build_input_frame([payload]), store)
+    return df_feat[FEATURE_COLS].fillna(0).to_numpy(dtype=np.float64)[0]
+
+
+def bench_fast_path(n_records: int) -> int:
+    records = _api_records(n_records)
+    fraud.bootstrap_model()
+    store   = fraud.feature_store
+
+    # Parity must hold both with and without population statistics
+    mismatches = 0
+    for s in (store, None):
+        for record in records:
+            payload  = fraud.PredictionInput(**record).dict()
+            expected = _pandas_single(record, s)
+            fast, _  = engineer_features_single(payload, s)
+            # Compare bit patterns, not values: catches -0.0 vs 0.0 and NaN payloads too
+            if not np.array_equal(expected.view(np.uint64), fast.view(np.uint64)):
+                bad = [c for c, a, b in zip(FEATURE_COLS, expected, fast) if a != b]
+                print(f"  ❌ parity mismatch ({'store' if s else 'no store'}): {bad}")
+                mismatches += 1
+    print(f"  Parity: {2 * len(records) - mismatches}/{2 * len(records)} records bit-identical")
+
+    pandas_t, fast_t = [], []
+    for record in records:
+        payload = fraud.PredictionInput(**record).dict()
+        t0 = time.perf_counter()
+        _pandas_single(record, store)
+        t1 = time.perf_counter()
+        engineer_features_single(payload, store)
+        t2 = time.perf_counter()
+        pandas_t.append(t1 - t0)
+        fast_t.append(t2 - t1)
+
+    print("\n  engineer_features latency, single record")
+    print(f"    pandas : {_percentiles(pandas_t)}")
+    print(f"    fast   : {_percentiles(fast_t)}")
+    print(f"    speed-up (p50): {np.median(pandas_t) / np.median(fast_t):.1f}x")
+    return 1 if mismatches else 0
+
+
+# ─────────────────────────────────────────────
+# WORKERS: per-worker memory + spawn time by model loading mode
+# ─────────────────────────────────────────────
+def _memory_mb() -> dict:
+    """RSS and PSS of this process; PSS splits shared pages between their users."""
+    out = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    out[key.lower()] = int(rest.split()[0]) / 1024
+    except OSError:
+        out['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return out
+
+
+def _model_worker(mode: str, path: str, reports, release) -> None:
+    """Stand-in uvicorn worker: load the model the given way, score, report memory."""
+    if mode == 'pickle':
+        import joblib
+        model = joblib.load(os.path.join(path, 'model.pkl'))
+    else:
+        from forest import CompiledForest
+        model = CompiledForest.load(path, mmap=True)
+    # Score a spread of rows so most of the forest's pages are actually touched
+    X = np.random.default_rng(0).normal(scale=500, size=(2048, len(FEATURE_COLS)))
+    model.predict_proba(X)
+    reports.put((os.getpid(), time.perf_counter(), _memory_mb()))
+    release.wait()
+
+
+def bench_workers(n_workers: int) -> int:
+    fraud.bootstrap_model()
+    version = fraud.registry.live_version()
+    modes = {
+        'pickle': fraud.registry.path(version),                                 # before: unpickle per worker
+        'mmap'  : fraud.registry.path(version),                                 # registry files, page cache
+        'shm'   : fraud.registry._stage_in_shm(version, '/dev/shm')             # FRAUD_SHM_DIR=/dev/shm
+                  if os.path.isdir('/dev/shm') else None,
+    }
+    ctx = mp.get_context('spawn')      # how uvicorn starts its workers
+    print(f"  Model {version}: {n_workers} workers per mode\n")
+    print(f"  {'mode':8s} {'spawn→ready p50':>16s} {'RSS/worker':>12s} {'PSS/worker':>12s} {'PSS total':>11s}")
+    for mode, path in modes.items():
+        if path is None:
+            continue
+        reports, release = ctx.Queue(), ctx.Event()
+        started, procs = {}, []
+        for _ in range(n_workers):
+            p = ctx.Process(target=_model_worker, args=(mode, path, reports, release))
+            t0 = time.perf_counter()
+            p.start()
+            started[p.pid] = t0
+            procs.append(p)
+        results = [reports.get(timeout=300) for _ in procs]
+        # Measure while every worker is still alive, so shared pages are split n ways
+        release.set()
+        for p in procs:
+            p.join()
+
+        spawn = [t - started[pid] for pid, t, _ in results]
+        rss   = [m.get('rss', float('nan')) for _, _, m in results]
+        pss   = [m.get('pss', float('nan')) for _, _, m in results]
+        print(f"  {mode:8s} {np.median(spawn):14.2f} s {np.mean(rss):9.1f} MB "
+              f"{np.mean(pss):9.1f} MB {np.sum(pss):8.1f} MB")
+    return 0
+
+
+# ─────────────────────────────────────────────
+# SCALING: partitioned scoring from 1 to N processes
+# ─────────────────────────────────────────────
+def bench_scaling(n_rows: int, max_workers: int) -> int:
+    from batch_scoring import PartitionedScorer, aggregate_frame, load_scoring_model
+
+    df = generate_dataset(n_samples=n_rows, fraud_ratio=0.15)
+    fraud.bootstrap_model()
+    model = load_scoring_model()              # what `fraud.py score` loads
+    cols  = ['Fraud_Probability', 'Is_Fraud_Predicted', 'Alert_Level', 'Fraud_Types']
+
+    t0 = time.perf_counter()
+    expected = fraud.run_fraud_detection(df, model)
+    serial = time.perf_counter() - t0
+    print(f"  {n_rows:,} rows on {os.cpu_count()} cores\n")
+    print(f"  {'workers':>7s} {'seconds':>9s} {'rows/s':>11s} {'speed-up':>9s}  parity")
+    print(f"  {'serial':>7s} {serial:9.2f} {n_rows / serial:11,.0f} {1.0:8.2f}x")
+
+    failures = 0
+    counts = sorted({2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers} | {max_workers})
+    for workers in counts:
+        with PartitionedScorer(model, workers) as scorer:
+            scorer.score(df.head(1000), aggregate_frame(df.head(1000)))    # pool warm-up
+            t0 = time.perf_counter()
+            got = scorer.score(df, aggregate_frame(df))
+            took = time.perf_counter() - t0
+        same = got[cols].equals(expected[cols])
+        failures += not same
+        print(f"  {workers:7d} {took:9.2f} {n_rows / took:11,.0f} {serial / took:8.2f}x  {'✅' if same else '❌'}")
+    return 1 if failures else 0
+
+
+# ─────────────────────────────────────────────
+# TRAINING: wall-clock + peak memory per training mode
+# ─────────────────────────────────────────────
+def _training_worker(mode: str, root: str, n_rows: int, n_new: int, reports) -> None:
+    """One training mode in a fresh process, so its peak RSS is its own."""
+    from registry import ModelRegistry
+    registry = ModelRegistry(root)
+    df = generate_dataset(n_rows, 0.15) if mode.startswith('full') else None
+    new = generate_dataset(n_new, 0.15, seed=7) if mode == 'incremental' else None
+    baseline = _memory_mb()['rss']
+    t0 = time.perf_counter()
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        if mode == 'full + cv':
+            fraud.train_model(df, registry, activate=False, run_cv=True)
+        elif mode == 'full':
+            fraud.train_model(df, registry, activate=False)
+        elif mode == 'cv job':
+            fraud.cross_validate_version(registry)
+        elif mode == 'incremental':
+            fraud.train_incremental(new, registry, new_trees=50, activate=False)
+    seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    reports.put((mode, seconds, peak - baseline))
+
+
+def bench_training(n_rows: int, n_new: int) -> int:
+    from registry import ModelRegistry
+    root = tempfile.mkdtemp(prefix='fraud-train-bench-')
+    with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+        fraud.train_model(generate_dataset(n_rows, 0.15), ModelRegistry(root))     # base version
+
+    ctx = mp.get_context('spawn')
+    print(f"  {n_rows:,} training rows, {n_new:,} newly labelled rows\n")
+    print(f"  {'mode':12s} {'seconds':>9s} {'peak RSS Δ':>12s}")
+    for mode in ('full + cv', 'full', 'cv job', 'incremental'):
+        reports = ctx.Queue()
+        p = ctx.Process(target=_training_worker, args=(mode, root, n_rows, n_new, reports))
+        p.start()
+        _, seconds, peak = reports.get()
+        p.join()
+        print(f"  {mode:12s} {seconds:9.2f} {peak:9.1f} MB")
+    return 0
+
+
+# ─────────────────────────────────────────────
+# CASCADE: escalation rate, throughput and recall vs the full forest
+# ─────────────────────────────────────────────
+def bench_cascade(n_rows: int, score_rows: int) -> int:
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from cascade import evaluate_cascade, fit_cascade, print_cascade_report
+
+    df_feat = engineer_features(generate_dataset(n_rows, 0.15))
+    X, y = df_feat[FEATURE_COLS].fillna(0), df_feat['Is_Fraud']
+    # Same split as train_model, so the held-out rows are the ones it reports on
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=fraud.HOLDOUT_FRACTION, random_state=42, stratify=y
+    )
+    model = RandomForestClassifier(**fraud.MODEL_PARAMS).fit(X_train, y_train)
+    t0 = time.perf_counter()
+    cascade = fit_cascade(model, X_train, y_train, fraud.ESCALATE_WHEN, FEATURE_COLS,
+                          fraud.CASCADE_MAX_RECALL_LOSS)
+    fit_seconds = time.perf_counter() - t0
+
+    report = evaluate_cascade(cascade, X_test, y_test, throughput_rows=score_rows)
+    print(f"  {n_rows:,} rows ({len(y_test):,} held out, tiled to {max(score_rows, len(y_test)):,} "
+          f"for throughput), screen fitted in {fit_seconds:.2f}s")
+    print_cascade_report(report)
+    return 0
+
+
+# ─────────────────────────────────────────────
+# WIRE: /predict_batch end to end, JSON vs columnar body
+# ─────────────────────────────────────────────
+def _wire_columns(df) -> dict:
+    """Dataset rows as columnar /predict_batch columns (what fraudWire.js sends)."""
+    cols = {c: df[c].to_numpy(dtype=np.float64) for c in fraud.COLUMNAR_NUMERIC}
+    # Timezone-aware dates go as instants, naive ones as wall-clock times
+    cols.update({c: df[c] if df[c].dt.tz is not None else df[c].to_numpy(dtype='datetime64[ms]')
+                 for c in fraud.COLUMNAR_DATES})
+    cols.update({c: df[c].to_numpy(dtype=object) for c in fraud.COLUMNAR_STRINGS})
+    return cols
+
+
+def _wire_parity(n: int) -> int:
+    """
+    Score the same records as a JSON and as a columnar body, each on a
+    fresh scratch service, once with naive dates and once with dates
+    carrying an offset. Returns the number of records whose results differ.
+    """
+    from fastapi.testclient import TestClient
+    from wire_format import CONTENT_TYPE, decode_columns, encode_columns
+
+    df = generate_dataset(n, 0.15)
+    for c in fraud.COLUMNAR_DATES:
+        df[c] = df[c].dt.floor('ms')                  # the columnar body carries milliseconds
+
+    def score(body, frame) -> list:
+        workdir = tempfile.mkdtemp(prefix='fraud-wire-')
+        try:
+            with _scratch_service(workdir), open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+                fraud.bootstrap_model()
+                client = TestClient(fraud.app)
+                if body == 'json':
+                    r = client.post('/predict_batch', json={'records': _api_records_from(frame)})
+                    r.raise_for_status()
+                    return [(x['fraud_prediction'], x['fraud_probability'], x['alert_level'],
+                             ', '.join(x['fraud_types'])) for x in r.json()['results']]
+                r = client.post('/predict_batch', content=encode_columns(_wire_columns(frame)),
+                                headers={'content-type': CONTENT_TYPE})
+                r.raise_for_status()
+                _, cols = decode_columns(r.content)
+                return list(zip(cols['fraud_prediction'].tolist(), cols['fraud_probability'].tolist(),
+                                np.asarray(cols['alert_level']).tolist(), np.asarray(cols['fraud_types']).tolist()))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    mismatches = 0
+    for label, zone in (('naive dates', None), ('dates at +05:30', '+05:30')):
+        frame = df.copy()
+        if zone is not None:
+            for c in fraud.COLUMNAR_DATES:
+                frame[c] = frame[c].dt.tz_localize(zone)
+        expected, got = score('json', frame), score('columnar', frame)
+        bad = sum(a != b for a, b in zip(expected, got))
+        print(f"  {'✅' if not bad else '❌'} JSON vs columnar, {label}: {n - bad}/{n} records identical")
+        mismatches += bad
+    return mismatches
+
+
+def bench_wire(sizes: list, repeats: int) -> int:
+    from fastapi.testclient import TestClient
+    from wire_format import CONTENT_TYPE, decode_columns, encode_columns
+
+    mismatches = _wire_parity(min(min(sizes), fraud.MAX_BATCH_RECORDS))
+    print()
+    fraud.bootstrap_model()
+    client = TestClient(fraud.app)
+    headers = {'content-type': CONTENT_TYPE}
+
+    def post_json(records):
+        # JSON bodies are capped at MAX_BATCH_RECORDS: larger inputs go as several requests
+        for start in range(0, len(records), fraud.MAX_BATCH_RECORDS):
+            r = client.post('/predict_batch', json={'records': records[start:start + fraud.MAX_BATCH_RECORDS]})
+            r.raise_for_status()
+            r.json()
+
+    def post_columnar(columns, n):
+        for start in range(0, n, fraud.MAX_COLUMNAR_RECORDS):
+            chunk = {c: v[start:start + fraud.MAX_COLUMNAR_RECORDS] for c, v in columns.items()}
+            r = client.post('/predict_batch', content=encode_columns(chunk), headers=headers)
+            r.raise_for_status()
+            decode_columns(r.content)
+
+    print(f"  {'records':>9s} {'body':9s} {'requests':>8s} {'MB':>7s} {'p50 s':>8s} {'rows/s':>10s}")
+    for n in sizes:
+        df      = generate_dataset(n, 0.15)
+        records = _api_records_from(df)
+        columns = _wire_columns(df)
+        json_mb = sum(len(json.dumps({'records': records[i:i + fraud.MAX_BATCH_RECORDS]}))
+                      for i in range(0, n, fraud.MAX_BATCH_RECORDS)) / 2 ** 20
+        wire_mb = len(encode_columns(columns)) / 2 ** 20
+        timings = {}
+        for body, run, mb, requests in (
+                ('json', lambda: post_json(records), json_mb, -(-n // fraud.MAX_BATCH_RECORDS)),
+                ('columnar', lambda: post_columnar(columns, n), wire_mb, -(-n // fraud.MAX_COLUMNAR_RECORDS))):
+            with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+                run()                                       # warm-up
+                times = []
+                for _ in range(repeats if n <= 10_000 else 1):
+                    t0 = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - t0)
+            timings[body] = float(np.median(times))
+            print(f"  {n:9,d} {body:9s} {requests:8d} {mb:7.2f} {timings[body]:8.3f} "
+                  f"{n / timings[body]:10,.0f}")
+        print(f"  {'':9s} columnar speed-up: {timings['json'] / timings['columnar']:.1f}x\n")
+    return 1 if mismatches else 0
+
+
+# ─────────────────────────────────────────────
+# BATCHER: one bad /predict call in a coalesced batch
+# ─────────────────────────────────────────────
+def bench_batcher(n_calls: int) -> int:
+    import asyncio
+    from batcher import MicroBatcher
+
+    fraud.bootstrap_model()
+    good = [fraud.PredictionInput(**r) for r in _api_records_from(generate_dataset(n_calls - 1, 0.15))]
+    # Bypasses validation, so building its features raises inside the scoring call
+    bad  = fraud.PredictionInput.model_construct(**{**good[0].dict(), 'Quantity': None})
+    calls = good[:len(good) // 2] + [bad] + good[len(good) // 2:]
+    bad_index = len(good) // 2
+
+    async def submit_all():
+        # One batch holds every call: max_records = n_calls, a generous wait
+        batcher = MicroBatcher(fraud.score_predict_calls, max_records=n_calls, max_wait_ms=200)
+        try:
+            return await asyncio.gather(*(batcher.submit(c) for c in calls), return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    t0 = time.perf_counter()
+    outcomes = asyncio.run(submit_all())
+    elapsed = time.perf_counter() - t0
+    failed  = [i for i, o in enumerate(outcomes) if isinstance(o, BaseException)]
+    scored  = sum(isinstance(o, dict) and 'fraud_probability' in o for o in outcomes)
+    print(f"  {n_calls} concurrent calls, 1 invalid (#{bad_index}): "
+          f"{scored} scored, {len(failed)} failed {failed} in {elapsed * 1e3:.1f} ms")
+    ok = failed == [bad_index] and scored == n_calls - 1
+    print("  ✅ only the invalid call failed" if ok else "  ❌ the invalid call failed other calls")
+    return 0 if ok else 1
+
+
+# ─────────────────────────────────────────────
+# SUITE: every pipeline stage x input size, JSON results + regression gate
+# ─────────────────────────────────────────────
+DEFAULT_SIZES     = [1, 100, 10_000, 1_000_000]
+ROW_BUDGET        = 1_000_000      # rows processed per (case, size); sets the repeat count
+MAX_TRAIN_ROWS    = 100_000
+GATED_METRICS     = {'p50_ms': 0.5, 'peak_mb': 1.0}   # metric -> noise floor (absolute delta ignored below it)
+
+
+def _traced_peak_mb(run) -> float:
+    """
+    Peak Python + NumPy allocation of one call. Deterministic, unlike
+    RSS, which depends on what earlier cases left in the allocator.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def _suite_cases(model, client, workdir: str) -> dict:
+    """case name -> (max size or None, setup(df) -> run())."""
+    from registry import ModelRegistry
+    scratch = ModelRegistry(os.path.join(workdir, 'registry'))     # never touches the live model files
+
+    def post(path, body):
+        # A failed request must not be timed as a scored one
+        r = client.post(path, json=body)
+        if r.status_code != 200:
+            raise RuntimeError(f'{path} returned {r.status_code}: {r.text[:200]}')
+        if path == '/predict_batch' and r.json()['failed']:
+            raise RuntimeError(f"{path} rejected {r.json()['failed']} of {len(body['records'])} records")
+
+    def predict(df):
+        records = _api_records_from(df)
+        if len(records) == 1:
+            return lambda: post('/predict', records[0])
+        return lambda: post('/predict_batch', {'records': records})
+
+    def batch_scoring(df):
+        from batch_scoring import score_file
+        path = os.path.join(workdir, f'input-{len(df)}.csv')
+        df.to_csv(path, index=False)
+        return lambda: score_file(path, os.path.join(workdir, 'scored.ndjson'), model=model)
+
+    cases = {
+        'generate_dataset'   : (None, lambda df: lambda: generate_dataset(len(df), 0.15)),
+        'engineer_features'  : (None, lambda df: lambda: engineer_features(df)),
+        'train_model'        : (MAX_TRAIN_ROWS, lambda df: lambda: fraud.train_model(df, scratch, activate=False)),
+        'run_fraud_detection': (None, lambda df: lambda: fraud.run_fraud_detection(df, model)),
+        'batch_scoring'      : (None, batch_scoring),
+    }
+    if client is not None:
+        cases['/predict'] = (fraud.MAX_BATCH_RECORDS, predict)
+    return cases
+
+
+def _suite_meta() -> dict:
+    import pandas, sklearn
+    return {
+        'created'  : datetime.now().isoformat(),
+        'python'   : platform.python_version(),
+        'numpy'    : np.__version__,
+        'pandas'   : pandas.__version__,
+        'sklearn'  : sklearn.__version__,
+        'platform' : platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'backend'  : fraud.INFERENCE_BACKEND,
+        'batch_backend': f'{fraud.BATCH_INFERENCE_BACKEND} over {fraud.COMPILED_MAX_ROWS} rows',
+    }
+
+
+@contextlib.contextmanager
+def _scratch_service(workdir: str):
+    """
+    Point the service's registry, feature store snapshot, alert log and
+    drift snapshots at `workdir` while the suite scores through it. The
+    live version, if any, is copied in, so it is still what gets timed.
+    """
+    from alert_log import AlertLog
+    from registry import ModelRegistry
+
+    names = ('registry', 'alert_log', 'STATS_PATH', 'DRIFT_DIR', 'live_model', 'feature_store', 'drift_monitor')
+    saved = {name: getattr(fraud, name) for name in names}
+    scratch = ModelRegistry(os.path.join(workdir, 'service-registry'))
+    live = saved['registry'].live_version()
+    if live is not None:
+        shutil.copytree(saved['registry'].path(live), scratch.path(live))
+        scratch._write_manifest({'live': live, 'versions': {live: saved['registry'].versions()[live]}})
+    fraud.registry   = scratch
+    fraud.alert_log  = AlertLog(os.path.join(workdir, 'alert_log'))
+    fraud.STATS_PATH = os.path.join(workdir, 'fraud_stats.pkl')
+    fraud.DRIFT_DIR  = os.path.join(workdir, 'drift')
+    fraud.live_model = fraud.feature_store = fraud.drift_monitor = None
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(fraud, name, value)
+
+
+def run_suite(sizes: list, max_repeats: int, cases_wanted: list = None) -> dict:
+    workdir = tempfile.mkdtemp(prefix='fraud-bench-')
+    try:
+        with _scratch_service(workdir):
+            results = _run_suite_cases(sizes, max_repeats, cases_wanted, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'meta': _suite_meta(), 'results': results}
+
+
+def _run_suite_cases(sizes: list, max_repeats: int, cases_wanted: list, workdir: str) -> list:
+    fraud.bootstrap_model()
+    if fraud.live_model is None:
+        raise RuntimeError(f"Model bootstrap failed: {fraud.model_status['detail']}")
+    from batch_scoring import load_scoring_model
+    model = load_scoring_model()              # offline cases score with what `fraud.py score` loads
+    try:
+        from fastapi.testclient import TestClient
+        client = TestClient(fraud.app)        # no context manager: the model is already live
+    except ImportError:                       # TestClient needs httpx
+        client = None
+        print("  ⚠️  fastapi.testclient unavailable (pip install httpx): skipping /predict")
+
+    results = []
+    cases = _suite_cases(model, client, workdir)
+    print(f"  {'case':20s} {'rows':>9s} {'runs':>5s} {'p50 ms':>10s} {'p95 ms':>10s} "
+          f"{'p99 ms':>10s} {'rows/s':>12s} {'peak MB':>8s}")
+    for n in sizes:
+        df = generate_dataset(n, 0.15)
+        for name, (max_rows, setup) in cases.items():
+            if cases_wanted and name not in cases_wanted:
+                continue
+            if (max_rows is not None and n > max_rows) or (name == 'train_model' and n < 100):
+                continue
+            with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+                run = setup(df)
+                peak_mb = _traced_peak_mb(run)              # doubles as the warm-up
+                repeats = max(3, min(max_repeats, ROW_BUDGET // n))
+                if name == 'train_model':
+                    repeats = 3 if n <= 10_000 else 1
+                times = []
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - t0)
+            ms = np.asarray(times) * 1e3
+            row = {
+                'case'      : name,
+                'rows'      : n,
+                'repeats'   : repeats,
+                'p50_ms'    : round(float(np.percentile(ms, 50)), 4),
+                'p95_ms'    : round(float(np.percentile(ms, 95)), 4),
+                'p99_ms'    : round(float(np.percentile(ms, 99)), 4),
+                'mean_ms'   : round(float(ms.mean()), 4),
+                'rows_per_s': round(n / (np.median(ms) / 1e3), 1),
+                'peak_mb'   : round(peak_mb, 1),
+            }
+            results.append(row)
+            print(f"  {name:20s} {n:9,d} {repeats:5d} {row['p50_ms']:10.2f} {row['p95_ms']:10.2f} "
+                  f"{row['p99_ms']:10.2f} {row['rows_per_s']:12,.0f} {row['peak_mb']:8.1f}")
+    return results
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> int:
+    """Print per-case deltas; return the number of gated regressions."""
+    base = {(r['case'], r['rows']): r for r in baseline['results']}
+    regressions = 0
+    print(f"  {'case':20s} {'rows':>9s} {'metric':>8s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+    for r in current['results']:
+        b = base.get((r['case'], r['rows']))
+        if b is None:
+            continue
+        for metric, floor in GATED_METRICS.items():
+            old, new = b[metric], r[metric]
+            change = (new - old) / old if old > 0 else 0.0
+            regressed = change > threshold and new - old > floor
+            regressions += regressed
+            print(f"  {r['case']:20s} {r['rows']:9,d} {metric:>8s} {old:10.2f} {new:10.2f} "
+                  f"{change:+7.0%} {'❌' if regressed else ''}")
+    verdict = f"❌ {regressions} regression(s)" if regressions else "✅ no regressions"
+    print(f"\n  {verdict} beyond {threshold:.0%} (noise floors: {GATED_METRICS})")
+    return regressions
+
+
+def bench_suite(args) -> int:
+    sizes   = [int(s) for s in args.sizes.split(',')]
+    wanted  = args.cases.split(',') if args.cases else None
+    current = run_suite(sizes, args.max_repeats, wanted)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"\n  ✅ Results written → {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        return 1 if compare_results(baseline, current, args.threshold) else 0
+    return 0
+
+
+def bench_compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    return 1 if compare_results(baseline, current, args.threshold) else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('fast-path', help='single-record feature parity + latency vs pandas')
+    p.add_argument('--records', type=int, default=500)
+
+    p = sub.add_parser('workers', help='per-worker RSS/PSS and spawn time: pickle vs mmap vs /dev/shm')
+    p.add_argument('--workers', type=int, default=4)
+
+    p = sub.add_parser('scaling', help='partitioned multi-process scoring: throughput from 1 to N workers')
+    p.add_argument('--rows', type=int, default=200_000)
+    p.add_argument('--max-workers', type=int, default=os.cpu_count())
+
+    p = sub.add_parser('training', help='wall-clock and peak memory: full+CV vs full vs CV job vs incremental')
+    p.add_argument('--rows', type=int, default=1200)
+    p.add_argument('--new-rows', type=int, default=1000)
+
+    p = sub.add_parser('cascade', help='tiered scoring: escalation rate, throughput gain and recall lost')
+    p.add_argument('--rows', type=int, default=1200)
+    p.add_argument('--score-rows', type=int, default=100_000)
+
+    p = sub.add_parser('wire', help='/predict_batch end-to-end throughput: JSON vs columnar body')
+    p.add_argument('--sizes', default='1000,100000')
+    p.add_argument('--repeats', type=int, default=5)
+
+    p = sub.add_parser('batcher', help='micro-batched /predict: one invalid call fails alone, not its batch')
+    p.add_argument('--calls', type=int, default=10)
+
+    p = sub.add_parser('suite', help='latency percentiles, throughput and peak memory per stage and input size')
+    p.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    p.add_argument('--cases', default=None, help='comma-separated subset of case names')
+    p.add_argument('--max-repeats', type=int, default=200)
+    p.add_argument('-o', '--output', default='benchmark_results.json')
+    p.add_argument('--baseline', default=None, help='fail (exit 1) on regressions against this results file')
+    p.add_argument('--threshold', type=float, default=0.2, help='allowed relative slow-down, e.g. 0.2 = 20%%')
+
+    p = sub.add_parser('compare', help='compare two suite result files; exit 1 on regressions')
+    p.add_argument('baseline')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    if args.command == 'fast-path':
+        return bench_fast_path(args.records)
+    if args.command == 'workers':
+        return bench_workers(args.workers)
+    if args.command == 'scaling':
+        return bench_scaling(args.rows, args.max_workers)
+    if args.command == 'training':
+        return bench_training(args.rows, args.new_rows)
+    if args.command == 'cascade':
+        return bench_cascade(args.rows, args.score_rows)
+    if args.command == 'wire':
+        return bench_wire([int(n) for n in args.sizes.split(',')], args.repeats)
+    if args.command == 'batcher':
+        return bench_batcher(args.calls)
+    if args.command == 'suite':
+        return bench_suite(args)
+    if args.command == 'compare':
+        return bench_compare(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Tiered Scoring Cascade
+  Cheap vectorised rules and a small calibrated forest clear
+  obviously normal records; only suspicious or uncertain ones
+  are escalated to the full forest
+=============================================================
+
+  cascade/                 stored inside a registry version
+    forest_*.npy           screen forest (CompiledForest node arrays)
+    forest.json
+    cascade.json           escalation rules, isotonic calibration, clear threshold
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from forest import CompiledForest
+from metrics import CASCADE_RECORDS
+
+# A handful of shallow trees: ~1% of the full forest's traversal work per row.
+# Every split considers every feature: with this few trees, random feature
+# subsets leave whole fraud types unseen and the screen clears nothing.
+SCREEN_PARAMS = dict(
+    n_estimators=8,
+    max_depth=4,
+    max_features=None,
+    min_samples_leaf=5,
+    class_weight='balanced',
+    random_state=42,
+    n_jobs=-1,
+)
+
+# Comparison ops shared by the cascade's escalation rules and fraud.py's FRAUD_RULES
+RULE_OPS = {
+    '==': np.equal, '!=': np.not_equal,
+    '<' : np.less,  '<=': np.less_equal,
+    '>' : np.greater, '>=': np.greater_equal,
+}
+
+
+# ─────────────────────────────────────────────
+# 1. CASCADE MODEL
+# ─────────────────────────────────────────────
+class CascadeModel:
+    """
+    Three tiers over the FEATURE_COLS matrix:
+      1. rules     any (feature, op, value) that holds escalates the row
+      2. screen    small forest, isotonic-calibrated; a row is cleared
+                   when its calibrated fraud probability < `clear_below`
+      3. full      the version's forest scores everything not cleared
+    Cleared rows get the calibrated screen probability (always below
+    0.5, so they predict legit). Exposes predict_proba / predict /
+    classes_ like CompiledForest.
+    """
+
+    def __init__(self, full, screen, rules: list, feature_names: list,
+                 calibration: tuple, clear_below: float):
+        self.full          = full
+        self.screen        = screen
+        self.rules         = [tuple(r) for r in rules]
+        self.feature_names = list(feature_names)
+        self.calibration   = (np.asarray(calibration[0], dtype=np.float64),
+                              np.asarray(calibration[1], dtype=np.float64))
+        self.clear_below   = min(float(clear_below), 0.5)
+        self._rule_index   = [(self.feature_names.index(f), RULE_OPS[op], float(v)) for f, op, v in self.rules]
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.full.classes_
+
+    def calibrate(self, p) -> np.ndarray:
+        """Isotonic map fitted at training time (== IsotonicRegression.predict, clipped)."""
+        xs, ys = self.calibration
+        return np.interp(p, xs, ys)
+
+    def rule_hits(self, X: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(X), dtype=bool)
+        for j, op, value in self._rule_index:
+            hit |= op(X[:, j], value)
+        return hit
+
+    def route(self, X) -> tuple:
+        """(escalated by rules, escalated by the screen, calibrated screen probability)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        by_rules  = self.rule_hits(X)
+        p_screen  = np.ones(len(X))
+        candidates = np.flatnonzero(~by_rules)
+        if len(candidates):
+            p_screen[candidates] = self.calibrate(self.screen.predict_proba(X[candidates])[:, 1])
+        by_screen = ~by_rules & (p_screen >= self.clear_below)
+        return by_rules, by_screen, p_screen
+
+    def _score(self, X) -> tuple:
+        """predict_proba plus the route() masks it was decided by."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        by_rules, by_screen, p_screen = self.route(X)
+        escalated = by_rules | by_screen
+        proba = np.empty((len(X), len(self.classes_)))
+        cleared = ~escalated
+        # classes_ is [0, 1]: column 1 is the fraud probability
+        proba[cleared, 1] = p_screen[cleared]
+        proba[cleared, 0] = 1.0 - p_screen[cleared]
+        if escalated.any():
+            proba[escalated] = self.full.predict_proba(X[escalated])
+        return proba, by_rules, by_screen
+
+    def predict_proba(self, X) -> np.ndarray:
+        proba, by_rules, by_screen = self._score(X)
+        cleared = ~(by_rules | by_screen)
+        CASCADE_RECORDS.inc('cleared', amount=int(cleared.sum()))
+        CASCADE_RECORDS.inc('escalated_rules', amount=int(by_rules.sum()))
+        CASCADE_RECORDS.inc('escalated_screen', amount=int(by_screen.sum()))
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    # ── Persistence (the full forest is stored by the registry) ──
+    def save(self, directory: str) -> None:
+        self.screen.save(directory)
+        meta = {
+            'rules'        : [list(r) for r in self.rules],
+            'feature_names': self.feature_names,
+            'calibration'  : [self.calibration[0].tolist(), self.calibration[1].tolist()],
+            'clear_below'  : self.clear_below,
+        }
+        with open(os.path.join(directory, 'cascade.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, full, mmap: bool = True) -> 'CascadeModel':
+        with open(os.path.join(directory, 'cascade.json')) as f:
+            meta = json.load(f)
+        return cls(full, CompiledForest.load(directory, mmap), meta['rules'], meta['feature_names'],
+                   meta['calibration'], meta['clear_below'])
+
+
+# ─────────────────────────────────────────────
+# 2. FITTING
+# ─────────────────────────────────────────────
+def oob_fraud_proba(model, full: CompiledForest, X: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Out-of-bag fraud probability of training rows `rows` (indices into
+    the X `model` was fitted on): each row is averaged over the trees
+    whose bootstrap sample left it out, i.e. the forest's verdict on
+    data it has not seen.
+    """
+    position = np.full(len(X), -1)
+    position[rows] = np.arange(len(rows))
+    out_of_bag = np.ones((len(rows), full.n_estimators), dtype=bool)
+    for t, drawn in enumerate(model.estimators_samples_):
+        drawn = position[drawn]
+        out_of_bag[drawn[drawn >= 0], t] = False
+    fraud = full.value[full.apply(X[rows]), list(full.classes_).index(1)]
+    return np.where(out_of_bag, fraud, 0.0).sum(axis=1) / np.maximum(out_of_bag.sum(axis=1), 1)
+
+
+def fit_cascade(model, X, y, rules: list, feature_names: list, max_recall_loss: float = 0.01,
+                calibration_fraction: float = 0.25) -> CascadeModel:
+    """
+    Fit the screen in front of `model` (a RandomForestClassifier fitted
+    on exactly these training rows; never pass the held-out rows). The
+    screen is fitted on one part, the isotonic calibration and the
+    clear threshold on the other. The threshold is the highest one that
+    clears at most `max_recall_loss` of the calibration frauds the
+    forest itself catches out-of-bag: frauds it would miss anyway cost
+    no recall against it.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.isotonic import IsotonicRegression
+    from sklearn.model_selection import train_test_split
+
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+    full = CompiledForest.from_sklearn(model)
+    fit_rows, cal_rows = train_test_split(
+        np.arange(len(X)), test_size=calibration_fraction, random_state=42, stratify=y
+    )
+    screen = RandomForestClassifier(**SCREEN_PARAMS).fit(X[fit_rows], y[fit_rows])
+    screen = CompiledForest.from_sklearn(screen)
+
+    X_cal, y_cal = X[cal_rows], y[cal_rows]
+    iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip')
+    iso.fit(screen.predict_proba(X_cal)[:, 1], y_cal)
+    cascade = CascadeModel(full, screen, rules, feature_names,
+                           (iso.X_thresholds_, iso.y_thresholds_), clear_below=0.0)
+
+    caught = y_cal == 1
+    if getattr(model, 'bootstrap', False):
+        caught &= oob_fraud_proba(model, full, X, cal_rows) >= 0.5
+    by_rules, _, p_screen = cascade.route(X_cal)
+    frauds  = np.sort(p_screen[~by_rules & caught])
+    allowed = int(max_recall_loss * caught.sum())
+    # Rows clear when p < clear_below, so frauds[allowed] and above stay escalated
+    cascade.clear_below = min(float(frauds[allowed]) if allowed < len(frauds) else 0.5, 0.5)
+    return cascade
+
+
+# ─────────────────────────────────────────────
+# 3. EVALUATION REPORT
+# ─────────────────────────────────────────────
+def _records_per_second(model, X, repeats: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict_proba(X)
+        best = min(best, time.perf_counter() - t0)
+    return len(X) / best
+
+
+class _Unmetered:
+    """Scores without counting into the service's cascade metrics."""
+
+    def __init__(self, cascade: CascadeModel):
+        self.cascade = cascade
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.cascade._score(X)[0]
+
+
+def evaluate_cascade(cascade: CascadeModel, X, y, throughput_rows: int = 10_000) -> dict:
+    """
+    Escalation rate, recall against the labels and against the full
+    forest alone, and records/s of both on held-out rows (tiled up to
+    `throughput_rows` so the timing is not noise).
+    """
+    from sklearn.metrics import f1_score, recall_score, roc_auc_score
+
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+    casc_proba, by_rules, by_screen = cascade._score(X)
+    full_proba = cascade.full.predict_proba(X)
+    full_pred  = cascade.classes_.take(np.argmax(full_proba, axis=1))
+    casc_pred  = cascade.classes_.take(np.argmax(casc_proba, axis=1))
+    flagged    = full_pred == 1
+
+    report = {
+        'escalation_rate'       : float((by_rules | by_screen).mean()),
+        'rule_escalation_rate'  : float(by_rules.mean()),
+        'clear_below'           : cascade.clear_below,
+        'full_recall'           : float(recall_score(y, full_pred, zero_division=0)),
+        'cascade_recall'        : float(recall_score(y, casc_pred, zero_division=0)),
+        'full_f1'               : float(f1_score(y, full_pred, zero_division=0)),
+        'cascade_f1'            : float(f1_score(y, casc_pred, zero_division=0)),
+        # Share of the full forest's fraud predictions the cascade also makes
+        'full_flags_kept'       : float(casc_pred[flagged].mean()) if flagged.any() else 1.0,
+    }
+    report['recall_lost'] = report['full_recall'] - report['cascade_recall']
+    if len(np.unique(y)) == 2:
+        report['full_roc_auc']    = float(roc_auc_score(y, full_proba[:, 1]))
+        report['cascade_roc_auc'] = float(roc_auc_score(y, casc_proba[:, 1]))
+
+    if throughput_rows and len(X):
+        X_big = np.tile(X, (-(-throughput_rows // len(X)), 1))[:max(throughput_rows, len(X))]
+        report['full_records_per_s']    = _records_per_second(cascade.full, X_big)
+        report['cascade_records_per_s'] = _records_per_second(_Unmetered(cascade), X_big)
+        report['throughput_gain']       = report['cascade_records_per_s'] / report['full_records_per_s']
+    return report
+
+
+def print_cascade_report(report: dict, title: str = 'Tiered cascade') -> None:
+    print(f"\n  {title}, held-out rows:")
+    print(f"    Escalated to the full forest : {report['escalation_rate']:.1%}"
+          f"  (rules {report['rule_escalation_rate']:.1%}, clear below p={report['clear_below']:.3f})")
+    print(f"    Recall  full {report['full_recall']:.4f} → cascade {report['cascade_recall']:.4f}"
+          f"  (lost {report['recall_lost']:.4f}; {report['full_flags_kept']:.1%} of the forest's flags kept)")
+    print(f"    F1      full {report['full_f1']:.4f} → cascade {report['cascade_f1']:.4f}")
+    if 'full_roc_auc' in report:
+        # Cleared rows carry the screen's probability, so ranking among them is coarser
+        print(f"    ROC-AUC full {report['full_roc_auc']:.4f} → cascade {report['cascade_roc_auc']:.4f}")
+    if 'throughput_gain' in report:
+        print(f"    Records/s  full {report['full_records_per_s']:,.0f} → cascade "
+              f"{report['cascade_records_per_s']:,.0f}  ({report['throughput_gain']:.1f}x)")
@@ -0,0 +1,253 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Forest Compression
+  Smaller variants of a trained forest (greedy tree subsets,
+  depth truncation, float32 node arrays), each written as a
+  loadable CompiledForest, with a table of accuracy, size,
+  load time and scoring latency to pick an operating point
+  Usage:  python compress.py [fraud_model.pkl] [-o compressed]
+                             [--data labelled.csv] [--rows N]
+                             [--trees 100,50,25,10] [--depths 10,8,6]
+=============================================================
+
+  compressed/
+    full/                  the forest as trained (float64), for reference
+    t50-d8-f32/            50 selected trees, cut at depth 8, float32 arrays
+      forest_*.npy         load with CompiledForest.load(directory)
+      forest.json
+    report.json            one row of the table per variant
+"""
+import argparse
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+from forest import CompiledForest
+
+
+# ─────────────────────────────────────────────
+# 1. FOREST TRANSFORMS
+# ─────────────────────────────────────────────
+def rebuild(forest: CompiledForest, roots=None, max_depth: int = None) -> CompiledForest:
+    """
+    Copy of `forest` holding only the trees rooted at `roots` (default:
+    all), with every node at depth `max_depth` turned into a leaf.
+    A truncated node keeps its own class distribution, i.e. what the
+    tree would predict had it stopped growing there. Unreachable nodes
+    are dropped; nodes are laid out level by level.
+    """
+    roots    = np.asarray(forest.roots if roots is None else roots)
+    children = np.asarray(forest.children).reshape(-1, 2)
+    new_id   = np.full(len(children), -1, dtype=np.int64)
+    levels, count, depth = [], 0, 0
+    frontier = roots
+    while len(frontier):
+        new_id[frontier] = np.arange(count, count + len(frontier))
+        count += len(frontier)
+        levels.append(frontier)
+        if max_depth is not None and depth == max_depth:
+            break
+        inner    = frontier[children[frontier, 0] != frontier]
+        frontier = children[inner].ravel()
+        depth   += 1
+
+    old  = np.concatenate(levels)
+    leaf = (children[old, 0] == old) | (new_id[children[old, 0]] < 0)
+    own  = new_id[old]
+    new_children = np.where(leaf[:, None], own[:, None], new_id[children[old]])
+    return CompiledForest(
+        feature   = np.where(leaf, 0, np.asarray(forest.feature)[old]).astype(np.int32),
+        threshold = np.asarray(forest.threshold)[old],
+        children  = new_children.astype(np.int32).ravel(),
+        value     = np.asarray(forest.value)[old],
+        roots     = new_id[roots].astype(np.int32),
+        max_depth = len(levels) - 1,
+        classes   = forest.classes_,
+        n_features= forest.n_features,
+    )
+
+
+def float32_floor(thresholds: np.ndarray) -> np.ndarray:
+    """
+    Largest float32 <= each float64 threshold. Trees compare float32
+    inputs, and for float32 x: x > t  <=>  x > float32_floor(t), so
+    every split decision is unchanged.
+    """
+    t32  = np.asarray(thresholds, dtype=np.float64).astype(np.float32)
+    over = t32.astype(np.float64) > thresholds
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+def quantize(forest: CompiledForest) -> CompiledForest:
+    """float32 thresholds (lossless, see float32_floor) and float32 leaf values."""
+    return CompiledForest(
+        feature   = forest.feature,
+        threshold = float32_floor(forest.threshold),
+        children  = forest.children,
+        value     = np.asarray(forest.value, dtype=np.float32),
+        roots     = forest.roots,
+        max_depth = forest.max_depth,
+        classes   = forest.classes_,
+        n_features= forest.n_features,
+    )
+
+
+# ─────────────────────────────────────────────
+# 2. TREE SUBSET SELECTION
+# ─────────────────────────────────────────────
+def select_trees(forest: CompiledForest, X, y, k: int) -> np.ndarray:
+    """
+    Greedy forward selection: repeatedly add the tree that most lowers
+    the log-loss of the subset's averaged fraud probability on (X, y).
+    Returns tree indices in the order chosen, so any prefix is the
+    best subset of that size found.
+    """
+    fraud = list(forest.classes_).index(1)
+    P = np.asarray(forest.value)[forest.apply(X), fraud]        # rows x trees
+    y = np.asarray(y, dtype=np.float64)[:, None]
+    total  = np.zeros(len(P))
+    chosen = []
+    available = np.ones(P.shape[1], dtype=bool)
+    for step in range(min(k, P.shape[1])):
+        p = np.clip((total[:, None] + P) / (step + 1), 1e-6, 1 - 1e-6)
+        loss = -(y * np.log(p) + (1 - y) * np.log(1 - p)).mean(axis=0)
+        loss[~available] = np.inf
+        best = int(np.argmin(loss))
+        chosen.append(best)
+        available[best] = False
+        total += P[:, best]
+    return np.asarray(chosen)
+
+
+# ─────────────────────────────────────────────
+# 3. VARIANT REPORT
+# ─────────────────────────────────────────────
+def _directory_bytes(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _latency_ms(model, X, calls: int) -> tuple:
+    """p50 / p99 of single-record predict_proba (the /predict path), in ms."""
+    rows = X[np.random.default_rng(0).integers(0, len(X), calls)]
+    samples = np.empty(calls)
+    for i, row in enumerate(rows):
+        t0 = time.perf_counter()
+        model.predict_proba(row.reshape(1, -1))
+        samples[i] = time.perf_counter() - t0
+    return float(np.percentile(samples, 50) * 1e3), float(np.percentile(samples, 99) * 1e3)
+
+
+def measure(name: str, path: str, load, X, y, calls: int = 300) -> dict:
+    """Load the artifact at `path` with `load(path)` and score the report rows."""
+    from sklearn.metrics import f1_score, roc_auc_score
+
+    t0 = time.perf_counter()
+    model = load(path)
+    load_ms = (time.perf_counter() - t0) * 1e3
+
+    proba  = np.asarray(model.predict_proba(X), dtype=np.float64)
+    y_pred = model.classes_.take(np.argmax(proba, axis=1))
+    p50, p99 = _latency_ms(model, X, calls)
+    n_trees  = getattr(model, 'n_estimators', None)
+    return {
+        'variant': name,
+        'trees'  : int(n_trees if n_trees is not None else len(model.estimators_)),
+        'depth'  : int(getattr(model, 'max_depth', None) or max(e.tree_.max_depth for e in model.estimators_)),
+        'roc_auc': float(roc_auc_score(y, proba[:, 1])) if len(np.unique(y)) == 2 else float('nan'),
+        'f1'     : float(f1_score(y, y_pred, zero_division=0)),
+        'size_mb': _directory_bytes(path) / 2 ** 20,
+        'load_ms': load_ms,
+        'p50_ms' : p50,
+        'p99_ms' : p99,
+        'path'   : path,
+    }
+
+
+def print_table(rows: list) -> None:
+    print(f"\n  {'variant':20s} {'trees':>5s} {'depth':>5s} {'ROC-AUC':>8s} {'F1':>7s} "
+          f"{'size MB':>8s} {'load ms':>8s} {'p50 ms':>7s} {'p99 ms':>7s}")
+    for r in rows:
+        print(f"  {r['variant']:20s} {r['trees']:5d} {r['depth']:5d} {r['roc_auc']:8.4f} {r['f1']:7.4f} "
+              f"{r['size_mb']:8.2f} {r['load_ms']:8.1f} {r['p50_ms']:7.3f} {r['p99_ms']:7.3f}")
+
+
+def compress(model_path: str, output_dir: str, X, y, tree_counts: list, depths: list,
+             calls: int = 300) -> list:
+    """
+    Write every (trees x depth) float32 variant of the forest in
+    `model_path` under `output_dir` and measure it. Half of (X, y)
+    picks the tree subsets, the other half is reported on.
+    """
+    from sklearn.model_selection import train_test_split
+
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+    X_sel, X_eval, y_sel, y_eval = train_test_split(X, y, test_size=0.5, random_state=42, stratify=y)
+
+    full  = CompiledForest.from_sklearn(joblib.load(model_path))
+    order = select_trees(full, X_sel, y_sel, max(tree_counts))
+    load  = lambda path: CompiledForest.load(path, mmap=False)
+
+    # References: the pickle as served by the 'sklearn' backend, and its compiled form
+    rows = [measure('model.pkl (sklearn)', model_path, joblib.load, X_eval, y_eval, calls)]
+    full.save(os.path.join(output_dir, 'full'))
+    rows.append(measure('full', os.path.join(output_dir, 'full'), load, X_eval, y_eval, calls))
+
+    for n_trees in [full.n_estimators] + sorted(tree_counts, reverse=True):
+        roots = full.roots if n_trees >= full.n_estimators else full.roots[np.sort(order[:n_trees])]
+        for depth in [None] + sorted(depths, reverse=True):
+            if depth is not None and depth >= full.max_depth:
+                continue
+            variant = quantize(rebuild(full, roots, depth))
+            name    = f"t{variant.n_estimators}-d{variant.max_depth}-f32"
+            path    = os.path.join(output_dir, name)
+            variant.save(path)
+            rows.append(measure(name, path, load, X_eval, y_eval, calls))
+            print(f"  ✅ {name:20s} → {path}")
+
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump({'model': model_path, 'report_rows': len(y_eval), 'variants': rows}, f, indent=2)
+    return rows
+
+
+def main(argv=None) -> int:
+    import pandas as pd
+    from fraud import FEATURE_COLS, MODEL_PATH, engineer_features, generate_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', nargs='?', default=MODEL_PATH,
+                        help="fitted RandomForestClassifier pickle (a registry version's model.pkl works too)")
+    parser.add_argument('-o', '--output', default='compressed')
+    parser.add_argument('--data', default=None,
+                        help='labelled CSV/Parquet (Is_Fraud column) to evaluate on; default: a fresh synthetic draw')
+    parser.add_argument('--rows', type=int, default=4000, help='synthetic evaluation rows')
+    parser.add_argument('--trees', default='100,50,25,10')
+    parser.add_argument('--depths', default='10,8,6')
+    parser.add_argument('--calls', type=int, default=300, help='single-record calls per latency measurement')
+    args = parser.parse_args(argv)
+
+    if args.data:
+        read = pd.read_parquet if args.data.lower().endswith(('.parquet', '.pq')) else pd.read_csv
+        df = read(args.data)
+    else:
+        # A seed the training data never used, so no evaluation row was trained on
+        df = generate_dataset(args.rows, 0.15, seed=2024)
+    df_feat = engineer_features(df)
+    X, y = df_feat[FEATURE_COLS].fillna(0), df_feat['Is_Fraud']
+
+    print(f"\n🗜️  Compressing {args.model} → {args.output}/")
+    rows = compress(args.model, args.output, X, y,
+                    [int(t) for t in args.trees.split(',')], [int(d) for d in args.depths.split(',')],
+                    args.calls)
+    print_table(rows)
+    print(f"\n  Report → {os.path.join(args.output, 'report.json')}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,312 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Input Drift Monitor
+  Fixed-bin histograms and quantile sketches of every model
+  input (and the fraud probability), updated as records are
+  scored, merged across workers and compared with the
+  training-time reference using PSI and KS
+=============================================================
+
+Each worker keeps the sketches of the current time window in memory
+and snapshots them to a shared directory; /drift merges every
+worker's windows that fall in the requested period:
+
+  drift/
+    v0003/
+      1760000400-host-1234.pkl    worker host:1234's window starting at epoch 1760000400
+
+Memory per worker is one window's sketches: the histograms have a
+fixed number of bins and a QuantileSketch grows with log2(n / k) only.
+"""
+import os
+import socket
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from feature_store import QuantileSketch
+
+# PSI rule of thumb: < 0.1 stable, 0.1 - 0.25 moderate, > 0.25 significant shift
+PSI_WATCH, PSI_DRIFT = 0.10, 0.25
+KS_WATCH, KS_DRIFT   = 0.10, 0.20
+PSI_EPSILON          = 1e-4      # floor on bin proportions, so empty bins stay finite
+MIN_RECORDS          = 300       # below this PSI / KS are mostly sampling noise: no verdict
+SKETCH_K             = 512
+
+
+def _new_sketch() -> QuantileSketch:
+    return QuantileSketch(0.5, SKETCH_K)
+
+
+# ─────────────────────────────────────────────
+# 1. TRAINING-TIME REFERENCE
+# ─────────────────────────────────────────────
+class DriftReference:
+    """
+    Per-column distribution of the data a model was trained on: bin
+    edges at the reference deciles (at each value for columns with few
+    distinct values), the share of reference rows in each bin (last
+    bin: NaN) and a quantile sketch for KS.
+    """
+
+    def __init__(self, columns: list, edges: list, expected: list, sketches: list, records: list):
+        self.columns  = columns
+        self.edges    = edges
+        self.expected = expected
+        self.sketches = sketches
+        self.records  = records
+
+    @classmethod
+    def from_columns(cls, columns: dict, bins: int = 10) -> 'DriftReference':
+        """`columns` maps name -> reference values (columns may differ in length)."""
+        names, edges, expected, sketches, records = [], [], [], [], []
+        for name, values in columns.items():
+            values = np.asarray(values, dtype=np.float64)
+            finite   = values[~np.isnan(values)]
+            distinct = np.unique(finite)
+            # Flags and codes get a bin per value; continuous columns bin at the deciles
+            inner = (distinct if len(distinct) <= bins + 1 else
+                     np.unique(np.quantile(finite, np.linspace(0, 1, bins + 1)[1:-1])))
+            counts = _bin_counts(values, inner)
+            sketch = _new_sketch()
+            sketch.update(values)
+            names.append(name)
+            edges.append(inner)
+            expected.append(counts / max(counts.sum(), 1))
+            sketches.append(sketch)
+            records.append(len(values))
+        return cls(names, edges, expected, sketches, records)
+
+    def with_column(self, name: str, values) -> 'DriftReference':
+        """Copy with column `name` rebuilt from `values`."""
+        j, new = self.columns.index(name), DriftReference.from_columns({name: values})
+        pick = lambda attr: [getattr(new, attr)[0] if i == j else v for i, v in enumerate(getattr(self, attr))]
+        return DriftReference(list(self.columns), pick('edges'), pick('expected'), pick('sketches'), pick('records'))
+
+
+def _bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Counts per bin: (-inf, e0), [e0, e1), ..., [e_last, inf), then NaN."""
+    nan  = np.isnan(values)
+    bins = np.searchsorted(edges, values[~nan], side='right')
+    counts = np.bincount(bins, minlength=len(edges) + 1).astype(np.int64)
+    return np.append(counts, nan.sum())
+
+
+def psi(expected: np.ndarray, actual_counts: np.ndarray) -> float:
+    """Population stability index of observed bin counts against reference proportions."""
+    total = actual_counts.sum()
+    if total == 0:
+        return float('nan')
+    e = np.maximum(expected, PSI_EPSILON)
+    a = np.maximum(actual_counts / total, PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(reference: QuantileSketch, live: QuantileSketch) -> float:
+    """Kolmogorov-Smirnov distance between two sketched distributions."""
+    if reference.count == 0 or live.count == 0:
+        return float('nan')
+    points = np.concatenate(reference.levels + live.levels)
+    return float(np.max(np.abs(reference.cdf(points) - live.cdf(points))))
+
+
+# ─────────────────────────────────────────────
+# 2. MERGEABLE WINDOW SKETCHES
+# ─────────────────────────────────────────────
+class WindowSketches:
+    """Histograms (on the reference's bins) and quantile sketches of one time window."""
+
+    def __init__(self, reference: DriftReference, window_start: int):
+        self.window_start = window_start
+        self.records  = 0
+        self.counts   = [np.zeros(len(e) + 2, dtype=np.int64) for e in reference.edges]
+        self.sketches = [_new_sketch() for _ in reference.columns]
+
+    def update(self, rows: np.ndarray, reference: DriftReference) -> None:
+        """Fold a (records x columns) block in, one vectorised pass per column."""
+        self.records += len(rows)
+        for j, edges in enumerate(reference.edges):
+            self.counts[j] += _bin_counts(rows[:, j], edges)
+            self.sketches[j].update(rows[:, j])
+
+    def merge(self, other: 'WindowSketches') -> None:
+        self.records += other.records
+        for j, sketch in enumerate(other.sketches):
+            self.counts[j] += other.counts[j]
+            self.sketches[j].merge(sketch)
+
+
+# ─────────────────────────────────────────────
+# 3. PER-WORKER MONITOR
+# ─────────────────────────────────────────────
+class DriftMonitor:
+    """
+    observe() copies each scored record into a preallocated buffer
+    (O(1) per record); every `buffer_rows` records the buffer is folded
+    into the current window's sketches. Windows last `window_seconds`;
+    the current one is snapshotted to `directory` at most every
+    `flush_seconds` and when it closes. Windows older than
+    `retention_hours` are deleted. A report over fewer than
+    `min_records` records gives no stable / watch / drift verdict.
+    """
+
+    def __init__(self, reference: DriftReference, directory: str, window_seconds: float = 3600,
+                 flush_seconds: float = 30, retention_hours: float = 168, buffer_rows: int = 256,
+                 min_records: int = MIN_RECORDS):
+        self.reference       = reference
+        self.directory       = directory
+        self.window_seconds  = window_seconds
+        self.flush_seconds   = flush_seconds
+        self.retention_hours = retention_hours
+        self.min_records     = min_records
+        self.worker   = f'{socket.gethostname()}-{os.getpid()}'
+        self._pending = np.empty((buffer_rows, len(reference.columns)))
+        self._n       = 0
+        self._window  = WindowSketches(reference, self._window_start(time.time()))
+        self._dirty   = False
+        self._last_flush = time.time()
+        self._lock    = threading.Lock()
+        self._warned  = False
+
+    def _window_start(self, now: float) -> int:
+        return int(now // self.window_seconds * self.window_seconds)
+
+    def _path(self, window_start: int) -> str:
+        return os.path.join(self.directory, f'{window_start}-{self.worker}.pkl')
+
+    # ── Observe ───────────────────────────────────────────
+    def observe(self, X: np.ndarray, proba: np.ndarray) -> None:
+        """Record the model inputs `X` (records x features) and fraud probabilities scored."""
+        rows = np.column_stack([np.asarray(X, dtype=np.float64), np.asarray(proba, dtype=np.float64)])
+        closed = None
+        with self._lock:
+            now = time.time()
+            if self._window_start(now) != self._window.window_start:
+                self._fold()
+                closed = self._window
+                self._window = WindowSketches(self.reference, self._window_start(now))
+            if len(rows) >= len(self._pending):
+                # Large batches skip the buffer: one vectorised update
+                self._fold()
+                self._window.update(rows, self.reference)
+            else:
+                i = 0
+                while i < len(rows):
+                    take = min(len(rows) - i, len(self._pending) - self._n)
+                    self._pending[self._n:self._n + take] = rows[i:i + take]
+                    self._n += take
+                    i += take
+                    if self._n == len(self._pending):
+                        self._fold()
+            self._dirty = True
+        if closed is not None:
+            self._save(closed)
+            self._prune(now)
+        if now - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def _fold(self) -> None:
+        """Move buffered records into the window (caller holds the lock)."""
+        if self._n:
+            self._window.update(self._pending[:self._n], self.reference)
+            self._n = 0
+
+    # ── Persistence ───────────────────────────────────────
+    def flush(self) -> None:
+        """Snapshot the current window for other workers' reports."""
+        with self._lock:
+            self._fold()
+            window, self._dirty = (self._window if self._dirty else None), False
+            self._last_flush = time.time()
+            if window is not None:
+                self._save(window)
+
+    def _save(self, window: WindowSketches) -> None:
+        path = self._path(window.window_start)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            joblib.dump(window, f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+        except OSError as exc:
+            if not self._warned:
+                self._warned = True
+                print(f"⚠️  Drift snapshot failed: {exc!r}")
+
+    def _snapshots(self):
+        """(window start, path) of every worker's snapshot in the directory."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in names:
+            start = name.split('-', 1)[0]
+            if name.endswith('.pkl') and start.isdigit():
+                out.append((int(start), os.path.join(self.directory, name)))
+        return out
+
+    def _prune(self, now: float) -> None:
+        for start, path in self._snapshots():
+            if start < now - self.retention_hours * 3600:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ── Report ────────────────────────────────────────────
+    def report(self, hours: float = 24) -> dict:
+        """
+        Every worker's windows starting within the last `hours` (this
+        worker's current one from memory), merged and compared with the
+        reference column by column. With fewer than `min_records`
+        records every column is 'insufficient data' and none drifted.
+        """
+        since = self._window_start(time.time() - hours * 3600)
+        with self._lock:
+            self._fold()
+            merged = WindowSketches(self.reference, since)
+            merged.merge(self._window)
+            own = self._path(self._window.window_start)
+        workers = {self.worker}
+        for start, path in self._snapshots():
+            if start < since or path == own:
+                continue
+            try:
+                merged.merge(joblib.load(path))
+            except (OSError, EOFError, ValueError) as exc:
+                print(f"⚠️  Skipping unreadable drift snapshot {path}: {exc!r}")
+                continue
+            workers.add(os.path.basename(path).split('-', 1)[1][:-4])
+
+        features, drifted = {}, []
+        ref = self.reference
+        for j, name in enumerate(ref.columns):
+            live = merged.sketches[j]
+            p, d = psi(ref.expected[j], merged.counts[j]), ks(ref.sketches[j], live)
+            status = ('drift' if p >= PSI_DRIFT or d >= KS_DRIFT else
+                      'watch' if p >= PSI_WATCH or d >= KS_WATCH else 'stable')
+            if merged.records == 0:
+                status = 'no data'
+            elif merged.records < self.min_records:
+                status = 'insufficient data'
+            elif status == 'drift':
+                drifted.append(name)
+            features[name] = {
+                'psi'           : round(p, 4) if p == p else None,
+                'ks'            : round(d, 4) if d == d else None,
+                'status'        : status,
+                'median'        : live.quantile(0.5) if live.count else None,
+                'reference_median': ref.sketches[j].quantile(0.5),
+            }
+        return {
+            'window_hours'     : hours,
+            'since'            : since,
+            'records'          : merged.records,
+            'min_records'      : self.min_records,
+            'workers'          : len(workers),
+            'reference_records': max(ref.records, default=0),
+            'drifted'          : drifted,
+            'features'         : features,
+        }
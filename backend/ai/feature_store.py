@@ -0,0 +1,1046 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Online Feature State
+  Long-lived state consulted by engineer_features so that
+  live scoring does not depend on what else is in the request
+=============================================================
+"""
+import copy
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+# ─────────────────────────────────────────────
+# 1. RUNNING MOMENTS (Welford / Chan)
+# ─────────────────────────────────────────────
+class RunningMoments:
+    """Mean and variance updated incrementally, batch-at-a-time."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = int(count)
+        self.mean  = float(mean)
+        self.m2    = float(m2)
+
+    @classmethod
+    def from_values(cls, values) -> 'RunningMoments':
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        mean = values.mean()
+        return cls(len(values), mean, ((values - mean) ** 2).sum())
+
+    def add(self, x: float) -> None:
+        """Classic one-value Welford step."""
+        if x != x:      # NaN
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2   += delta * (x - self.mean)
+
+    def update(self, values) -> None:
+        """Fold a batch of values in with Chan et al.'s pairwise merge."""
+        self.merge(RunningMoments.from_values(values))
+
+    def merge(self, other: 'RunningMoments') -> None:
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+        n     = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean  += delta * other.count / n
+        self.m2    += other.m2 + delta ** 2 * self.count * other.count / n
+        self.count  = n
+
+    @property
+    def std(self) -> float:
+        # Sample std (ddof=1) to match pandas Series.std()
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+
+# ─────────────────────────────────────────────
+# 2. STREAMING QUANTILE (P² algorithm)
+# ─────────────────────────────────────────────
+class P2Quantile:
+    """
+    Jain & Chlamtac P² estimator: tracks one quantile with five markers,
+    O(1) memory and O(1) work per observation.
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights   = []                 # marker heights (exact values until 5 seen)
+        self.positions = np.arange(1.0, 6.0)
+        self.desired   = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5], dtype=float)
+        self.increment = np.array([0, p / 2, p, (1 + p) / 2, 1], dtype=float)
+
+    @classmethod
+    def from_values(cls, p: float, values) -> 'P2Quantile':
+        """Seed the markers from a full sample (e.g. the training set)."""
+        est = cls(p)
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) < 5:
+            for v in values:
+                est.add(v)
+            return est
+        n = len(values)
+        est.heights   = list(np.quantile(values, est.increment))
+        est.positions = 1 + (n - 1) * est.increment
+        est.positions = np.round(est.positions)
+        est.desired   = 1 + (n - 1) * est.increment
+        return est
+
+    @property
+    def count(self) -> int:
+        return len(self.heights) if len(self.heights) < 5 else int(self.positions[4])
+
+    def add(self, x: float) -> None:
+        q = self.heights
+        if len(q) < 5:
+            q.append(float(x))
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = max(q[4], x)
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        self.positions[k + 1:] += 1
+        self.desired += self.increment
+
+        n = self.positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1.0 if d > 0 else -1.0
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    # Parabolic step overshoots a neighbour: fall back to linear
+                    j = i + int(d)
+                    qp = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def update(self, values) -> None:
+        for v in np.asarray(values, dtype=float):
+            if not np.isnan(v):
+                self.add(v)
+
+    @property
+    def value(self) -> float:
+        q = self.heights
+        if not q:
+            return float('nan')
+        if len(q) < 5:
+            return float(np.quantile(q, self.p))
+        return float(q[2])
+
+
+# ── Mergeable quantile sketch ─────────────────────────
+class QuantileSketch:
+    """
+    KLL-style compactor sketch: level h keeps at most `k` values, each
+    standing for 2**h observations. A full level is sorted and every
+    other value (random offset) is promoted, so updates are vectorised
+    per batch, memory is O(k log n) and two sketches merge level by
+    level. Rank error is roughly log2(n / k) / k.
+
+    Exposes `value` for quantile `p`, so it can stand in for P2Quantile
+    where batches arrive in bulk (offline pre-passes).
+    """
+
+    def __init__(self, p: float = 0.5, k: int = 1024, seed: int = 0):
+        self.p      = p
+        self.k      = k
+        self.count  = 0
+        self.levels = [np.empty(0)]
+        self._rng   = np.random.default_rng(seed)
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def add(self, x: float) -> None:
+        self.update([x])
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._compact()
+
+    def _compact(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self.k:
+                level = np.sort(level)
+                keep  = level[len(level) - len(level) % 2:]      # odd one out stays here
+                self.levels[h] = keep
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                promoted = level[self._rng.integers(2):len(level) - len(keep):2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def quantile(self, q: float) -> float:
+        values  = np.concatenate(self.levels)
+        if len(values) == 0:
+            return float('nan')
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order   = np.argsort(values, kind='stable')
+        cum     = np.cumsum(weights[order])
+        return float(values[order][min(np.searchsorted(cum, q * cum[-1]), len(cum) - 1)])
+
+    def cdf(self, x) -> np.ndarray:
+        """Estimated fraction of observations <= each value of `x`."""
+        values = np.concatenate(self.levels)
+        if len(values) == 0:
+            return np.full(np.shape(x), np.nan)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order   = np.argsort(values, kind='stable')
+        cum     = np.concatenate([[0.0], np.cumsum(weights[order])])
+        return cum[np.searchsorted(values[order], x, side='right')] / cum[-1]
+
+    @property
+    def value(self) -> float:
+        return self.quantile(self.p)
+
+
+class ExactQuantile:
+    """A quantile computed exactly offline; ignores further observations."""
+
+    def __init__(self, value: float):
+        self.value = float(value)
+
+    def add(self, x: float) -> None:
+        pass
+
+    def update(self, values) -> None:
+        pass
+
+
+# ─────────────────────────────────────────────
+# 3. POPULATION STATISTICS
+# ─────────────────────────────────────────────
+# Columns engineer_features turns into z-scores
+ZSCORE_COLS   = ['Transport_Time', 'Quantity', 'Distributor_Total_Qty']
+BULK_QUANTILE = 0.95
+
+
+class FeatureStats:
+    """
+    Population mean / std / quantile state for the z-score and bulk
+    purchase features. Captured at training time, then updated as
+    records are scored so online requests are scored against the
+    population instead of against themselves. Online values must be
+    the quantity training used: Distributor_Total_Qty is a distributor
+    total (see FeatureStore.prior_distributor_total), not one record's.
+    """
+
+    def __init__(self, moments: dict, quantity_q95: P2Quantile):
+        self.moments      = moments
+        self.quantity_q95 = quantity_q95
+
+    @classmethod
+    def from_frame(cls, df_feat: pd.DataFrame) -> 'FeatureStats':
+        moments = {col: RunningMoments.from_values(df_feat[col]) for col in ZSCORE_COLS}
+        return cls(moments, P2Quantile.from_values(BULK_QUANTILE, df_feat['Quantity']))
+
+    def mean_std(self, col: str):
+        m = self.moments[col]
+        return m.mean, m.std
+
+    def bulk_threshold(self) -> float:
+        return self.quantity_q95.value
+
+    def update(self, df_feat: pd.DataFrame) -> None:
+        for col in ZSCORE_COLS:
+            self.moments[col].update(df_feat[col])
+        self.quantity_q95.update(df_feat['Quantity'])
+
+    def update_one(self, record: dict) -> None:
+        for col in ZSCORE_COLS:
+            self.moments[col].add(record[col])
+        self.quantity_q95.add(record['Quantity'])
+
+
+# ─────────────────────────────────────────────
+# 4. CROSS-REQUEST DUPLICATE BATCH_ID INDEX
+# ─────────────────────────────────────────────
+# PredictionInput's default Batch_ID: records sent without one all share
+# it, so it identifies nothing and is never counted as a duplicate
+UNKNOWN_BATCH_ID = 'BATCH-0000'
+
+
+def scan_key(ts_us: int, location) -> int:
+    """
+    Identity of one checkpoint scan of a batch: its timestamp (integer
+    microseconds since 1970) and location. Scoring the same scan again
+    does not make it a duplicate of itself.
+    """
+    return zlib.crc32(f'{int(ts_us)}|{location}'.encode())
+
+
+def scan_keys(df: pd.DataFrame) -> np.ndarray:
+    """scan_key of every row of a frame with a naive Timestamp column."""
+    ts_us = pd.to_datetime(df['Timestamp']).to_numpy(dtype='datetime64[us]').view(np.int64)
+    locations = df['Last_Location'] if 'Last_Location' in df.columns else [''] * len(df)
+    return np.fromiter((scan_key(t, loc) for t, loc in zip(ts_us, locations)),
+                       dtype=np.int64, count=len(df))
+
+
+def _bloom_slots(key: str, n_counters: int) -> tuple:
+    """Four counter positions by double hashing over CRC32/Adler32 (stable across processes)."""
+    data = key.encode()
+    h1 = zlib.crc32(data)
+    h2 = zlib.adler32(data) | 1
+    return (h1 % n_counters, (h1 + h2) % n_counters,
+            (h1 + 2 * h2) % n_counters, (h1 + 3 * h2) % n_counters)
+
+
+class DuplicateIndex:
+    """
+    Long-lived Batch_ID occurrence counts across requests: one per
+    distinct scan (see scan_key), UNKNOWN_BATCH_ID never counted.
+
+    Recently seen IDs are kept exactly in an LRU dict (O(1) lookup),
+    with the keys of their last MAX_SCAN_KEYS counted scans; a re-scan
+    older than that counts again.
+    IDs that age out of it, or are pushed out by the byte budget, are
+    folded into a counting Bloom filter: saturating 8-bit counters,
+    read back as the minimum over four slots, so counts are never
+    under-estimated. The filter rotates in generations so the long
+    tail is forgotten after `retention_seconds`. Memory is fixed up
+    front by `max_memory_mb`: a quarter for the filter, the rest for
+    exact entries, each charged for the scan keys it holds.
+    """
+
+    EXACT_ENTRY_BYTES = 300   # rough dict + OrderedDict + list + empty scan-key list cost per ID
+    SCAN_KEY_BYTES    = 48    # one int scan key and its list slot
+    MAX_SCAN_KEYS     = 8
+    N_GENERATIONS     = 3
+
+    def __init__(self, max_memory_mb: float = 64, recent_seconds: float = 24 * 3600,
+                 retention_seconds: float = 90 * 24 * 3600):
+        budget = int(max_memory_mb * 1024 * 1024)
+        sketch_bytes = budget // 4
+        self.exact_budget      = max(self.EXACT_ENTRY_BYTES, budget - sketch_bytes)
+        self.exact_bytes       = 0
+        self.recent_seconds    = recent_seconds
+        self.retention_seconds = retention_seconds
+        self.recent = OrderedDict()           # Batch_ID -> [count, last_seen, scan keys], oldest first
+        # bytearray rather than NumPy: scalar indexing is several times cheaper
+        self.n_counters  = max(1, sketch_bytes // self.N_GENERATIONS)
+        self.generations = [bytearray(self.n_counters) for _ in range(self.N_GENERATIONS)]
+        self.generation_started = time.time()
+
+    def _upgrade(self) -> None:
+        """Snapshots from before the byte budget: entry-count cap, unbounded (or no) scan-key sets."""
+        self.exact_budget = self.__dict__.pop('max_exact', 1) * 400
+        self.exact_bytes  = 0
+        for entry in self.recent.values():
+            scans = list(entry[2])[-self.MAX_SCAN_KEYS:] if len(entry) > 2 else []
+            entry[2:] = [scans]
+            self.exact_bytes += self._entry_bytes(entry)
+
+    def _entry_bytes(self, entry: list) -> int:
+        return self.EXACT_ENTRY_BYTES + self.SCAN_KEY_BYTES * len(entry[2])
+
+    def _sketch_count(self, batch_id: str) -> int:
+        a, b, c, d = _bloom_slots(batch_id, self.n_counters)
+        return sum(min(g[a], g[b], g[c], g[d]) for g in self.generations)
+
+    def seen(self, batch_id: str, scan: int) -> bool:
+        """Whether this exact scan was already counted (known only while the ID is kept exactly)."""
+        entry = self.recent.get(batch_id)
+        return entry is not None and scan in entry[2]
+
+    def count(self, batch_id: str, scan: int = None) -> int:
+        """How many scans of this Batch_ID have been observed before, `scan` itself excluded."""
+        if batch_id == UNKNOWN_BATCH_ID:
+            return 0
+        entry = self.recent.get(batch_id)
+        if entry is not None:
+            return entry[0] - (scan is not None and scan in entry[2])
+        return self._sketch_count(batch_id)
+
+    def add(self, batch_id: str, count: int = 1, now: float = None, scan: int = None) -> bool:
+        """
+        Count `count` occurrences of a Batch_ID (one if `scan` is given).
+        Returns False, counting nothing, for a scan already counted;
+        UNKNOWN_BATCH_ID is never counted but is always a new scan.
+        """
+        if batch_id == UNKNOWN_BATCH_ID:
+            return True
+        now = time.time() if now is None else now
+        entry = self.recent.get(batch_id)
+        if entry is None:
+            # Carry over whatever the sketch already knows about this ID
+            entry = [self._sketch_count(batch_id), now, []]
+            self.recent[batch_id] = entry
+            self.exact_bytes += self.EXACT_ENTRY_BYTES
+        else:
+            self.recent.move_to_end(batch_id)
+        if scan is not None:
+            scans = entry[2]
+            if scan in scans:
+                entry[1] = now
+                return False
+            if len(scans) < self.MAX_SCAN_KEYS:
+                self.exact_bytes += self.SCAN_KEY_BYTES
+            else:
+                del scans[0]
+            scans.append(scan)
+            count = 1
+        entry[0] += count
+        entry[1]  = now
+        self._evict(now)
+        return True
+
+    def _evict(self, now: float) -> None:
+        if now - self.generation_started >= self.retention_seconds / self.N_GENERATIONS:
+            self.generations.pop(0)
+            self.generations.append(bytearray(self.n_counters))
+            self.generation_started = now
+
+        cutoff = now - self.recent_seconds
+        while self.recent:
+            batch_id, entry = next(iter(self.recent.items()))
+            if entry[1] >= cutoff and self.exact_bytes <= self.exact_budget:
+                break
+            del self.recent[batch_id]
+            self.exact_bytes -= self._entry_bytes(entry)
+            # The sketch already holds the carried-over part; add only the difference
+            missing = entry[0] - self._sketch_count(batch_id)
+            if missing > 0:
+                newest = self.generations[-1]
+                for i in _bloom_slots(batch_id, self.n_counters):
+                    newest[i] = min(newest[i] + missing, 255)
+
+    def memory_bytes(self) -> int:
+        return self.exact_bytes + self.n_counters * self.N_GENERATIONS
+
+
+# ─────────────────────────────────────────────
+# 5. SLIDING-WINDOW DISTRIBUTOR QUANTITIES
+# ─────────────────────────────────────────────
+# window name -> (window length in seconds, number of ring buckets)
+DISTRIBUTOR_WINDOWS = {
+    '24h': (24 * 3600,      24),    # 1h buckets
+    '7d' : (7 * 24 * 3600,  28),    # 6h buckets
+    '30d': (30 * 24 * 3600, 30),    # 1d buckets
+}
+
+
+class DistributorWindows:
+    """
+    Rolling quantity totals per Distributor_ID over several windows.
+
+    Each distributor owns one row of a preallocated ring buffer per
+    window; a bucket is tagged with the epoch (bucket number since
+    1970) it currently holds, so stale buckets are recycled lazily on
+    write and ignored on read. Updates are O(1) and reads O(buckets).
+    Memory is fixed by `max_distributors`; the least recently updated
+    distributor gives up its row when the table is full.
+
+    Each row also keeps a running total of everything the distributor
+    shipped: the online counterpart of the whole-frame
+    Distributor_Total_Qty that training computes.
+    """
+
+    def __init__(self, windows: dict = None, max_distributors: int = 20_000):
+        self.windows = dict(windows or DISTRIBUTOR_WINDOWS)
+        self.max_distributors = max_distributors
+        self.slots = OrderedDict()            # Distributor_ID -> row, least recent first
+        self.running = np.zeros(max_distributors, dtype=np.float64)
+        self.totals = {}
+        self.epochs = {}
+        for name, (span, n_buckets) in self.windows.items():
+            self.totals[name] = np.zeros((max_distributors, n_buckets), dtype=np.float64)
+            # Epoch 0 (1970) is always stale, so zeroed (lazily paged) memory means "empty"
+            self.epochs[name] = np.zeros((max_distributors, n_buckets), dtype=np.int32)
+
+    def _bucket_seconds(self, name: str) -> float:
+        span, n_buckets = self.windows[name]
+        return span / n_buckets
+
+    def _slot(self, distributor_id: str) -> int:
+        slot = self.slots.get(distributor_id)
+        if slot is not None:
+            self.slots.move_to_end(distributor_id)
+            return slot
+        if len(self.slots) < self.max_distributors:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.running[slot] = 0.0
+            for name in self.windows:
+                self.totals[name][slot] = 0.0
+                self.epochs[name][slot] = 0
+        self.slots[distributor_id] = slot
+        return slot
+
+    def add(self, distributor_id: str, quantity: float, ts: float) -> None:
+        """Record `quantity` units for a distributor at epoch-seconds `ts`."""
+        slot = self._slot(distributor_id)
+        self.running[slot] += quantity
+        for name, (span, n_buckets) in self.windows.items():
+            epoch = int(ts // self._bucket_seconds(name))
+            i = epoch % n_buckets
+            held = self.epochs[name][slot, i]
+            if held == epoch:
+                self.totals[name][slot, i] += quantity
+            elif held < epoch:
+                self.epochs[name][slot, i] = epoch
+                self.totals[name][slot, i] = quantity
+            # else: event is older than the window this bucket now covers
+
+    def totals_at(self, distributor_ids, ts) -> dict:
+        """
+        Window totals for each (distributor, epoch-seconds) pair, vectorised.
+        Returns {window name: float array}; unknown distributors get 0.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        slots = np.array([self.slots.get(d, -1) for d in distributor_ids], dtype=np.int64)
+        known = slots >= 0
+        out = {}
+        for name, (span, n_buckets) in self.windows.items():
+            result = np.zeros(len(slots))
+            if known.any():
+                rows   = slots[known]
+                epoch  = (ts[known] // self._bucket_seconds(name)).astype(np.int64)[:, None]
+                held   = self.epochs[name][rows]
+                live   = (held > epoch - n_buckets) & (held <= epoch)
+                result[known] = np.where(live, self.totals[name][rows], 0.0).sum(axis=1)
+            out[name] = result
+        return out
+
+    def running_totals(self, distributor_ids) -> np.ndarray:
+        """Everything each distributor shipped so far; unknown distributors get 0."""
+        slots = np.array([self.slots.get(d, -1) for d in distributor_ids], dtype=np.int64)
+        return np.where(slots >= 0, self.running[slots], 0.0)
+
+    def totals_one(self, distributor_id: str, ts: float) -> dict:
+        """Scalar version of totals_at for the single-record fast path."""
+        slot = self.slots.get(distributor_id)
+        out = {}
+        for name, (span, n_buckets) in self.windows.items():
+            if slot is None:
+                out[name] = 0.0
+                continue
+            epoch = int(ts // self._bucket_seconds(name))
+            held  = self.epochs[name][slot]
+            live  = (held > epoch - n_buckets) & (held <= epoch)
+            out[name] = float(self.totals[name][slot][live].sum())
+        return out
+
+    def memory_bytes(self) -> int:
+        return (self.running.nbytes + sum(a.nbytes for a in self.totals.values())
+                + sum(a.nbytes for a in self.epochs.values()))
+
+
+# ─────────────────────────────────────────────
+# 5b. PER-BATCH TRAJECTORIES (checkpoint events)
+# ─────────────────────────────────────────────
+TEMPERATURE_LIMIT_C = 10.0       # same threshold checkpointRoutes.js alerts on
+EARTH_RADIUS_KM     = 6371.0
+MIN_SCAN_INTERVAL_S = 60.0       # floor for implied speed: GPS jitter between rapid rescans
+
+# Feature column -> TrajectoryStore state column
+TRAJECTORY_FEATURES = {
+    'Trajectory_Scans'  : 'n_events',
+    'Trajectory_Km'     : 'distance_km',
+    'Max_Speed_Kmh'     : 'max_speed_kmh',
+    'Max_Scan_Gap_Hours': 'max_gap_h',
+    'Temp_Excursions'   : 'temp_excursions',
+}
+TRAJECTORY_COLS = list(TRAJECTORY_FEATURES) + ['Hours_Since_Last_Scan']
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works on scalars and numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class TrajectoryStore:
+    """
+    Running trajectory summary per Batch_ID, folded from raw checkpoint
+    scans (models/Checkpoint.js) so no scan history is kept.
+
+    State lives in preallocated numpy columns, one row per batch; an
+    event is O(1) and a batch costs 80 bytes of columns. The least recently
+    scanned batch gives up its row when `max_batches` is reached.
+    Scans older than the batch's last scan still count, but do not
+    move the trajectory (legs are only built in time order).
+    """
+    FLOAT_COLUMNS = ('first_ts', 'last_ts', 'last_lat', 'last_lon', 'distance_km',
+                     'max_speed_kmh', 'max_gap_h', 'max_temp', 'last_temp')
+    INT_COLUMNS   = ('n_events', 'temp_excursions')
+
+    def __init__(self, max_batches: int = 100_000, temperature_limit: float = TEMPERATURE_LIMIT_C):
+        self.max_batches = max_batches
+        self.temperature_limit = temperature_limit
+        self.slots = OrderedDict()            # Batch_ID -> row, least recent first
+        self.columns = {c: np.zeros(max_batches, dtype=np.float64) for c in self.FLOAT_COLUMNS}
+        self.columns.update({c: np.zeros(max_batches, dtype=np.int32) for c in self.INT_COLUMNS})
+
+    def _slot(self, batch_id: str) -> int:
+        slot = self.slots.get(batch_id)
+        if slot is not None:
+            self.slots.move_to_end(batch_id)
+            return slot
+        if len(self.slots) < self.max_batches:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+        for values in self.columns.values():
+            values[slot] = 0
+        self.columns['last_temp'][slot] = np.nan
+        self.columns['max_temp'][slot]  = np.nan
+        self.slots[batch_id] = slot
+        return slot
+
+    def add_event(self, batch_id: str, ts: float, lat: float, lon: float,
+                  temperature: float = None) -> dict:
+        """Fold one scan (epoch-seconds `ts`) into its batch; returns the new state."""
+        c = self.columns
+        slot = self._slot(batch_id)
+        if c['n_events'][slot] == 0:
+            c['first_ts'][slot] = c['last_ts'][slot] = ts
+            c['last_lat'][slot], c['last_lon'][slot] = lat, lon
+        elif ts >= c['last_ts'][slot]:
+            km  = float(haversine_km(c['last_lat'][slot], c['last_lon'][slot], lat, lon))
+            gap = ts - c['last_ts'][slot]
+            c['distance_km'][slot]   += km
+            c['max_speed_kmh'][slot]  = max(c['max_speed_kmh'][slot],
+                                            km / (max(gap, MIN_SCAN_INTERVAL_S) / 3600))
+            c['max_gap_h'][slot]      = max(c['max_gap_h'][slot], gap / 3600)
+            c['last_ts'][slot] = ts
+            c['last_lat'][slot], c['last_lon'][slot] = lat, lon
+        else:
+            c['first_ts'][slot] = min(c['first_ts'][slot], ts)
+        c['n_events'][slot] += 1
+
+        if temperature is not None and not np.isnan(temperature):
+            # An excursion is a run of scans above the limit, counted once when it starts
+            above = temperature > self.temperature_limit
+            was   = c['last_temp'][slot] > self.temperature_limit     # NaN -> False
+            if above and not was:
+                c['temp_excursions'][slot] += 1
+            c['last_temp'][slot] = temperature
+            c['max_temp'][slot]  = np.fmax(c['max_temp'][slot], temperature)
+        return self.state(batch_id)
+
+    def state(self, batch_id: str) -> dict:
+        """Current summary for a batch; None if it has no scans (or was evicted)."""
+        slot = self.slots.get(batch_id)
+        if slot is None:
+            return None
+        out = {c: float(values[slot]) for c, values in self.columns.items()}
+        for c in self.INT_COLUMNS:
+            out[c] = int(out[c])
+        for c in ('max_temp', 'last_temp'):
+            out[c] = None if np.isnan(out[c]) else out[c]
+        return out
+
+    def features_at(self, batch_ids, ts) -> dict:
+        """
+        Trajectory features per (Batch_ID, epoch-seconds) pair, vectorised.
+        Returns {feature column: float array}; batches without scans get NaN.
+        Hours_Since_Last_Scan is measured from the record's own timestamp.
+        """
+        ts = np.asarray(ts, dtype=np.float64)
+        slots = np.array([self.slots.get(b, -1) for b in batch_ids], dtype=np.int64)
+        known = slots >= 0
+        rows  = slots[known]
+        out = {}
+        for feature, col in TRAJECTORY_FEATURES.items():
+            out[feature] = np.full(len(slots), np.nan)
+            out[feature][known] = self.columns[col][rows]
+        out['Hours_Since_Last_Scan'] = np.full(len(slots), np.nan)
+        out['Hours_Since_Last_Scan'][known] = (ts[known] - self.columns['last_ts'][rows]) / 3600
+        return out
+
+    def features_one(self, batch_id: str, ts: float) -> dict:
+        """Scalar version of features_at for the single-record fast path."""
+        slot = self.slots.get(batch_id)
+        if slot is None:
+            return dict.fromkeys(TRAJECTORY_COLS, float('nan'))
+        out = {feature: float(self.columns[col][slot]) for feature, col in TRAJECTORY_FEATURES.items()}
+        out['Hours_Since_Last_Scan'] = (ts - float(self.columns['last_ts'][slot])) / 3600
+        return out
+
+    def memory_bytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+
+# ─────────────────────────────────────────────
+# 6. FEATURE STORE (persisted container)
+# ─────────────────────────────────────────────
+class FeatureStore:
+    """
+    Bundles every piece of online feature state and handles
+    locking and persistence for it.
+
+    When loaded from a path, the store snapshots itself back to
+    that path at most every `autosave_seconds` while observing.
+
+    The state lives in one process: cross-request duplicates,
+    distributor windows and trajectories need a single scoring worker
+    (uvicorn --workers 1). With several, each worker sees only its
+    own traffic and the snapshot holds whichever saved last; save()
+    warns once when it finds another process wrote the file.
+    """
+
+    def __init__(self, stats: FeatureStats = None, duplicates: DuplicateIndex = None,
+                 distributors: DistributorWindows = None, trajectories: TrajectoryStore = None,
+                 path: str = None, autosave_seconds: float = 300):
+        self.stats        = stats
+        self.duplicates   = duplicates if duplicates is not None else DuplicateIndex()
+        self.distributors = distributors if distributors is not None else DistributorWindows()
+        self.trajectories = trajectories if trajectories is not None else TrajectoryStore()
+        self.path       = path
+        self.autosave_seconds = autosave_seconds
+        self._last_save = time.time()
+        self._saved_mtime = None          # st_mtime_ns of our last snapshot at `path`
+        self._warned    = False
+        self._lock = threading.Lock()
+
+    def observe(self, df_feat: pd.DataFrame) -> None:
+        """
+        Fold a batch of scored (feature-engineered) records into the
+        state. Scans already observed (re-scored records) are skipped.
+        """
+        with self._lock:
+            if 'Batch_ID' in df_feat.columns:
+                now = time.time()
+                new = np.fromiter((self.duplicates.add(b, 1, now, scan) for b, scan in
+                                   zip(df_feat['Batch_ID'].astype(str), scan_keys(df_feat))),
+                                  dtype=bool, count=len(df_feat))
+                if not new.all():
+                    df_feat = df_feat[new]
+            if self.stats is not None:
+                self.stats.update(df_feat)
+            if 'Distributor_ID' in df_feat.columns:
+                for dist, qty, ts in zip(df_feat['Distributor_ID'].astype(str),
+                                         df_feat['Quantity'].to_numpy(dtype=float),
+                                         epoch_seconds(df_feat['Timestamp'])):
+                    self.distributors.add(dist, qty, ts)
+
+        if self.path and time.time() - self._last_save >= self.autosave_seconds:
+            self.save(self.path)
+
+    def observe_record(self, record: dict) -> None:
+        """
+        Single-record observe() for the fast path. `record` holds the
+        raw and engineered values by column name, Timestamp as a datetime.
+        """
+        since = record['Timestamp'] - datetime(1970, 1, 1)
+        scan  = scan_key(since // timedelta(microseconds=1), record.get('Last_Location'))
+        with self._lock:
+            if self.duplicates.add(str(record['Batch_ID']), 1, time.time(), scan):
+                if self.stats is not None:
+                    self.stats.update_one(record)
+                self.distributors.add(str(record['Distributor_ID']), float(record['Quantity']),
+                                      since.total_seconds())
+
+        if self.path and time.time() - self._last_save >= self.autosave_seconds:
+            self.save(self.path)
+
+    def observe_event(self, batch_id: str, ts: float, lat: float, lon: float,
+                      temperature: float = None) -> dict:
+        """Fold one raw checkpoint scan into its batch's trajectory; returns the new state."""
+        with self._lock:
+            state = self.trajectories.add_event(batch_id, ts, lat, lon, temperature)
+
+        if self.path and time.time() - self._last_save >= self.autosave_seconds:
+            self.save(self.path)
+        return state
+
+    def prior_batch_count(self, batch_id: str, scan: int = None) -> int:
+        with self._lock:
+            return self.duplicates.count(batch_id, scan)
+
+    def prior_distributor_totals_one(self, distributor_id: str, ts: float) -> dict:
+        with self._lock:
+            return self.distributors.totals_one(distributor_id, ts)
+
+    def trajectory_one(self, batch_id: str, ts: float) -> dict:
+        with self._lock:
+            return self.trajectories.features_one(batch_id, ts)
+
+    def prior_batch_counts(self, df: pd.DataFrame) -> pd.Series:
+        """Scans of each row's Batch_ID seen in earlier requests, the row's own scan excluded."""
+        with self._lock:
+            counts = [self.duplicates.count(str(b), scan)
+                      for b, scan in zip(df['Batch_ID'], scan_keys(df))]
+        return pd.Series(counts, index=df.index, dtype=np.int64)
+
+    def prior_distributor_totals(self, distributor_ids: pd.Series, timestamps: pd.Series) -> dict:
+        """Rolling quantity per window from records seen in earlier requests."""
+        with self._lock:
+            return self.distributors.totals_at(distributor_ids.astype(str), epoch_seconds(timestamps))
+
+    def prior_distributor_total(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Quantity each row's distributor shipped in earlier requests: what
+        a training frame's whole-frame Distributor_Total_Qty holds and a
+        small online frame lacks. A row whose scan was observed before
+        is not counted twice.
+        """
+        qty = df['Quantity'].to_numpy(dtype=np.float64)
+        with self._lock:
+            totals = self.distributors.running_totals(df['Distributor_ID'].astype(str))
+            seen = (np.fromiter((self.duplicates.seen(str(b), scan) for b, scan in
+                                 zip(df['Batch_ID'], scan_keys(df))), dtype=bool, count=len(df))
+                    if 'Batch_ID' in df.columns else np.zeros(len(df), dtype=bool))
+        return np.maximum(totals - np.where(seen, qty, 0.0), 0.0)
+
+    def prior_distributor_total_one(self, distributor_id: str, batch_id: str,
+                                    scan: int, quantity: float) -> float:
+        """Scalar version of prior_distributor_total for the single-record fast path."""
+        with self._lock:
+            slot  = self.distributors.slots.get(distributor_id)
+            total = float(self.distributors.running[slot]) if slot is not None else 0.0
+            if self.duplicates.seen(batch_id, scan):
+                total -= quantity
+        return max(total, 0.0)
+
+    def prior_trajectories(self, batch_ids: pd.Series, timestamps: pd.Series) -> dict:
+        """Trajectory features of each record's batch from checkpoint scans seen so far."""
+        with self._lock:
+            return self.trajectories.features_at(batch_ids.astype(str), epoch_seconds(timestamps))
+
+    def save(self, path: str) -> None:
+        # Per-process temporary name: concurrent savers never write into each other's file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                   prefix=f'.{os.path.basename(path)}-')
+        with self._lock:
+            if path == self.path:
+                self._check_single_writer(path)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    joblib.dump({'stats': self.stats, 'duplicates': self.duplicates,
+                                 'distributors': self.distributors, 'trajectories': self.trajectories}, f)
+                os.replace(tmp, path)     # atomic: a crash never leaves a torn snapshot
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._saved_mtime = os.stat(path).st_mtime_ns
+            self._last_save = time.time()
+
+    def _check_single_writer(self, path: str) -> None:
+        """Warn once if the snapshot changed since this store last loaded or saved it."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._saved_mtime and not self._warned:
+            self._warned = True
+            print(f"⚠️  {path} was written by another process: the feature store is per worker, "
+                  f"so cross-request duplicate and distributor features need a single worker")
+
+    @classmethod
+    def load(cls, path: str, stats: FeatureStats = None) -> 'FeatureStore':
+        """
+        Snapshot at `path`. Snapshots from before distributors kept
+        running totals folded single-record quantities into the
+        Distributor_Total_Qty moments; that moment is reset from the
+        training-time `stats` if given. Older duplicate indexes are moved
+        onto the byte budget, keeping the newest scan keys per ID.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        state = joblib.load(path)
+        duplicates = state.get('duplicates')
+        if duplicates is not None and not hasattr(duplicates, 'exact_bytes'):
+            duplicates._upgrade()
+        distributors = state.get('distributors')
+        if distributors is not None and not hasattr(distributors, 'running'):
+            distributors.running = np.zeros(distributors.max_distributors, dtype=np.float64)
+            if stats is not None and state['stats'] is not None:
+                state['stats'].moments['Distributor_Total_Qty'] = copy.deepcopy(
+                    stats.moments['Distributor_Total_Qty'])
+        store = cls(stats=state['stats'], duplicates=state.get('duplicates'),
+                    distributors=state.get('distributors'), trajectories=state.get('trajectories'),
+                    path=path)
+        store._saved_mtime = mtime
+        return store
+
+
+def epoch_seconds(timestamps: pd.Series) -> np.ndarray:
+    """Naive datetime column -> float seconds since 1970, whatever its resolution."""
+    return ((pd.to_datetime(timestamps) - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+
+
+# ─────────────────────────────────────────────
+# 7. WHOLE-INPUT AGGREGATES (chunked scoring)
+# ─────────────────────────────────────────────
+class GroupAggregates:
+    """
+    Features that engineer_features computes over the whole frame
+    (duplicate counts, distributor totals, z-score moments, bulk
+    threshold), accumulated chunk by chunk in a first pass so that
+    each chunk can then be scored as if the full input were in memory.
+
+    Memory grows with the number of distinct Batch_IDs and distributors,
+    not with rows. Rolling distributor windows use running state filled
+    in as chunks are scored (exact for time-ordered input, to bucket
+    granularity across chunk boundaries); with running_windows=False
+    they come from the frame alone, plus any `window_prior` given.
+    """
+
+    def __init__(self, distributors: DistributorWindows = None, running_windows: bool = True):
+        self.rows             = 0
+        self.batch_counts     = pd.Series(dtype='int64')
+        self.distributor_qty  = pd.Series(dtype='float64')
+        self.distributor_rows = pd.Series(dtype='int64')
+        self.moments          = {'Transport_Time': RunningMoments(), 'Quantity': RunningMoments()}
+        self.quantity_q95     = QuantileSketch(BULK_QUANTILE)
+        self.distributors     = None
+        if running_windows:
+            self.distributors = distributors if distributors is not None else DistributorWindows()
+        self.window_prior     = None
+        self.stats            = None
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """First pass: fold one raw input chunk in."""
+        self.rows += len(chunk)
+        if 'Batch_ID' in chunk.columns:
+            self.batch_counts = self.batch_counts.add(chunk['Batch_ID'].value_counts(), fill_value=0)
+        if 'Distributor_ID' in chunk.columns:
+            # transform('sum') semantics: NaN quantities add 0, every row of the group gets the total
+            agg = chunk.groupby('Distributor_ID')['Quantity'].agg(['sum', 'size'])
+            self.distributor_qty  = self.distributor_qty.add(agg['sum'], fill_value=0)
+            self.distributor_rows = self.distributor_rows.add(agg['size'], fill_value=0)
+        for col, m in self.moments.items():
+            m.update(chunk[col])
+        self.quantity_q95.update(chunk['Quantity'])
+
+    def finalize(self) -> FeatureStats:
+        """Turn the first-pass totals into the FeatureStats engineer_features reads."""
+        moments = dict(self.moments)
+        if len(self.distributor_qty):
+            # Each distributor's total appears once per row of that distributor
+            totals  = self.distributor_qty.to_numpy(dtype=float)
+            weights = self.distributor_rows.reindex(self.distributor_qty.index).to_numpy(dtype=float)
+            n    = weights.sum()
+            mean = (weights * totals).sum() / n
+            moments['Distributor_Total_Qty'] = RunningMoments(n, mean, (weights * (totals - mean) ** 2).sum())
+        else:
+            moments['Distributor_Total_Qty'] = RunningMoments(
+                self.moments['Quantity'].count, self.moments['Quantity'].mean, self.moments['Quantity'].m2)
+        self.stats = FeatureStats(moments, self.quantity_q95)
+        return self.stats
+
+    def refine_bulk_threshold(self, read_quantities, slack: float = 0.01) -> float:
+        """
+        Replace the sketched bulk threshold with exactly what
+        Series.quantile(0.95) gives on the whole input. The sketch
+        brackets the answer; one more pass over Quantity counts the
+        values below the bracket and keeps the few inside it.
+        `read_quantities()` must return a fresh iterable of Quantity
+        arrays; it is called again with a wider bracket on a miss.
+        """
+        n = self.quantity_q95.count
+        if n == 0 or self.stats is None:
+            return float('nan')
+        h = (n - 1) * BULK_QUANTILE                 # numpy's 'linear' virtual index
+        lo_rank, hi_rank = int(np.floor(h)), int(np.ceil(h))
+        while True:
+            wide = slack >= 1.0
+            lo = -np.inf if wide else self.quantity_q95.quantile(max(BULK_QUANTILE - slack, 0.0))
+            hi =  np.inf if wide else self.quantity_q95.quantile(min(BULK_QUANTILE + slack, 1.0))
+            below, inside = 0, []
+            for values in read_quantities():
+                values = np.asarray(values, dtype=float)
+                below += int((values < lo).sum())
+                inside.append(values[(values >= lo) & (values <= hi)])
+            inside = np.sort(np.concatenate(inside))
+            i, j = lo_rank - below, hi_rank - below
+            if 0 <= i and j < len(inside):
+                break
+            slack *= 2
+
+        # Same interpolation as numpy's _lerp, so the result is bit-identical
+        a, b, t = inside[i], inside[j], h - lo_rank
+        exact = b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+        self.stats.quantity_q95 = ExactQuantile(exact)
+        return exact
+
+    def restrict(self, df: pd.DataFrame, window_prior: dict = None) -> 'GroupAggregates':
+        """
+        Copy holding only what scoring `df` needs (its own Batch_IDs and
+        distributors), small enough to ship to a worker process. The
+        running window state stays behind; pass the rolling totals it
+        gives for df's rows (in df's row order) as `window_prior` instead.
+        """
+        sub = GroupAggregates(running_windows=False)
+        sub.rows  = self.rows
+        sub.stats = self.stats
+        if 'Batch_ID' in df.columns:
+            sub.batch_counts = self.batch_counts.reindex(df['Batch_ID'].dropna().unique())
+        if 'Distributor_ID' in df.columns:
+            keys = df['Distributor_ID'].dropna().unique()
+            sub.distributor_qty  = self.distributor_qty.reindex(keys)
+            sub.distributor_rows = self.distributor_rows.reindex(keys)
+        # Keyed by df's index: rules look the priors up for a subset of rows
+        sub.window_prior = ({name: pd.Series(values, index=df.index) for name, values in window_prior.items()}
+                            if window_prior else None)
+        return sub
+
+    def batch_counts_for(self, batch_ids: pd.Series) -> pd.Series:
+        return batch_ids.map(self.batch_counts)
+
+    def distributor_totals_for(self, distributor_ids: pd.Series) -> pd.Series:
+        return distributor_ids.map(self.distributor_qty)
+
+    def observe(self, df_feat: pd.DataFrame) -> None:
+        """Second pass: record scored rows for later chunks' rolling windows."""
+        if self.distributors is None or 'Distributor_ID' not in df_feat.columns:
+            return
+        for dist, qty, ts in zip(df_feat['Distributor_ID'].astype(str),
+                                 df_feat['Quantity'].to_numpy(dtype=float),
+                                 epoch_seconds(df_feat['Timestamp'])):
+            self.distributors.add(dist, qty, ts)
+
+    def prior_distributor_totals(self, distributor_ids: pd.Series, timestamps: pd.Series) -> dict:
+        if self.distributors is None:
+            # Precomputed for the restricted frame's rows
+            return {name: prior.reindex(distributor_ids.index).to_numpy()
+                    for name, prior in (self.window_prior or {}).items()}
+        return self.distributors.totals_at(distributor_ids.astype(str), epoch_seconds(timestamps))
@@ -0,0 +1,142 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Compiled Forest Evaluator
+  Flattens a fitted RandomForestClassifier into contiguous
+  node arrays and scores rows with vectorised NumPy traversal
+=============================================================
+"""
+import json
+import os
+
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Array-backed copy of a fitted RandomForestClassifier.
+
+    All trees share one set of node arrays; `roots` holds the index of
+    each tree's first node and `children` interleaves each node's
+    (left, right) pair. Leaves point to themselves, so a fixed
+    number of descent steps (the forest's max depth) lands every row
+    on its leaf without per-row branching. `value` holds each node's
+    normalised class distribution, exactly what DecisionTreeClassifier
+    returns for a row ending at that node.
+
+    Exposes predict_proba / predict / classes_ so it can stand in for
+    the sklearn model anywhere in fraud.py.
+    """
+
+    ROW_CHUNK = 2048     # rows per traversal pass; bounds the (rows x trees) scratch arrays
+
+    ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes, n_features):
+        self.feature    = feature
+        self.threshold  = threshold
+        self.children   = children     # interleaved: one gather per level instead of two
+        self.value      = value
+        self.roots      = roots
+        self.max_depth  = int(max_depth)
+        self.classes_   = classes
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n, dtype=np.int32)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            left  = np.where(is_leaf, own, tree.children_left + offset)
+            right = np.where(is_leaf, own, tree.children_right + offset)
+            children.append(np.stack([left, right], axis=1).ravel().astype(np.int32))
+
+            v = tree.value[:, 0, :].astype(np.float64)
+            norm = v.sum(axis=1, keepdims=True)
+            norm[norm == 0.0] = 1.0
+            values.append(v / norm)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature   = np.concatenate(features),
+            threshold = np.concatenate(thresholds),
+            children  = np.concatenate(children),
+            value     = np.concatenate(values),
+            roots     = np.asarray(roots, dtype=np.int32),
+            max_depth = max_depth,
+            classes   = np.asarray(model.classes_),
+            n_features= model.n_features_in_,
+        )
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.children[0::2]
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.children[1::2]
+
+    def save(self, directory: str) -> None:
+        """One .npy per node array plus forest.json, so load() can memory-map them."""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f'forest_{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            'max_depth' : self.max_depth,
+            'classes'   : self.classes_.tolist(),
+            'n_features': self.n_features,
+        }
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'CompiledForest':
+        """
+        With mmap=True the node arrays stay in the page cache and are
+        shared by every process that maps the same files.
+        """
+        with open(os.path.join(directory, 'forest.json')) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f'forest_{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in cls.ARRAYS
+        }
+        return cls(**arrays, max_depth=meta['max_depth'],
+                   classes=np.asarray(meta['classes']), n_features=meta['n_features'])
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (rows, trees)."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        leaves = np.empty((len(X), len(self.roots)), dtype=np.int32)
+        for start in range(0, len(X), self.ROW_CHUNK):
+            block = X[start:start + self.ROW_CHUNK]
+            flat  = block.ravel()
+            base  = (np.arange(len(block), dtype=np.int64) * self.n_features)[:, None]
+            node  = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.max_depth):
+                go_right = np.take(flat, base + np.take(self.feature, node)) > np.take(self.threshold, node)
+                node = np.take(self.children, 2 * node + go_right)
+            leaves[start:start + len(block)] = node
+        return leaves
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.value[self.apply(X)].mean(axis=1)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -5,15 +5,42 @@
   Final Year Project - ML Module
 =============================================================
 """
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import Any, List, Optional
 import pandas as pd
 import numpy as np
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
+from alert_log import AlertLog, alerts_frame
+from anchoring import AnchorStore, FileLedger, anchor_pending, verify_proof
+from batcher import MicroBatcher
+from cascade import RULE_OPS, CascadeModel, evaluate_cascade, fit_cascade, print_cascade_report
+from drift import MIN_RECORDS, DriftMonitor, DriftReference
+from feature_store import (DISTRIBUTOR_WINDOWS, TRAJECTORY_COLS, UNKNOWN_BATCH_ID, FeatureStats,
+                           FeatureStore, GroupAggregates, scan_key)
+from forest import CompiledForest
+from metrics import (ALERTS, FALLBACKS, FRAUD_FLAGS, HTTP_REQUEST_SECONDS, PROFILES_CAPTURED,
+                     RECORDS_SCORED, REGISTRY as METRICS, STAGE_SECONDS, RequestTimer,
+                     SlowCallProfiler)
+from prediction_cache import PredictionCache, RedisTier
+from registry import LoadedModel, ModelRegistry
+from wire_format import CONTENT_TYPE as COLUMNAR_CONTENT_TYPE, WireFormatError, decode_columns, encode_columns
+
 app = FastAPI()
+app.add_middleware(RequestTimer, histogram=HTTP_REQUEST_SECONDS)
 
 @app.get("/")
 def home():
@@ -23,96 +50,143 @@ def home():
 # ─────────────────────────────────────────────
 # 1. SYNTHETIC DATASET GENERATION
 # ─────────────────────────────────────────────
-def generate_dataset(n_samples=1000, fraud_ratio=0.15):
+PRODUCTS     = ['Rice', 'Wheat', 'Maize', 'Soybean', 'Palm Oil']
+PRODUCERS    = [f'Farm_{i}' for i in range(1, 21)]
+LOCATIONS    = ['Farm', 'Storage', 'Border', 'Distributor', 'Retail']
+STATUSES     = ['In Transit', 'At Storage', 'Cleared', 'Delivered', 'Held']
+DESTINATIONS = ['KL_Hub', 'Penang_Hub', 'JB_Hub', 'Sabah_Hub', 'Sarawak_Hub']
+FRAUD_TYPES  = ['Long_Storage', 'Wrong_Route', 'Duplicate_Entry', 'Hoarding',
+                'Missing_Shipment', 'Expired_Goods', 'Bulk_Purchase']
+
+# Every ID string is built once and indexed, instead of formatted per row
+_BATCH_IDS       = np.array([f'BATCH-{i:04d}' for i in range(10000)], dtype=object)
+_DISTRIBUTOR_IDS = np.array([f'DIST-{i:02d}' for i in range(50)], dtype=object)
+
+
+def _choose(rng: np.random.Generator, options: list, size: int) -> np.ndarray:
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), size)]
+
+
+def _generate_records(rng: np.random.Generator, n_legit: int, n_fraud: int, now) -> pd.DataFrame:
+    """One block of records: every field drawn as a column, fraud mutations applied by mask."""
+    n = n_legit + n_fraud
+    days  = lambda a: a.astype('timedelta64[D]')
+    hours = lambda a: a.astype('timedelta64[h]')
+
+    prod_date = now - days(rng.integers(1, 180, n))
+    cols = {
+        'Batch_ID'             : _BATCH_IDS[rng.integers(1000, 9999, n)],
+        'Product_Name'         : _choose(rng, PRODUCTS, n),
+        'Producer_Name'        : _choose(rng, PRODUCERS, n),
+        'Quantity'             : rng.integers(100, 1000, n),
+        'Production_Date'      : prod_date,
+        'Expiry_Date'          : prod_date + days(rng.integers(30, 730, n)),
+        'Current_Status'       : _choose(rng, STATUSES, n),
+        'Last_Location'        : _choose(rng, LOCATIONS, n),
+        'Expected_Destination' : _choose(rng, DESTINATIONS, n),
+        'Timestamp'            : prod_date + hours(rng.integers(1, 2000, n)),
+        'Checkpoint_Count'     : rng.integers(2, 10, n),
+        'Transport_Time'       : rng.uniform(1, 72, n),   # hours
+        'Price'                : rng.uniform(50, 500, n),
+        'Distributor_ID'       : _DISTRIBUTOR_IDS[rng.integers(1, 50, n)],
+        'Is_Fraud'             : np.zeros(n, dtype=np.int64),
+        'Fraud_Type'           : np.full(n, 'None', dtype=object),
+    }
+
+    # Fraud rows are the last n_fraud; each gets one fraud type's mutation
+    fraud_type = _choose(rng, FRAUD_TYPES, n_fraud)
+    rows = {t: n_legit + np.flatnonzero(fraud_type == t) for t in FRAUD_TYPES}
+    cols['Fraud_Type'][n_legit:] = fraud_type
+    cols['Is_Fraud'][n_legit:]   = 1
+
+    r = rows['Long_Storage']
+    cols['Transport_Time'][r]   = rng.uniform(200, 800, len(r))
+    cols['Checkpoint_Count'][r] = rng.integers(1, 3, len(r))
+
+    r = rows['Wrong_Route']
+    cols['Last_Location'][r]        = _choose(rng, ['Border', 'Unknown'], len(r))
+    cols['Expected_Destination'][r] = _choose(rng, DESTINATIONS, len(r))
+
+    r = rows['Duplicate_Entry']
+    cols['Batch_ID'][r]         = 'BATCH-9999'
+    cols['Checkpoint_Count'][r] = rng.integers(8, 20, len(r))
+
+    r = rows['Hoarding']
+    cols['Quantity'][r]       = rng.integers(5000, 20000, len(r))
+    cols['Distributor_ID'][r] = 'DIST-01'
+
+    r = rows['Missing_Shipment']
+    cols['Transport_Time'][r]   = rng.uniform(500, 2000, len(r))
+    cols['Checkpoint_Count'][r] = 0
+
+    r = rows['Expired_Goods']
+    cols['Expiry_Date'][r]    = prod_date[r] - days(rng.integers(1, 60, len(r)))
+    cols['Current_Status'][r] = 'In Transit'
+
+    r = rows['Bulk_Purchase']
+    cols['Quantity'][r] = rng.integers(8000, 50000, len(r))
+    cols['Price'][r]    = cols['Price'][r] * 0.3
+
+    order = rng.permutation(n)
+    return pd.DataFrame({name: col[order] for name, col in cols.items()})
+
+
+def iter_dataset(n_samples=1000, fraud_ratio=0.15, chunk_rows=1_000_000, seed=42, now=None):
+    """
+    Yield the synthetic dataset in shuffled blocks of at most `chunk_rows`,
+    so multi-million-row datasets can be streamed to disk. Each block
+    holds its share of the int(n_samples * fraud_ratio) fraud cases.
+    Dates are relative to `now` (default: the current time); fix it
+    as well as `seed` for byte-identical output.
+    """
+    rng = np.random.default_rng(seed)
+    now = np.datetime64(now or datetime.now(), 'us')
+    for start in range(0, n_samples, chunk_rows):
+        stop    = min(start + chunk_rows, n_samples)
+        n_fraud = int(stop * fraud_ratio) - int(start * fraud_ratio)
+        yield _generate_records(rng, stop - start - n_fraud, n_fraud, now)
+
+
+def generate_dataset(n_samples=1000, fraud_ratio=0.15, seed=42, now=None):
     """Generate a realistic food supply chain dataset with fraud cases."""
-    np.random.seed(42)
+    rng = np.random.default_rng(seed)
     n_fraud = int(n_samples * fraud_ratio)
-    n_legit = n_samples - n_fraud
-
-    products    = ['Rice', 'Wheat', 'Maize', 'Soybean', 'Palm Oil']
-    producers   = [f'Farm_{i}' for i in range(1, 21)]
-    locations   = ['Farm', 'Storage', 'Border', 'Distributor', 'Retail']
-    statuses    = ['In Transit', 'At Storage', 'Cleared', 'Delivered', 'Held']
-    destinations = ['KL_Hub', 'Penang_Hub', 'JB_Hub', 'Sabah_Hub', 'Sarawak_Hub']
-
-    def make_record(is_fraud=False):
-        prod_date  = datetime.now() - timedelta(days=np.random.randint(1, 180))
-        expiry_date = prod_date + timedelta(days=np.random.randint(30, 730))
-        timestamp  = prod_date + timedelta(hours=np.random.randint(1, 2000))
-
-        record = {
-            'Batch_ID'             : f'BATCH-{np.random.randint(1000, 9999):04d}',
-            'Product_Name'         : np.random.choice(products),
-            'Producer_Name'        : np.random.choice(producers),
-            'Quantity'             : np.random.randint(100, 1000),
-            'Production_Date'      : prod_date,
-            'Expiry_Date'          : expiry_date,
-            'Current_Status'       : np.random.choice(statuses),
-            'Last_Location'        : np.random.choice(locations),
-            'Expected_Destination' : np.random.choice(destinations),
-            'Timestamp'            : timestamp,
-            'Checkpoint_Count'     : np.random.randint(2, 10),
-            'Transport_Time'       : np.random.uniform(1, 72),   # hours
-            'Price'                : np.random.uniform(50, 500),
-            'Distributor_ID'       : f'DIST-{np.random.randint(1, 50):02d}',
-            'Is_Fraud'             : 0,
-            'Fraud_Type'           : 'None',
-        }
-
-        if is_fraud:
-            fraud_type = np.random.choice([
-                'Long_Storage', 'Wrong_Route', 'Duplicate_Entry',
-                'Hoarding', 'Missing_Shipment', 'Expired_Goods',
-                'Bulk_Purchase'
-            ])
-            record['Fraud_Type'] = fraud_type
-
-            if fraud_type == 'Long_Storage':
-                record['Transport_Time']  = np.random.uniform(200, 800)
-                record['Checkpoint_Count'] = np.random.randint(1, 3)
-
-            elif fraud_type == 'Wrong_Route':
-                record['Last_Location']        = np.random.choice(['Border', 'Unknown'])
-                record['Expected_Destination'] = np.random.choice(destinations)
-
-            elif fraud_type == 'Duplicate_Entry':
-                record['Batch_ID']         = 'BATCH-9999'
-                record['Checkpoint_Count'] = np.random.randint(8, 20)
-
-            elif fraud_type == 'Hoarding':
-                record['Quantity']         = np.random.randint(5000, 20000)
-                record['Distributor_ID']   = 'DIST-01'
-
-            elif fraud_type == 'Missing_Shipment':
-                record['Transport_Time']   = np.random.uniform(500, 2000)
-                record['Checkpoint_Count'] = 0
-
-            elif fraud_type == 'Expired_Goods':
-                record['Expiry_Date']      = prod_date - timedelta(days=np.random.randint(1, 60))
-                record['Current_Status']   = 'In Transit'
-
-            elif fraud_type == 'Bulk_Purchase':
-                record['Quantity'] = np.random.randint(8000, 50000)
-                record['Price']    = record['Price'] * 0.3
-
-            record['Is_Fraud'] = 1
-
-        return record
-
-    legit_records = [make_record(False) for _ in range(n_legit)]
-    fraud_records = [make_record(True)  for _ in range(n_fraud)]
-    df = pd.DataFrame(legit_records + fraud_records).sample(frac=1, random_state=42).reset_index(drop=True)
-    return df
+    return _generate_records(rng, n_samples - n_fraud, n_fraud, np.datetime64(now or datetime.now(), 'us'))
 
 
 # ─────────────────────────────────────────────
 # 2. FEATURE ENGINEERING
 # ─────────────────────────────────────────────
-def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+LOCATION_CODES    = {'Farm': 0, 'Storage': 1, 'Border': 2, 'Distributor': 3, 'Retail': 4}
+STATUS_RISK_CODES = {'Delivered': 0, 'Cleared': 1, 'In Transit': 2, 'At Storage': 3, 'Held': 4}
+
+def engineer_features(df: pd.DataFrame, store: FeatureStore = None,
+                      groups: GroupAggregates = None) -> pd.DataFrame:
     """
     Create ML-ready features from raw supply chain data.
     These features capture the 7 fraud types defined in the project.
+
+    If a FeatureStore is given, z-scores and the bulk purchase
+    threshold come from its population statistics instead of
+    from the frame itself (needed for small online requests),
+    and duplicate counts and distributor totals include records
+    seen in earlier requests.
+    Trajectory features (distance, speed, scan gaps, temperature
+    excursions) come from the checkpoint scans the store has seen;
+    without a store they are NaN.
+
+    If GroupAggregates are given, `df` is one chunk of a larger input:
+    every whole-frame feature (z-scores, bulk threshold, duplicate
+    counts, distributor totals) comes from the aggregates instead, so
+    the chunk scores as if the full input were one frame.
+
+    Rolling distributor quantities feed only the rules, not the model:
+    add them with add_distributor_windows where rules are evaluated.
     """
+    if groups is not None:
+        stats = groups.stats
+    else:
+        stats = store.stats if store is not None else None
     df = df.copy()
     now = pd.Timestamp.now()
 
@@ -140,14 +214,12 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     df['Is_Expired'] = (df['Days_Until_Expiry'] < 0).astype(int)
 
     # ── Feature 4 – Transport time anomaly (Z-score) ─────
-    mean_tt = df['Transport_Time'].mean()
-    std_tt  = df['Transport_Time'].std() + 1e-9
-    df['Transport_Time_Zscore'] = (df['Transport_Time'] - mean_tt) / std_tt
+    mean_tt, std_tt = _population_moments(df, 'Transport_Time', stats)
+    df['Transport_Time_Zscore'] = (df['Transport_Time'] - mean_tt) / (std_tt + 1e-9)
 
     # ── Feature 5 – Quantity anomaly ─────────────────────
-    mean_q = df['Quantity'].mean()
-    std_q  = df['Quantity'].std() + 1e-9
-    df['Quantity_Zscore'] = (df['Quantity'] - mean_q) / std_q
+    mean_q, std_q = _population_moments(df, 'Quantity', stats)
+    df['Quantity_Zscore'] = (df['Quantity'] - mean_q) / (std_q + 1e-9)
 
     # ── Feature 6 – Price per unit ───────────────────────
     df['Price_Per_Unit'] = df['Price'] / df['Quantity'].replace(0, 1)
@@ -158,7 +230,15 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
 
     # ── Feature 8 – Duplicate batch detection ────────────
     if 'Batch_ID' in df.columns:
-        batch_counts              = df.groupby('Batch_ID')['Batch_ID'].transform('count')
+        if groups is not None:
+            batch_counts          = groups.batch_counts_for(df['Batch_ID'])
+        else:
+            batch_counts          = df.groupby('Batch_ID')['Batch_ID'].transform('count')
+        if store is not None and groups is None:
+            # Include scans submitted in earlier requests
+            batch_counts          = batch_counts + store.prior_batch_counts(df)
+        # Records sent without a Batch_ID share the placeholder: never duplicates
+        batch_counts              = batch_counts.where(df['Batch_ID'] != UNKNOWN_BATCH_ID, 1)
         df['Batch_Duplicate_Count'] = batch_counts
         df['Is_Duplicate']         = (batch_counts > 1).astype(int)
     else:
@@ -167,21 +247,31 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
 
     # ── Feature 9 – Distributor hoarding score ───────────
     if 'Distributor_ID' in df.columns:
-        dist_qty = df.groupby('Distributor_ID')['Quantity'].transform('sum')
+        if groups is not None:
+            dist_qty = groups.distributor_totals_for(df['Distributor_ID'])
+        else:
+            dist_qty = df.groupby('Distributor_ID')['Quantity'].transform('sum')
+        if store is not None and groups is None:
+            # An online frame holds a few records: add what the distributor shipped
+            # in earlier requests, so the total means what it meant in training
+            dist_qty = dist_qty + store.prior_distributor_total(df)
         df['Distributor_Total_Qty'] = dist_qty
     else:
         df['Distributor_Total_Qty'] = df['Quantity']
-    mean_dq  = df['Distributor_Total_Qty'].mean()
-    std_dq   = df['Distributor_Total_Qty'].std() + 1e-9
-    df['Distributor_Qty_Zscore'] = (df['Distributor_Total_Qty'] - mean_dq) / std_dq
+    mean_dq, std_dq = _population_moments(df, 'Distributor_Total_Qty', stats)
+    df['Distributor_Qty_Zscore'] = (df['Distributor_Total_Qty'] - mean_dq) / (std_dq + 1e-9)
+
+    # ── Feature 9c – Checkpoint trajectory (raw scan events) ──
+    trajectory = (store.prior_trajectories(df['Batch_ID'], df['Timestamp'])
+                  if store is not None and 'Batch_ID' in df.columns else {})
+    for col in TRAJECTORY_COLS:
+        df[col] = trajectory.get(col, np.nan)
 
     # ── Feature 10 – Location encoding ───────────────────
-    location_order = {'Farm': 0, 'Storage': 1, 'Border': 2, 'Distributor': 3, 'Retail': 4}
-    df['Location_Code'] = df['Last_Location'].map(location_order).fillna(-1) if 'Last_Location' in df.columns else -1
+    df['Location_Code'] = df['Last_Location'].map(LOCATION_CODES).fillna(-1) if 'Last_Location' in df.columns else -1
 
     # ── Feature 11 – Status encoding ─────────────────────
-    status_risk = {'Delivered': 0, 'Cleared': 1, 'In Transit': 2, 'At Storage': 3, 'Held': 4}
-    df['Status_Risk_Code'] = df['Current_Status'].map(status_risk).fillna(2) if 'Current_Status' in df.columns else 2
+    df['Status_Risk_Code'] = df['Current_Status'].map(STATUS_RISK_CODES).fillna(2) if 'Current_Status' in df.columns else 2
 
     # ── Feature 12 – Hour of day (unusual shipment times) ─
     df['Hour_Of_Day'] = df['Timestamp'].dt.hour
@@ -193,18 +283,177 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
     ).astype(int)
 
     # ── Feature 14 – Bulk purchase flag ──────────────────
-    q95 = df['Quantity'].quantile(0.95)
+    q95 = stats.bulk_threshold() if stats is not None else df['Quantity'].quantile(0.95)
     df['Bulk_Purchase_Flag'] = (df['Quantity'] > q95).astype(int)
 
     return df
 
 
+def engineer_features_single(record: dict, store: FeatureStore = None):
+    """
+    Pandas-free engineer_features for one record (the /predict hot path).
+
+    `record` holds the raw fields of a PredictionInput with dates as
+    ISO-8601 strings. Returns (X, row): X is a float64 vector in
+    FEATURE_COLS order with NaN filled as 0, bit-identical to
+    engineer_features(...)[FEATURE_COLS].fillna(0); row is a dict of
+    every engineered value by column name, for the rules and the store.
+    Returns None if a date is not plain ISO-8601, so the caller can
+    fall back to the pandas path (which accepts more formats).
+    """
+    now = datetime.now()
+    dates = {}
+    for col, default in (('Production_Date', now - timedelta(days=30)),
+                         ('Expiry_Date',     now + timedelta(days=365)),
+                         ('Timestamp',       now)):
+        raw = record.get(col)
+        if not raw:
+            dates[col] = default
+            continue
+        try:
+            parsed = datetime.fromisoformat(raw)
+        except (TypeError, ValueError):
+            return None
+        if parsed.tzinfo is not None:
+            return None
+        dates[col] = parsed
+    production, expiry, ts = dates['Production_Date'], dates['Expiry_Date'], dates['Timestamp']
+
+    quantity       = float(record['Quantity'])
+    transport_time = float(record['Transport_Time'])
+    checkpoints    = int(record['Checkpoint_Count'])
+    price          = float(record['Price'])
+    batch_id       = record.get('Batch_ID', UNKNOWN_BATCH_ID)
+    distributor_id = record.get('Distributor_ID', 'DIST-01')
+
+    # timedelta.days floors like Series.dt.days
+    days_until_expiry = (expiry - ts).days
+    days_since_prod   = (ts - production).days
+    total_shelf       = (expiry - production).days or 1
+    shelf_pct         = min(max(days_since_prod / total_shelf * 100, 0.0), 200.0)
+
+    stats = store.stats if store is not None else None
+    if stats is not None:
+        mean_tt, std_tt = stats.mean_std('Transport_Time')
+        mean_q,  std_q  = stats.mean_std('Quantity')
+        mean_dq, std_dq = stats.mean_std('Distributor_Total_Qty')
+        bulk_flag = int(quantity > stats.bulk_threshold())
+    else:
+        # A one-row frame has NaN std, so its z-scores come out NaN -> 0
+        mean_tt = mean_q = mean_dq = std_tt = std_q = std_dq = float('nan')
+        bulk_flag = 0
+
+    since_epoch = ts - datetime(1970, 1, 1)
+    scan        = scan_key(since_epoch // timedelta(microseconds=1), record.get('Last_Location'))
+    prior_count = store.prior_batch_count(str(batch_id), scan) if store is not None else 0
+    dup_count   = 1 + prior_count
+    ts_seconds  = since_epoch.total_seconds()
+    prior_qty   = (store.prior_distributor_totals_one(str(distributor_id), ts_seconds)
+                   if store is not None else {})
+    windows     = store.distributors.windows if store is not None else DISTRIBUTOR_WINDOWS
+    trajectory  = (store.trajectory_one(str(batch_id), ts_seconds) if store is not None
+                   else dict.fromkeys(TRAJECTORY_COLS, float('nan')))
+    dist_total  = quantity + (store.prior_distributor_total_one(str(distributor_id), str(batch_id),
+                                                                scan, quantity)
+                              if store is not None else 0.0)
+
+    row = {
+        'Batch_ID'               : batch_id,
+        'Distributor_ID'         : distributor_id,
+        'Last_Location'          : record.get('Last_Location'),
+        'Timestamp'              : ts,
+        'Quantity'               : quantity,
+        'Transport_Time'         : transport_time,
+        'Checkpoint_Count'       : checkpoints,
+        'Price'                  : price,
+        'Days_Until_Expiry'      : days_until_expiry,
+        'Days_Since_Production'  : days_since_prod,
+        'Shelf_Life_Consumed_Pct': shelf_pct,
+        'Is_Expired'             : int(days_until_expiry < 0),
+        'Transport_Time_Zscore'  : (transport_time - mean_tt) / (std_tt + 1e-9),
+        'Quantity_Zscore'        : (quantity - mean_q) / (std_q + 1e-9),
+        'Price_Per_Unit'         : price / (quantity if quantity != 0 else 1),
+        'Checkpoint_Density'     : checkpoints / (transport_time if transport_time != 0 else 1),
+        'No_Checkpoint'          : int(checkpoints == 0),
+        'Batch_Duplicate_Count'  : dup_count,
+        'Is_Duplicate'           : int(dup_count > 1),
+        'Distributor_Total_Qty'  : dist_total,
+        'Distributor_Qty_Zscore' : (dist_total - mean_dq) / (std_dq + 1e-9),
+        'Location_Code'          : LOCATION_CODES.get(record.get('Last_Location'), -1),
+        'Status_Risk_Code'       : STATUS_RISK_CODES.get(record.get('Current_Status'), 2),
+        'Hour_Of_Day'            : ts.hour,
+        'Long_Storage_Flag'      : int(transport_time > 168 and checkpoints < 3),
+        'Bulk_Purchase_Flag'     : bulk_flag,
+    }
+    for name in windows:
+        row[f'Distributor_Qty_{name}'] = quantity + prior_qty.get(name, 0.0)
+    row.update(trajectory)
+
+    X = np.fromiter((row[c] for c in FEATURE_COLS), dtype=np.float64, count=len(FEATURE_COLS))
+    X[np.isnan(X)] = 0.0
+    return X, row
+
+
+def add_distributor_windows(df: pd.DataFrame, state=None) -> None:
+    """
+    Add the rolling distributor quantities (24h / 7d / 30d) the
+    HOARDING rule reads to an engineered frame, in place. Every row
+    gets values, since that rule raises alerts on its own.
+    `state` (FeatureStore or GroupAggregates) adds records seen before
+    this frame, so call it before the frame is observed.
+    """
+    tracker = state.distributors if state is not None else None
+    windows = tracker.windows if tracker is not None else DISTRIBUTOR_WINDOWS
+    prior   = {}
+    if state is not None and 'Distributor_ID' in df.columns and len(df):
+        prior = state.prior_distributor_totals(df['Distributor_ID'], df['Timestamp'])
+    rolled  = _rolling_distributor_qty(df, windows)
+    for name in windows:
+        df[f'Distributor_Qty_{name}'] = rolled[name] + prior.get(name, 0.0)
+
+
+def _rolling_distributor_qty(df: pd.DataFrame, windows: dict) -> dict:
+    """
+    Quantity of the same distributor within (Timestamp - span, Timestamp]
+    in this frame, per row: {window name: array}. Rows sharing a
+    Timestamp count in frame order, as a groupby-rolling sum does;
+    rows without a Distributor_ID get NaN.
+    """
+    qty = df['Quantity'].to_numpy(dtype=np.float64)
+    if 'Distributor_ID' not in df.columns:
+        return {name: qty for name in windows}
+    codes = pd.factorize(df['Distributor_ID'])[0]            # -1 for a missing ID
+    ts    = df['Timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    order = np.lexsort((ts, codes))                          # by distributor, then time (stable)
+    where = np.empty(len(order), dtype=np.int64)
+    where[order] = np.arange(len(order))
+    cumsum = np.concatenate([[0.0], np.cumsum(qty[order])])
+    end    = where + 1
+    out = {}
+    for name, (span, _) in windows.items():
+        # (distributor, time rank) keys are sorted in `order`, so one
+        # searchsorted finds each window's first row within its distributor
+        starts = ts - int(span * 1e9)
+        _, rank = np.unique(np.concatenate([ts[order], starts]), return_inverse=True)
+        width  = 2 * len(order) + 1
+        keys   = codes[order] * width + rank[:len(order)]
+        start  = np.searchsorted(keys, codes * width + rank[len(order):], side='right')
+        out[name] = np.where(codes >= 0, cumsum[end] - cumsum[start], np.nan)
+    return out
+
+
+def _population_moments(df: pd.DataFrame, col: str, stats: FeatureStats = None):
+    """Mean and std for a z-score: from the store if available, else from the frame."""
+    if stats is not None:
+        return stats.mean_std(col)
+    return df[col].mean(), df[col].std()
+
+
 # ─────────────────────────────────────────────
 # 3. MODEL TRAINING
 # ─────────────────────────────────────────────
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
-from sklearn.metrics import classification_report, roc_auc_score, f1_score
+# sklearn is imported inside the training functions: serving the
+# compiled backend never needs it, and importing it slows startup.
 import joblib
 
 # ── Feature columns used for training ────────
@@ -218,72 +467,604 @@ FEATURE_COLS = [
     'Hour_Of_Day', 'Long_Storage_Flag', 'Bulk_Purchase_Flag',
 ]
 
-def train_model(df: pd.DataFrame):
-    """Train Random Forest fraud detection model."""
-    df_feat = engineer_features(df)
-    X = df_feat[FEATURE_COLS].fillna(0)
-    y = df_feat['Is_Fraud']
+MODEL_PATH   = 'fraud_model.pkl'   # legacy single-file model, imported into the registry once
+STATS_PATH   = 'fraud_stats.pkl'   # live FeatureStore snapshot (per-process state: serve with one worker)
+REGISTRY_DIR = os.environ.get('FRAUD_MODEL_REGISTRY', 'model_registry')
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+MODEL_PARAMS = dict(
+    n_estimators=200,
+    max_depth=15,
+    min_samples_split=5,
+    min_samples_leaf=2,
+    class_weight='balanced',
+    random_state=42,
+    n_jobs=-1,
+)
 
-    model = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        class_weight='balanced',
-        random_state=42,
-        n_jobs=-1,
-    )
+# Tiered scoring: share of the frauds the forest catches (out-of-bag, on the
+# calibration split) the cascade's screen may clear; see ESCALATE_WHEN
+CASCADE_MAX_RECALL_LOSS = float(os.environ.get('FRAUD_CASCADE_MAX_RECALL_LOSS', 0.01))
 
-    model.fit(X_train, y_train)
+# Rolling holdout: the newest labelled rows, kept with each version
+HOLDOUT_FRACTION = 0.2
+HOLDOUT_MAX_ROWS = 5000
+
+
+def _rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def measure_training(report: dict, interval: float = 0.05):
+    """
+    Fill `report` with wall-clock seconds and peak RSS growth in MB.
+    RSS is sampled from a thread, so allocations inside sklearn's C
+    code count too and training itself runs at full speed.
+    """
+    baseline = peak = _rss_mb()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, _rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    t0 = time.perf_counter()
+    try:
+        yield report
+    finally:
+        done.set()
+        sampler.join()
+        report['train_seconds'] = round(time.perf_counter() - t0, 3)
+        report['train_peak_mb'] = round(max(peak, _rss_mb()) - baseline, 1)
+
+
+def evaluate_model(model, X, y) -> dict:
+    from sklearn.metrics import roc_auc_score, f1_score
+
+    proba  = model.predict_proba(X)
+    y_pred = model.classes_.take(np.argmax(proba, axis=1))     # == model.predict(X)
+    y = np.asarray(y)
+    auc = float(roc_auc_score(y, proba[:, 1])) if len(np.unique(y)) == 2 else float('nan')
+    return {'roc_auc': auc, 'f1': float(f1_score(y, y_pred, zero_division=0))}
+
+
+def build_drift_reference(X, X_holdout, model) -> DriftReference:
+    """
+    Drift monitor reference: the model inputs of `X` plus the fraud
+    probability on held-out rows (on training rows it would be
+    overconfident compared with live traffic).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    columns = {col: X[:, j] for j, col in enumerate(FEATURE_COLS)}
+    columns['Fraud_Probability'] = model.predict_proba(np.asarray(X_holdout, dtype=np.float64))[:, 1]
+    return DriftReference.from_columns(columns)
+
+
+def cross_validate(X, y, n_splits: int = 5) -> dict:
+    """Stratified k-fold ROC-AUC of a fresh MODEL_PARAMS forest on already-engineered features."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+    cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    scores = cross_val_score(RandomForestClassifier(**MODEL_PARAMS), X, y, cv=cv, scoring='roc_auc')
+    print(f"\n  {n_splits}-Fold CV AUC: {scores.mean():.4f} ± {scores.std():.4f}")
+    return {'cv_roc_auc_mean': float(scores.mean()), 'cv_roc_auc_std': float(scores.std())}
+
+
+def cross_validate_version(registry: ModelRegistry, version: str = None, n_splits: int = 5) -> dict:
+    """
+    Separate CV job: reuses the features cached with a fully trained
+    version instead of re-engineering them, and records the scores
+    in the manifest. Without a `version`: the live one, or the newest
+    full training run if the live version is an incremental update.
+    """
+    if version is None:
+        live = registry.live_version()
+        if live is not None and registry.has_dataset(live, 'features'):
+            version = live
+        else:
+            version = registry.latest_with_dataset('features')
+            if version is None:
+                raise ValueError('No version has cached features (only full training runs store them)')
+            print(f"⚠️  Live version {live} has no cached features; cross-validating {version}")
+    elif version not in registry.versions():
+        raise ValueError(f'Unknown model version {version!r}')
+    try:
+        X, y = registry.load_dataset(version, 'features')
+    except FileNotFoundError:
+        raise ValueError(f'{version} has no cached features (only full training runs store them)')
+    report = {}
+    with measure_training(report):
+        report.update(cross_validate(X, y, n_splits))
+    registry.update_metrics(version, {k: v for k, v in report.items() if k.startswith('cv_')})
+    print(f"  CV job: {report['train_seconds']}s, peak {report['train_peak_mb']} MB")
+    return report
+
+
+def train_model(df: pd.DataFrame, registry: ModelRegistry = None, activate: bool = True,
+                run_cv: bool = False, build_cascade: bool = True):
+    """
+    Train Random Forest fraud detection model.
+    With a registry the model is published there as a new version
+    (and made live if `activate`); otherwise it is saved to MODEL_PATH.
+    Evaluation uses the held-out split; `run_cv` adds 5-fold CV on the
+    same features (otherwise run cross_validate_version later).
+    `build_cascade` also fits the tiered-scoring screen (cascade.py)
+    on the training split and reports it against the forest alone.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import classification_report
+
+    report = {'mode': 'full'}
+    with measure_training(report):
+        df_feat = engineer_features(df)
+        X = df_feat[FEATURE_COLS].fillna(0)
+        y = df_feat['Is_Fraud']
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=HOLDOUT_FRACTION, random_state=42, stratify=y
+        )
+
+        model = RandomForestClassifier(**MODEL_PARAMS)
+        model.fit(X_train, y_train)
 
     # ── Evaluation ────────────────────────────────────────
     y_pred = model.predict(X_test)
-    y_prob = model.predict_proba(X_test)[:, 1]
 
     print("\n" + "="*60)
     print("  DIGI TRACEABILITY - Model Evaluation Report")
     print("="*60)
     print(classification_report(y_test, y_pred, target_names=['Legit', 'Fraud']))
-    print(f"  ROC-AUC Score : {roc_auc_score(y_test, y_prob):.4f}")
-    print(f"  F1 Score      : {f1_score(y_test, y_pred):.4f}")
+    metrics = evaluate_model(model, X_test, y_test)
+    print(f"  ROC-AUC Score : {metrics['roc_auc']:.4f}")
+    print(f"  F1 Score      : {metrics['f1']:.4f}")
+    print(f"  Training      : {report['train_seconds']}s, peak {report['train_peak_mb']} MB")
     print("="*60)
 
-    # ── Cross-validation ─────────────────────────────────
-    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
-    cv_scores = cross_val_score(model, X, y, cv=cv, scoring='roc_auc')
-    print(f"\n  5-Fold CV AUC: {cv_scores.mean():.4f} ± {cv_scores.std():.4f}")
+    # ── Cross-validation (optional; reuses the features above) ──
+    if run_cv:
+        metrics.update(cross_validate(X, y))
+
+    # ── Tiered cascade (rules + screen in front of this forest) ──
+    cascade = None
+    if build_cascade:
+        t0 = time.perf_counter()
+        cascade = fit_cascade(model, X_train, y_train, ESCALATE_WHEN, FEATURE_COLS, CASCADE_MAX_RECALL_LOSS)
+        fit_seconds = round(time.perf_counter() - t0, 3)
+        cascade_report = evaluate_cascade(cascade, X_test, y_test)
+        print_cascade_report(cascade_report, title=f'Tiered cascade (fitted in {fit_seconds}s)')
+        metrics.update({f'cascade_{k}': v for k, v in cascade_report.items()}, cascade_fit_seconds=fit_seconds)
 
     # ── Feature importance ───────────────────────────────
     fi = pd.Series(model.feature_importances_, index=FEATURE_COLS).sort_values(ascending=False)
     print("\n  Top 10 Feature Importances:")
     print(fi.head(10).to_string())
 
-    # Save model
-    joblib.dump(model, 'fraud_model.pkl')
-    print("\n  ✅ Model saved → fraud_model.pkl")
+    # Save model + the population statistics its features were built with
+    stats = FeatureStats.from_frame(df_feat)
+    if registry is not None:
+        metrics.update(report, holdout_rows=len(y_test))
+        version = registry.publish(model, stats, metrics, activate=activate,
+                                   datasets={'features': (X, y), 'holdout': (X_test, y_test)},
+                                   cascade=cascade, drift_reference=build_drift_reference(X, X_test, model))
+        print(f"\n  ✅ Model published → {registry.path(version)}" + ("  (live)" if activate else ""))
+    else:
+        joblib.dump(model, MODEL_PATH)
+        print(f"\n  ✅ Model saved → {MODEL_PATH}")
+        FeatureStore(stats).save(STATS_PATH)
+        print(f"  ✅ Feature statistics saved → {STATS_PATH}")
 
     return model, X_test, y_test
 
 
+def train_incremental(df_new: pd.DataFrame, registry: ModelRegistry, new_trees: int = 50,
+                      max_trees: int = None, activate: bool = True) -> str:
+    """
+    Grow the live forest with `new_trees` trees fitted on newly labelled
+    checkpoints (warm start) and retire the oldest trees beyond
+    `max_trees` (default: the current size). The newest
+    HOLDOUT_FRACTION of `df_new` by Timestamp is not trained on; it is
+    appended to the previous version's holdout, which keeps its newest
+    HOLDOUT_MAX_ROWS rows, and both forests are scored on the result.
+    """
+    base_version = registry.live_version()
+    if base_version is None:
+        raise ValueError('No live model to update; run a full training first')
+    base  = registry.load(base_version, 'sklearn')
+    model = base.scorer
+    max_trees = max_trees or len(model.estimators_)
+
+    report = {'mode': 'incremental', 'base_version': base_version}
+    with measure_training(report):
+        df_feat = engineer_features(df_new).sort_values('Timestamp', kind='stable')
+        X = df_feat[FEATURE_COLS].fillna(0).to_numpy(dtype=np.float64)
+        y = df_feat['Is_Fraud'].to_numpy()
+        split = len(X) - int(round(len(X) * HOLDOUT_FRACTION))
+        X_train, y_train = X[:split], y[:split]
+        if len(np.unique(y_train)) < 2:
+            raise ValueError('New labelled data needs both fraud and legit rows to train on')
+
+        # Fresh seed per update, so new trees never repeat an earlier update's bootstrap draws
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees,
+                         random_state=MODEL_PARAMS['random_state'] + len(registry.versions()))
+        model.fit(X_train, y_train)
+        retired = max(len(model.estimators_) - max_trees, 0)
+        model.estimators_ = model.estimators_[retired:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+
+    # ── Rolling holdout evaluation ───────────────────────
+    try:
+        X_hold, y_hold = registry.load_dataset(base_version, 'holdout')
+    except FileNotFoundError:
+        X_hold, y_hold = np.empty((0, len(FEATURE_COLS))), np.empty(0, dtype=y.dtype)
+    X_hold = np.concatenate([X_hold, X[split:]])[-HOLDOUT_MAX_ROWS:]
+    y_hold = np.concatenate([y_hold, y[split:]])[-HOLDOUT_MAX_ROWS:]
+
+    metrics  = evaluate_model(model, X_hold, y_hold)
+    previous = registry.load(base_version, 'sklearn').scorer
+    metrics.update({f'previous_{k}': v for k, v in evaluate_model(previous, X_hold, y_hold).items()})
+    metrics.update(report, holdout_rows=len(y_hold), trees_added=new_trees, trees_retired=retired)
+
+    print(f"  Incremental update of {base_version}: +{new_trees} trees, -{retired} retired "
+          f"({report['train_seconds']}s, peak {report['train_peak_mb']} MB)")
+    print(f"  Rolling holdout ({len(y_hold)} rows)  ROC-AUC {metrics['previous_roc_auc']:.4f} → "
+          f"{metrics['roc_auc']:.4f}   F1 {metrics['previous_f1']:.4f} → {metrics['f1']:.4f}")
+
+    stats = base.stats
+    if stats is not None:
+        stats.update(df_feat)
+    # The cascade's rules and screen do not depend on the forest behind them: carry them over.
+    # Inputs stay compared with the full training's; the probability reference is the new forest's.
+    reference = registry.load_drift_reference(base_version)
+    if reference is not None:
+        reference = reference.with_column('Fraud_Probability', model.predict_proba(X_hold)[:, 1])
+    version = registry.publish(model, stats, metrics, source='incremental', activate=activate,
+                               datasets={'holdout': (X_hold, y_hold)},
+                               cascade=registry.load_cascade(base_version, None),
+                               drift_reference=reference)
+    print(f"  ✅ Model published → {registry.path(version)}" + ("  (live)" if activate else ""))
+    return version
+
+
 # ─────────────────────────────────────────────
-# MODEL LOADING (runs at FastAPI startup)
+# MODEL LOADING (background thread started with FastAPI)
 # ─────────────────────────────────────────────
-try:
-    model = joblib.load("fraud_model.pkl")
-    print("✅ Model loaded from fraud_model.pkl")
-except Exception:
-    print("⚠️  No saved model found. Training a new model...")
-    df = generate_dataset(1200, 0.15)
-    model, _, _ = train_model(df)
+# Importing this module never loads or trains anything. The startup
+# hook loads the live registry version in a background thread (or
+# imports the legacy MODEL_PATH, or trains one if nothing exists);
+# until it finishes /readyz and /predict answer 503. New versions are
+# hot-swapped by replacing `live_model` in a single assignment, and
+# every worker follows the manifest's live pointer.
+
+# ── Inference backend ─────────────────────────────────
+# 'compiled' : CompiledForest over memory-mapped node arrays (default)
+# 'sklearn'  : RandomForestClassifier.predict_proba from model.pkl
+# 'cascade'  : rules + a small calibrated screen clear obviously legit
+#              records; the rest go to the compiled forest (cascade.py)
+INFERENCE_BACKENDS = ('sklearn', 'compiled', 'cascade')
+INFERENCE_BACKEND  = os.environ.get('FRAUD_INFERENCE_BACKEND', 'compiled')
+# Offline scoring (run_fraud_detection, `fraud.py score`) without an explicit
+# backend: the compiled forest is faster up to a few hundred rows, sklearn's
+# tree traversal beyond (~4x on 100k rows, one core). Frames larger than
+# COMPILED_MAX_ROWS use BATCH_INFERENCE_BACKEND; the API always uses INFERENCE_BACKEND.
+BATCH_INFERENCE_BACKEND = os.environ.get('FRAUD_BATCH_INFERENCE_BACKEND', 'sklearn')
+COMPILED_MAX_ROWS       = int(os.environ.get('FRAUD_COMPILED_MAX_ROWS', 512))
+REGISTRY_POLL_SECONDS = float(os.environ.get('FRAUD_REGISTRY_POLL_SECONDS', 5))
+# Optional tmpfs (e.g. /dev/shm) the compiled node arrays are staged into once
+# per host, so all uvicorn workers map one RAM-resident copy
+SHARED_MODEL_DIR = os.environ.get('FRAUD_SHM_DIR') or None
+# Prediction cache (see prediction_cache.py); FRAUD_CACHE_SIZE=0 turns it off.
+# With FRAUD_CACHE_REDIS_URL (needs `pip install redis`) workers share entries.
+CACHE_SIZE        = int(os.environ.get('FRAUD_CACHE_SIZE', 50_000))
+CACHE_TTL_SECONDS = float(os.environ.get('FRAUD_CACHE_TTL_SECONDS', 3600))
+CACHE_REDIS_URL   = os.environ.get('FRAUD_CACHE_REDIS_URL') or None
+# Append-only alert log polled through /alerts (see alert_log.py); shared by workers
+ALERT_LOG_DIR          = os.environ.get('FRAUD_ALERT_LOG_DIR', 'alert_log')
+ALERT_LOG_SEGMENT_MB   = int(os.environ.get('FRAUD_ALERT_LOG_SEGMENT_MB', 64))
+ALERT_LOG_MAX_SEGMENTS = int(os.environ.get('FRAUD_ALERT_LOG_MAX_SEGMENTS', 0)) or None
+# Merkle anchoring of logged alerts (see anchoring.py); the file ledger stands in for the chain
+ANCHOR_DIR  = os.environ.get('FRAUD_ANCHOR_DIR', 'anchors')
+LEDGER_PATH = os.environ.get('FRAUD_LEDGER_PATH', os.path.join(ANCHOR_DIR, 'ledger.ndjson'))
+# Drift monitor (see drift.py): per-worker window snapshots under FRAUD_DRIFT_DIR/<version>/,
+# merged by /drift; windows older than FRAUD_DRIFT_RETENTION_HOURS are deleted, and a
+# report over fewer than FRAUD_DRIFT_MIN_RECORDS records gives no drift verdict
+DRIFT_DIR             = os.environ.get('FRAUD_DRIFT_DIR', 'drift')
+DRIFT_WINDOW_SECONDS  = float(os.environ.get('FRAUD_DRIFT_WINDOW_SECONDS', 3600))
+DRIFT_FLUSH_SECONDS   = float(os.environ.get('FRAUD_DRIFT_FLUSH_SECONDS', 30))
+DRIFT_RETENTION_HOURS = float(os.environ.get('FRAUD_DRIFT_RETENTION_HOURS', 168))
+DRIFT_MIN_RECORDS     = int(os.environ.get('FRAUD_DRIFT_MIN_RECORDS', MIN_RECORDS))
+
+registry      = ModelRegistry(REGISTRY_DIR)
+live_model    = None                 # LoadedModel; replaced atomically on hot-swap
+feature_store = None                 # FeatureStore; set once the first model is live
+drift_monitor = None                 # DriftMonitor of the live version; None if it has no reference
+model_status  = {'state': 'starting', 'detail': None}
+_swap_lock    = threading.Lock()
+
+
+def build_prediction_cache():
+    if CACHE_SIZE <= 0:
+        return None
+    shared = None
+    if CACHE_REDIS_URL:
+        try:
+            shared = RedisTier(CACHE_REDIS_URL, CACHE_TTL_SECONDS)
+        except ImportError as exc:
+            print(f"⚠️  {exc}; using the in-process prediction cache only")
+    return PredictionCache(CACHE_SIZE, CACHE_TTL_SECONDS, shared)
+
+
+prediction_cache = build_prediction_cache()
+alert_log        = AlertLog(ALERT_LOG_DIR, ALERT_LOG_SEGMENT_MB << 20, max_segments=ALERT_LOG_MAX_SEGMENTS)
+anchor_store     = AnchorStore(ANCHOR_DIR)
+ledger           = FileLedger(LEDGER_PATH)
+
+
+_compiled_forests = weakref.WeakKeyDictionary()     # sklearn forest -> its CompiledForest
+
+
+def get_inference_model(model, backend: str = None):
+    """Return the object whose predict_proba should be called for `backend`."""
+    backend = backend or INFERENCE_BACKEND
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {INFERENCE_BACKENDS}")
+    if backend != 'sklearn' and not isinstance(model, (CompiledForest, CascadeModel)):
+        # A bare sklearn forest has no screen: 'cascade' scores it like 'compiled'.
+        # Compiled once per model object, not once per scored frame.
+        compiled = _compiled_forests.get(model)
+        if compiled is None:
+            compiled = _compiled_forests[model] = CompiledForest.from_sklearn(model)
+        return compiled
+    return model
+
+
+def offline_backend(n_rows: int, backend: str = None) -> str:
+    """`backend`, or the faster default for scoring an `n_rows` frame offline."""
+    if backend:
+        return backend
+    return BATCH_INFERENCE_BACKEND if n_rows > COMPILED_MAX_ROWS else INFERENCE_BACKEND
+
+
+def load_drift_reference(version: str):
+    """
+    `version`'s drift reference. Versions published before drift
+    monitoring get one rebuilt from the rows stored with them; None if
+    they have none.
+    """
+    reference = registry.load_drift_reference(version)
+    if reference is not None:
+        return reference
+    try:
+        X_hold, _ = registry.load_dataset(version, 'holdout')
+    except FileNotFoundError:
+        return None
+    try:
+        X, _ = registry.load_dataset(version, 'features')
+    except FileNotFoundError:
+        X = X_hold
+    return build_drift_reference(X, X_hold, CompiledForest.load(registry.path(version)))
+
+
+def activate_model(version: str) -> LoadedModel:
+    """Load `version` and swap it in; requests already running keep the old one."""
+    global live_model, feature_store, drift_monitor
+    with _swap_lock:
+        loaded = registry.load(version, INFERENCE_BACKEND, SHARED_MODEL_DIR)
+        if feature_store is None:
+            try:
+                feature_store = FeatureStore.load(STATS_PATH, loaded.stats)
+            except Exception:
+                feature_store = FeatureStore(loaded.stats, path=STATS_PATH)
+        reference = load_drift_reference(version)
+        if drift_monitor is not None:
+            drift_monitor.flush()
+        drift_monitor = (DriftMonitor(reference, os.path.join(DRIFT_DIR, version), DRIFT_WINDOW_SECONDS,
+                                      DRIFT_FLUSH_SECONDS, DRIFT_RETENTION_HOURS,
+                                      min_records=DRIFT_MIN_RECORDS)
+                         if reference is not None else None)
+        live_model = loaded
+        if prediction_cache is not None:
+            prediction_cache.clear(keep_version=version)
+        model_status.update(state='ready', detail=None)
+    print(f"✅ Model {version} live ({INFERENCE_BACKEND} backend)")
+    return loaded
+
+
+def _import_legacy_model() -> str:
+    """Publish the pre-registry fraud_model.pkl as a registry version."""
+    legacy = joblib.load(MODEL_PATH)
+    # Legacy models were trained on the 1,200-row synthetic dataset; a
+    # fresh draw from the same generator has the same distribution, so
+    # its feature statistics stand in for the originals.
+    df_feat = engineer_features(generate_dataset(1200, 0.15))
+    stats   = FeatureStats.from_frame(df_feat)
+    # Default seed = the training rows; another seed's draw stands in for a holdout
+    unseen  = engineer_features(generate_dataset(300, 0.15, seed=7))
+    reference = build_drift_reference(df_feat[FEATURE_COLS].fillna(0), unseen[FEATURE_COLS].fillna(0),
+                                      get_inference_model(legacy, 'compiled'))
+    return registry.publish(legacy, stats, source=f'import:{MODEL_PATH}', activate=True,
+                            drift_reference=reference)
+
+
+def bootstrap_model() -> None:
+    """Load (or create) the live model. Runs off the request path."""
+    try:
+        version = registry.live_version()
+        if version is None:
+            # One worker builds the first version; the others wait on the lock
+            with registry.lock('bootstrap', timeout=3600):
+                version = registry.live_version()
+                if version is None and os.path.exists(MODEL_PATH):
+                    model_status.update(state='importing', detail=MODEL_PATH)
+                    print(f"⚙️  Importing {MODEL_PATH} into {REGISTRY_DIR}...")
+                    version = _import_legacy_model()
+                elif version is None:
+                    model_status.update(state='training', detail='no saved model found')
+                    print("⚠️  No saved model found. Training a new model in the background...")
+                    train_model(generate_dataset(1200, 0.15), registry, activate=True)
+                    version = registry.live_version()
+        model_status.update(state='loading', detail=version)
+        activate_model(version)
+    except Exception as exc:
+        model_status.update(state='failed', detail=repr(exc))
+        print(f"❌ Model bootstrap failed: {exc!r}")
+
+
+def _follow_registry() -> None:
+    """Swap in whatever version the manifest marks live (set by any worker)."""
+    while True:
+        time.sleep(REGISTRY_POLL_SECONDS)
+        try:
+            version = registry.live_version()
+            current = live_model
+            if version and (current is None or current.version != version):
+                activate_model(version)
+        except Exception as exc:
+            print(f"⚠️  Registry poll failed: {exc!r}")
+
+
+def retrain_in_background() -> None:
+    model_status['training'] = True
+
+    def run():
+        try:
+            with registry.lock('training', timeout=0):
+                train_model(generate_dataset(1200, 0.15), registry, activate=True)
+            activate_model(registry.live_version())
+        except Exception as exc:
+            print(f"❌ Background retraining failed: {exc!r}")
+        finally:
+            model_status['training'] = False
+    threading.Thread(target=run, name='fraud-retrain', daemon=True).start()
+
+
+@app.on_event("startup")
+def start_model_loading():
+    threading.Thread(target=bootstrap_model, name='fraud-bootstrap', daemon=True).start()
+    threading.Thread(target=_follow_registry, name='fraud-registry-poll', daemon=True).start()
+
+
+@app.on_event("shutdown")
+def save_feature_store():
+    if feature_store is not None:
+        feature_store.save(STATS_PATH)
+    if drift_monitor is not None:
+        drift_monitor.flush()
+
+
+def require_model() -> LoadedModel:
+    current = live_model
+    if current is None:
+        raise HTTPException(status_code=503, detail=f"Model not ready ({model_status['state']})")
+    return current
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    current = live_model
+    return {"status": "ok", "model_version": current.version if current else None}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: a model is live and /predict will score."""
+    current = live_model
+    body = {
+        "ready"        : current is not None,
+        "model_version": current.version if current else None,
+        "backend"      : current.backend if current else INFERENCE_BACKEND,
+        "state"        : model_status['state'],
+        "detail"       : model_status['detail'],
+        "retraining"   : bool(model_status.get('training')),
+    }
+    return body if current is not None else JSONResponse(status_code=503, content=body)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's counters and latency histograms."""
+    return Response(METRICS.render(), media_type=METRICS.CONTENT_TYPE)
+
+
+@app.get("/drift")
+def input_drift(hours: float = 24):
+    """
+    Drift of /predict and /predict_batch inputs and fraud probabilities
+    from the live model's training data over the last `hours`, merged
+    across workers: PSI on the reference's decile bins and KS distance
+    per column, with "stable" / "watch" / "drift" status ("insufficient
+    data" until FRAUD_DRIFT_MIN_RECORDS records have been scored).
+    """
+    current = require_model()
+    monitor = drift_monitor
+    if monitor is None:
+        raise HTTPException(status_code=404, detail=f"Model {current.version} has no drift reference")
+    return {"model_version": current.version, **monitor.report(max(hours, 0))}
+
+
+@app.get("/models")
+def list_models():
+    manifest = registry.manifest()
+    current  = live_model
+    return {**manifest, "loaded": current.version if current else None}
+
+
+@app.post("/models/{version}/activate")
+def activate_model_version(version: str):
+    """Hot-swap to an existing version in this worker; others follow the manifest."""
+    try:
+        registry.activate(version)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return {"model_version": activate_model(version).version}
+
+
+@app.post("/models/retrain", status_code=202)
+def retrain_model():
+    """Train a new version in the background and make it live when done."""
+    if model_status.get('training'):
+        raise HTTPException(status_code=409, detail="Retraining already in progress")
+    retrain_in_background()
+    return {"status": "training"}
 
 
 # ─────────────────────────────────────────────
 # /predict  ENDPOINT
 # ─────────────────────────────────────────────
+def normalise_date(value: str) -> str:
+    """
+    A record date as naive local time in one ISO-8601 layout ("" stays
+    ""), so every record of a batch parses alike. A UTC offset, e.g. the
+    "Z" of JavaScript's toISOString(), is converted to the service's
+    local time: every naive timestamp here is compared with now().
+    """
+    if not value:
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = pd.Timestamp(value)
+        except (ValueError, OverflowError):
+            raise ValueError("Input should be a valid date or datetime") from None
+        if pd.isna(parsed):
+            return ""
+        parsed = parsed.to_pydatetime()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat(timespec='microseconds')
+
+
 class PredictionInput(BaseModel):
     Quantity: float
     Transport_Time: float
@@ -295,18 +1076,389 @@ class PredictionInput(BaseModel):
     Timestamp: str = ""
     Current_Status: str = "In Transit"
     Last_Location: str = "Farm"
-    Batch_ID: str = "BATCH-0000"
+    Batch_ID: str = UNKNOWN_BATCH_ID
     Distributor_ID: str = "DIST-01"
 
+    _normalise_dates = field_validator('Production_Date', 'Expiry_Date', 'Timestamp')(normalise_date)
+
+
+MAX_BATCH_RECORDS = 10_000
+# Columnar bodies skip per-record validation objects, so they take larger batches
+MAX_COLUMNAR_RECORDS = 100_000
+
+# /predict micro-batching: concurrent calls are scored together once
+# FRAUD_BATCH_MAX_RECORDS have queued or the first has waited
+# FRAUD_BATCH_MAX_WAIT_MS. 0 ms scores each call on its own.
+BATCH_MAX_RECORDS = int(os.environ.get('FRAUD_BATCH_MAX_RECORDS', 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get('FRAUD_BATCH_MAX_WAIT_MS', 2))
+BATCH_MAX_QUEUE   = int(os.environ.get('FRAUD_BATCH_MAX_QUEUE', 1024))
+
+
+class ScanLocation(BaseModel):
+    latitude: float
+    longitude: float
+    accuracy: Optional[float] = None
+
+
+class CheckpointEvent(BaseModel):
+    # Same shape as a backend models/Checkpoint.js document
+    batchId: str
+    location: ScanLocation
+    timestamp: str = ""
+    scannerRole: str = "distributor"
+    temperature: Optional[float] = None
+
+
+class BatchPredictionInput(BaseModel):
+    # Raw dicts so one malformed record does not reject the whole batch;
+    # each entry is validated against PredictionInput individually.
+    records: List[Any]
+
+
+# ── Instrumentation ───────────────────────────────────
+# Stage latencies and outcome counters are served at /metrics. Opt-in
+# profiling: FRAUD_PROFILE_SAMPLE_RATE=0.01 runs cProfile on 1% of
+# scoring requests and keeps those slower than FRAUD_PROFILE_SLOW_MS
+# as .prof files in FRAUD_PROFILE_DIR (read with `python -m pstats`).
+profiler = SlowCallProfiler(
+    sample_rate=float(os.environ.get('FRAUD_PROFILE_SAMPLE_RATE', 0)),
+    slow_ms    =float(os.environ.get('FRAUD_PROFILE_SLOW_MS', 250)),
+    directory  =os.environ.get('FRAUD_PROFILE_DIR', 'profiles'),
+    captured   =PROFILES_CAPTURED,
+)
+_fallbacks_logged = set()
+
+
+def live_predict_proba(current: LoadedModel, X) -> np.ndarray:
+    """predict_proba on the live model, through the prediction cache when enabled."""
+    if prediction_cache is None:
+        return current.scorer.predict_proba(X)
+    return prediction_cache.predict_proba(current, X)
+
+
+def record_fallback(pipeline: str, exc: Exception, n: int) -> None:
+    """Count records scored as 0.0 after a predict_proba failure; log each error type once."""
+    error = type(exc).__name__
+    FALLBACKS.inc(pipeline, error, amount=n)
+    if (pipeline, error) not in _fallbacks_logged:
+        _fallbacks_logged.add((pipeline, error))
+        print(f"⚠️  predict_proba failed ({pipeline}): {exc!r} — scoring as 0.0; "
+              f"repeats are counted in fraud_predict_fallback_total")
+
+
+def observe_drift(pipeline: str, X, probabilities) -> None:
+    """Feed scored inputs and probabilities to the drift monitor (None: scoring fell back)."""
+    monitor = drift_monitor
+    if monitor is None or X is None:
+        return
+    with STAGE_SECONDS.time(pipeline, 'drift'):
+        monitor.observe(X, probabilities)
+
+
+def record_outcomes(pipeline: str, alert_levels, predictions, flag_lists, inverse) -> None:
+    """Alert-level and fraud-flag counters, one increment per distinct value."""
+    RECORDS_SCORED.inc(pipeline, amount=len(alert_levels))
+    levels, counts = np.unique(alert_levels, return_counts=True)
+    for level, n in zip(levels, counts):
+        ALERTS.inc(pipeline, str(level), amount=int(n))
+    fraud_rows = np.bincount(inverse[np.asarray(predictions) == 1], minlength=len(flag_lists))
+    for flags, n in zip(flag_lists, fraud_rows):
+        for flag in flags if n else ():
+            FRAUD_FLAGS.inc(pipeline, flag, amount=int(n))
+
+
+def build_input_frame(records: List[PredictionInput]) -> pd.DataFrame:
+    """Turn validated API records into the raw DataFrame engineer_features expects."""
+    now = datetime.now()
+    default_production = (now - timedelta(days=30)).isoformat()
+    default_expiry     = (now + timedelta(days=365)).isoformat()
+    default_timestamp  = now.isoformat()
+
+    input_df = pd.DataFrame({
+        "Batch_ID"            : [r.Batch_ID for r in records],
+        "Quantity"            : [r.Quantity for r in records],
+        "Transport_Time"      : [r.Transport_Time for r in records],
+        "Checkpoint_Count"    : [r.Checkpoint_Count for r in records],
+        "Price"               : [r.Price for r in records],
+        "Production_Date"     : [r.Production_Date or default_production for r in records],
+        "Expiry_Date"         : [r.Expiry_Date or default_expiry for r in records],
+        "Timestamp"           : [r.Timestamp or default_timestamp for r in records],
+        "Current_Status"      : [r.Current_Status for r in records],
+        "Last_Location"       : [r.Last_Location for r in records],
+        "Distributor_ID"      : [r.Distributor_ID for r in records],
+    })
+
+    # Ensure required columns exist
+    required_cols = [
+        "Batch_ID", "Product_Name", "Producer_Name", "Expected_Destination"
+    ]
+    for col in required_cols:
+        if col not in input_df:
+            input_df[col] = "Unknown"
+
+    return input_df
+
+
+# ── Columnar /predict_batch bodies (see wire_format.py) ──
+COLUMNAR_NUMERIC = ('Quantity', 'Transport_Time', 'Checkpoint_Count', 'Price')
+COLUMNAR_DATES   = ('Production_Date', 'Expiry_Date', 'Timestamp')
+COLUMNAR_STRINGS = ('Current_Status', 'Last_Location', 'Batch_ID', 'Distributor_ID')
+
+
+def _columnar_type_error(name: str, expected: str):
+    return HTTPException(status_code=422, detail=[
+        {"loc": [name], "msg": f"Column must be {expected}"}])
+
+
+def build_columnar_frame(rows: int, columns: dict) -> tuple:
+    """
+    Raw input frame (as build_input_frame makes) from decoded columnar
+    /predict_batch columns, without per-record objects: numeric columns
+    are used as decoded, dates stay datetime64 in naive local time like
+    normalised JSON dates (NaT is filled by engineer_features) and
+    missing strings take the PredictionInput default. Returns (frame
+    of the valid rows, {row: error list}) where
+    the errors are those PredictionInput would raise for the row.
+    """
+    frame, bad = {}, {}
+    for name in COLUMNAR_NUMERIC:
+        col = columns.get(name)
+        if col is None:
+            raise HTTPException(status_code=422, detail=[{"loc": [name], "msg": "Field required"}])
+        if not isinstance(col, np.ndarray) or col.dtype.kind not in 'fi':
+            raise _columnar_type_error(name, "f64 or i32")
+        if name == 'Checkpoint_Count':
+            if col.dtype.kind == 'f':
+                bad[name] = ~(np.isfinite(col) & (np.floor(col) == col)), "Input should be a valid integer"
+            frame[name] = col.astype(np.int64) if col.dtype.kind == 'i' else np.nan_to_num(col).astype(np.int64)
+        else:
+            if col.dtype.kind == 'f':
+                bad[name] = np.isnan(col), "Input should be a valid number"
+            frame[name] = col if col.dtype.kind == 'f' else col.astype(np.float64)
+    for name in COLUMNAR_DATES:
+        col = columns.get(name)
+        if col is None:
+            col = np.full(rows, np.datetime64('NaT', 'ms'))
+        elif not isinstance(col, np.ndarray) or col.dtype.kind != 'M':
+            raise _columnar_type_error(name, "ts")
+        frame[name] = col
+    for name in COLUMNAR_STRINGS:
+        col, default = columns.get(name), PredictionInput.model_fields[name].default
+        if col is None:
+            frame[name] = np.full(rows, default, dtype=object)
+            continue
+        if not isinstance(col, pd.Categorical):
+            raise _columnar_type_error(name, "dict")
+        # Each distinct string is materialised once; rows gather from the dictionary
+        values = np.append(col.categories.to_numpy(dtype=object), default)
+        frame[name] = values.take(np.where(col.codes < 0, len(values) - 1, col.codes))
+
+    invalid = np.zeros(rows, dtype=bool)
+    for mask, _ in bad.values():
+        invalid |= mask
+    errors = {int(i): [{"loc": [name], "msg": msg} for name, (mask, msg) in bad.items() if mask[i]]
+              for i in np.flatnonzero(invalid)}
+
+    input_df = pd.DataFrame(frame, copy=False)
+    if errors:
+        input_df = input_df[~invalid].reset_index(drop=True)
+    for col in ("Product_Name", "Producer_Name", "Expected_Destination"):
+        input_df[col] = "Unknown"
+    return input_df, errors
+
+
+def score_records(records: List[PredictionInput]) -> List[dict]:
+    """
+    Score a list of validated records; results are returned in input
+    order. A single record takes the pandas-free fast path.
+    """
+    require_model()
+    if len(records) == 1:
+        return score_records_fast(records)
+    return score_records_frame(records)
+
+
+def score_records_frame(records: List[PredictionInput]) -> List[dict]:
+    """One feature-engineering pass over the whole batch and a single predict_proba call."""
+    with STAGE_SECONDS.time('api_frame', 'build_frame'):
+        input_df = build_input_frame(records)
+    predictions, probabilities, alert_levels, flag_lists, inverse = score_input_frame(input_df)
+    return [{
+        "fraud_prediction" : int(predictions[i]),
+        "fraud_probability": round(float(probabilities[i]), 4),
+        "alert_level"      : str(alert_levels[i]),
+        "fraud_types"      : list(flag_lists[inverse[i]]) if predictions[i] == 1 else ["None"],
+    } for i in range(len(input_df))]
+
+
+def score_input_frame(input_df: pd.DataFrame) -> tuple:
+    """
+    Score a raw input frame (see build_input_frame) on the pandas path:
+    (predictions, probabilities, alert_levels, flag_lists, inverse),
+    where row i's fraud flags are flag_lists[inverse[i]].
+    """
+    current = require_model()
+    with STAGE_SECONDS.time('api_frame', 'engineer_features'):
+        df_features = engineer_features(input_df, feature_store)
+        X = df_features[FEATURE_COLS].fillna(0)
+
+    X_values = X.to_numpy(dtype=np.float64)
+    with STAGE_SECONDS.time('api_frame', 'predict_proba'):
+        try:
+            proba         = live_predict_proba(current, X_values)
+            # Same rule RandomForestClassifier.predict applies internally
+            predictions   = current.scorer.classes_.take(np.argmax(proba, axis=1)).astype(int)
+            probabilities = proba[:, 1]
+        except Exception as exc:
+            record_fallback('api_frame', exc, len(X))
+            predictions   = np.zeros(len(X), dtype=int)
+            probabilities = np.zeros(len(X))
+            X_values      = None
+    observe_drift('api_frame', X_values, probabilities)
+
+    with STAGE_SECONDS.time('api_frame', 'rules'):
+        add_distributor_windows(df_features, feature_store)
+    with STAGE_SECONDS.time('api_frame', 'observe'):
+        feature_store.observe(df_features)
+
+    # Rule-based fraud type flags + alert levels, evaluated column-wise
+    with STAGE_SECONDS.time('api_frame', 'rules'):
+        masks = evaluate_rules(df_features)
+        predictions = rule_alerts(masks, predictions)
+        flag_lists, inverse = decode_rule_masks(masks)
+        alert_levels = get_alert_levels(probabilities)
+    record_outcomes('api_frame', alert_levels, predictions, flag_lists, inverse)
+    return predictions, probabilities, alert_levels, flag_lists, inverse
+
+
+def score_records_fast(records: List[PredictionInput], isolate_errors: bool = False) -> List[dict]:
+    """
+    Score records on plain floats, one after another as separate
+    /predict calls would see the feature store, with a single
+    predict_proba call for all of them. A record whose dates the fast
+    path cannot parse is scored on the pandas path in its place.
+    With `isolate_errors`, a record whose features cannot be built
+    gets the exception as its result instead of failing the call.
+    """
+    current = require_model()
+    results = [None] * len(records)
+    fast_idx, vectors, rows = [], [], []
+    for i, record in enumerate(records):
+        try:
+            with STAGE_SECONDS.time('api_fast', 'engineer_features'):
+                engineered = engineer_features_single(record.dict(), feature_store)
+            if engineered is None:
+                results[i] = score_records_frame([record])[0]
+                continue
+        except Exception as exc:
+            if not isolate_errors:
+                raise
+            results[i] = exc
+            continue
+        X, row = engineered
+        # Observed before the next record is engineered, so a later
+        # scan of the same batch counts this one as a duplicate
+        feature_store.observe_record(row)
+        fast_idx.append(i)
+        vectors.append(X)
+        rows.append(row)
+    if not fast_idx:
+        return results
+
+    X_values = np.vstack(vectors)
+    with STAGE_SECONDS.time('api_fast', 'predict_proba'):
+        try:
+            proba         = live_predict_proba(current, X_values)
+            predictions   = current.scorer.classes_.take(np.argmax(proba, axis=1)).astype(int)
+            probabilities = proba[:, 1]
+        except Exception as exc:
+            record_fallback('api_fast', exc, len(vectors))
+            predictions   = np.zeros(len(vectors), dtype=int)
+            probabilities = np.zeros(len(vectors))
+            X_values      = None
+    observe_drift('api_fast', X_values, probabilities)
+
+    # Rules for every record, so one that raises its own alert is caught
+    with STAGE_SECONDS.time('api_fast', 'rules'):
+        masks = evaluate_rules({col: np.fromiter((row.get(col, default) for row in rows),
+                                                 dtype=np.float64, count=len(rows))
+                                for col, default in RULE_DEFAULTS.items()}, n=len(rows))
+        predictions = rule_alerts(masks, predictions)
+        flag_lists, inverse = decode_rule_masks(masks)
+        alert_levels = get_alert_levels(probabilities)
+        for i, k, prediction, probability, alert_level in zip(
+                fast_idx, inverse, predictions, probabilities, alert_levels):
+            results[i] = {
+                "fraud_prediction" : int(prediction),
+                "fraud_probability": round(float(probability), 4),
+                "alert_level"      : str(alert_level),
+                "fraud_types"      : list(flag_lists[k]) if prediction == 1 else ["None"],
+            }
+    record_outcomes('api_fast', alert_levels, predictions, flag_lists, inverse)
+    return results
+
+
+def log_api_alerts(records: List[PredictionInput], results: List[dict]) -> None:
+    """Append the predicted-fraud results of an API call to the alert log."""
+    flagged = [(r, res) for r, res in zip(records, results)
+               if isinstance(res, dict) and res["fraud_prediction"] == 1]
+    if not flagged:
+        return
+    append_api_alerts({
+        'Batch_ID'          : [r.Batch_ID for r, _ in flagged],
+        'Distributor_ID'    : [r.Distributor_ID for r, _ in flagged],
+        'Quantity'          : [r.Quantity for r, _ in flagged],
+        'Last_Location'     : [r.Last_Location for r, _ in flagged],
+        'Fraud_Probability' : [res["fraud_probability"] for _, res in flagged],
+        'Alert_Level'       : [res["alert_level"] for _, res in flagged],
+        'Fraud_Types'       : [', '.join(res["fraud_types"]) for _, res in flagged],
+    })
+
+
+def append_api_alerts(columns: dict) -> None:
+    """Append flagged API results, given as result columns, to the alert log."""
+    try:
+        alert_log.append(alerts_frame(pd.DataFrame({
+            **columns,
+            'Is_Fraud_Predicted': 1,
+            'Alert_Time'        : datetime.now().isoformat(),
+        })))
+    except OSError as exc:
+        print(f"⚠️  Alert log append failed: {exc!r}")
+
+
+@profiler.wrap
+def score_predict_calls(records: List[PredictionInput]) -> List[dict]:
+    """
+    /predict scoring (one call, or a micro-batch of them), alerts
+    logged. A call that cannot be scored gets its exception as its
+    result, so it fails alone (see MicroBatcher).
+    """
+    results = score_records_fast(records, isolate_errors=True)
+    log_api_alerts(records, results)
+    return results
+
+
+predict_batcher = (MicroBatcher(score_predict_calls,
+                                BATCH_MAX_RECORDS, BATCH_MAX_WAIT_MS, BATCH_MAX_QUEUE)
+                   if BATCH_MAX_WAIT_MS > 0 else None)
+
+
+@app.on_event("shutdown")
+async def stop_predict_batcher():
+    if predict_batcher is not None:
+        await predict_batcher.close()
+
 
 @app.post("/predict")
-def predict(data: PredictionInput):
+async def predict(data: PredictionInput):
     """
     Accepts a supply chain checkpoint record and returns
     a fraud probability + alert level.
 
     Minimal required fields: Quantity, Transport_Time,
-    Checkpoint_Count, Price.
+    Checkpoint_Count, Price. Concurrent calls are scored
+    together in one model call (see MicroBatcher).
 
     Example body:
     {
@@ -316,56 +1468,214 @@ def predict(data: PredictionInput):
         "Price": 50
     }
     """
-    now = datetime.now()
-
-    # Build a one-row DataFrame from the request
-    input_df = pd.DataFrame([{
-        "Batch_ID"            : data.Batch_ID,
-        "Quantity"            : data.Quantity,
-        "Transport_Time"      : data.Transport_Time,
-        "Checkpoint_Count"    : data.Checkpoint_Count,
-        "Price"               : data.Price,
-        "Production_Date"     : data.Production_Date or (now - timedelta(days=30)).isoformat(),
-        "Expiry_Date"         : data.Expiry_Date      or (now + timedelta(days=365)).isoformat(),
-        "Timestamp"           : data.Timestamp        or now.isoformat(),
-        "Current_Status"      : data.Current_Status,
-        "Last_Location"       : data.Last_Location,
-        "Distributor_ID"      : data.Distributor_ID,
-    }])
+    require_model()
+    if predict_batcher is None:
+        result = (await run_in_threadpool(score_predict_calls, [data]))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    try:
+        return await predict_batcher.submit(data)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Scoring queue full; retry shortly",
+                            headers={"Retry-After": "1"})
 
-    # Ensure required columns exist
-    required_cols = [
-        "Batch_ID", "Product_Name", "Producer_Name", "Expected_Destination"
-    ]
-    for col in required_cols:
-        if col not in input_df:
-            input_df[col] = "Unknown"
 
-    # Feature engineering + prediction
-    df_features = engineer_features(input_df)
-    X = df_features[FEATURE_COLS].fillna(0)
+@app.post("/predict_batch", openapi_extra={"requestBody": {"required": True, "content": {
+    "application/json": {"schema": BatchPredictionInput.model_json_schema()},
+    COLUMNAR_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+}}})
+async def predict_batch(request: Request):
+    """
+    Scores many checkpoint records in one call.
 
-    try:
-        prediction  = int(model.predict(X)[0])
-        probability = float(model.predict_proba(X)[0][1])
-    except Exception:
-        prediction  = 0
-        probability = 0.0
+    Each entry of "records" has the same shape as the /predict body.
+    Invalid entries get an "error" instead of a score and do not
+    affect the rest of the batch; results keep the input order.
 
-    # Alert level
-    alert_level = get_alert_level(probability)
+    Example body:
+    {
+        "records": [
+            {"Quantity": 9000, "Transport_Time": 500, "Checkpoint_Count": 0, "Price": 50},
+            {"Quantity": 300,  "Transport_Time": 12,  "Checkpoint_Count": 5, "Price": 120}
+        ]
+    }
 
-    # Rule-based fraud type flags
-    fraud_types = detect_fraud_type(df_features.iloc[0]) if prediction == 1 else ["None"]
+    With Content-Type application/vnd.fraud.columnar the body is a
+    columnar payload (wire_format.py; one column per PredictionInput
+    field, dates as ts) and so is the response.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == COLUMNAR_CONTENT_TYPE:
+        payload = await run_in_threadpool(score_columnar_batch, body)
+        return Response(content=payload, media_type=COLUMNAR_CONTENT_TYPE)
+    try:
+        data = BatchPredictionInput.model_validate_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError([{**e, "loc": ("body", *e["loc"])}
+                                      for e in exc.errors(include_url=False)])
+    return await run_in_threadpool(score_json_batch, data)
+
+
+@profiler.wrap
+def score_json_batch(data: BatchPredictionInput) -> dict:
+    """/predict_batch with a JSON body: records validated one by one."""
+    if len(data.records) > MAX_BATCH_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(data.records)} records (max {MAX_BATCH_RECORDS})",
+        )
+
+    valid, valid_idx = [], []
+    results = [None] * len(data.records)
+    with STAGE_SECONDS.time('api_batch', 'validate'):
+        for i, raw in enumerate(data.records):
+            if not isinstance(raw, dict):
+                results[i] = {"index": i, "error": [{"loc": [], "msg": "record must be a JSON object"}]}
+                continue
+            try:
+                valid.append(PredictionInput(**raw))
+                valid_idx.append(i)
+            except ValidationError as exc:
+                results[i] = {"index": i, "error": [
+                    {"loc": list(e["loc"]), "msg": e["msg"]} for e in exc.errors()
+                ]}
+
+    if valid:
+        scored = score_records(valid)
+        log_api_alerts(valid, scored)
+        for i, result in zip(valid_idx, scored):
+            results[i] = {"index": i, **result}
 
     return {
-        "fraud_prediction" : prediction,
-        "fraud_probability": round(probability, 4),
-        "alert_level"      : alert_level,
-        "fraud_types"      : fraud_types,
+        "total_records": len(results),
+        "scored"       : len(valid),
+        "failed"       : len(results) - len(valid),
+        "results"      : results,
     }
 
 
+@profiler.wrap
+def score_columnar_batch(body: bytes) -> bytes:
+    """
+    /predict_batch with a columnar body. The response has one row per
+    input row: fraud_prediction (-1 = not scored), fraud_probability,
+    alert_level, fraud_types (comma-separated) and error (JSON list of
+    the row's validation errors, missing when it was scored).
+    """
+    with STAGE_SECONDS.time('api_batch', 'decode'):
+        try:
+            rows, columns = decode_columns(body)
+        except WireFormatError as exc:
+            raise HTTPException(status_code=400, detail=f"Malformed columnar body: {exc}")
+        if rows > MAX_COLUMNAR_RECORDS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {rows} records (max {MAX_COLUMNAR_RECORDS})",
+            )
+        input_df, errors = build_columnar_frame(rows, columns)
+
+    prediction  = np.full(rows, -1, dtype=np.int32)
+    probability = np.full(rows, np.nan)
+    alert_level = np.full(rows, None, dtype=object)
+    fraud_types = np.full(rows, None, dtype=object)
+    error       = np.full(rows, None, dtype=object)
+    valid = np.ones(rows, dtype=bool)
+    valid[list(errors)] = False
+    for i, row_errors in errors.items():
+        error[i] = json.dumps(row_errors)
+
+    if len(input_df):
+        predictions, probabilities, alert_levels, flag_lists, inverse = score_input_frame(input_df)
+        flagged = predictions == 1
+        joined  = np.asarray([', '.join(flags) for flags in flag_lists] or [''], dtype=object)
+        types   = np.where(flagged, joined[inverse], "None")
+        prediction[valid]  = predictions
+        # round() as the JSON body does: np.round scales first and can land a digit lower
+        probability[valid] = [round(p, 4) for p in probabilities.tolist()]
+        alert_level[valid] = alert_levels
+        fraud_types[valid] = types
+        if flagged.any():
+            append_api_alerts({
+                'Batch_ID'         : input_df['Batch_ID'].to_numpy()[flagged],
+                'Distributor_ID'   : input_df['Distributor_ID'].to_numpy()[flagged],
+                'Quantity'         : input_df['Quantity'].to_numpy()[flagged],
+                'Last_Location'    : input_df['Last_Location'].to_numpy()[flagged],
+                'Fraud_Probability': probability[valid][flagged],
+                'Alert_Level'      : alert_levels[flagged],
+                'Fraud_Types'      : types[flagged],
+            })
+
+    with STAGE_SECONDS.time('api_batch', 'encode'):
+        return encode_columns({
+            'fraud_prediction' : prediction,
+            'fraud_probability': probability,
+            'alert_level'      : alert_level,
+            'fraud_types'      : fraud_types,
+            'error'            : error,
+        }, rows)
+
+
+@app.post("/checkpoint_event")
+def checkpoint_event(event: CheckpointEvent):
+    """
+    Folds one raw checkpoint scan into its batch's trajectory state
+    (the backend posts every scan it records). Later /predict calls
+    for the batch see the updated trajectory features.
+
+    Trajectory features are not model inputs: they feed the
+    MISSING_SHIPMENT / WRONG_ROUTE / TEMPERATURE_EXCURSION rules, which
+    raise an alert for a record whatever the model predicts. The fraud
+    probability itself never changes.
+    """
+    if feature_store is None:
+        raise HTTPException(status_code=503, detail=f"Feature store not ready ({model_status['state']})")
+    try:
+        # Naive local time, like the records' timestamps it is compared with
+        ts = pd.Timestamp(normalise_date(event.timestamp)) if event.timestamp else pd.Timestamp.now()
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Unparseable timestamp: {event.timestamp!r}")
+    state = feature_store.observe_event(
+        event.batchId, (ts - pd.Timestamp(0)) / pd.Timedelta(seconds=1),
+        event.location.latitude, event.location.longitude, event.temperature,
+    )
+    return {"batchId": event.batchId, "trajectory": state}
+
+
+MAX_ALERTS_PER_READ = 5000
+
+
+@app.get("/alerts")
+def list_alerts(since: int = 0, limit: int = 500):
+    """
+    Alerts with offset >= `since`, oldest first. Poll with the returned
+    "next" as the following `since` to receive only new alerts; "first"
+    is the oldest offset still kept after rotation.
+    """
+    lines, cursor = alert_log.read_lines(max(since, 0), max(1, min(limit, MAX_ALERTS_PER_READ)))
+    # Log lines are already JSON objects: splice them in instead of re-encoding
+    body = (b'{"alerts":[' + b','.join(line.rstrip(b'\n') for line in lines)
+            + f'],"next":{cursor},"first":{alert_log.first_offset}}}'.encode())
+    return Response(body, media_type='application/json')
+
+
+@app.get("/alerts/{offset}/proof")
+def alert_proof(offset: int):
+    """
+    The alert at `offset` with the Merkle root it was anchored under,
+    the ledger receipt and its inclusion proof. Anyone can check it
+    with anchoring.verify_proof(alert, proof, root).
+    """
+    anchored = anchor_store.proof_for(offset)
+    if anchored is None:
+        raise HTTPException(status_code=404, detail=f"Alert {offset} is not anchored yet")
+    alert = alert_log.read(offset, 1)['alerts']
+    if not alert or alert[0]['offset'] != offset:
+        raise HTTPException(status_code=410, detail=f"Alert {offset} was rotated out of the log")
+    return {"alert": alert[0], **anchored, "verified": verify_proof(alert[0], anchored['proof'], anchored['root'])}
+
+
 # ─────────────────────────────────────────────
 # 4. FRAUD DETECTION ENGINE
 # ─────────────────────────────────────────────
@@ -373,7 +1683,9 @@ FRAUD_THRESHOLDS = {
     'Long_Storage'    : 168,    # hours (7 days)
     'Missing_Shipment': 48,     # hours without checkpoint
     'Hoarding_Qty'    : 5000,   # units
+    'Hoarding_7d_Qty' : 20000,  # units per distributor over a rolling 7 days
     'Bulk_Zscore'     : 3.0,    # standard deviations
+    'Max_Speed_Kmh'   : 150,    # implied speed between two scans of a batch by road
 }
 
 ALERT_LEVELS = {
@@ -383,59 +1695,182 @@ ALERT_LEVELS = {
     1.0: 'CRITICAL',
 }
 
+# Upper bounds in ascending order, for searchsorted
+ALERT_THRESHOLDS = sorted(ALERT_LEVELS)
+ALERT_NAMES      = np.array([ALERT_LEVELS[t] for t in ALERT_THRESHOLDS] + ['CRITICAL'])
+
+def get_alert_levels(probs) -> np.ndarray:
+    """Alert level per probability: one searchsorted over ALERT_THRESHOLDS."""
+    return ALERT_NAMES[np.searchsorted(ALERT_THRESHOLDS, np.asarray(probs, dtype=float), side='left')]
+
+
 def get_alert_level(prob: float) -> str:
-    for threshold, level in ALERT_LEVELS.items():
-        if prob <= threshold:
-            return level
-    return 'CRITICAL'
+    return str(get_alert_levels([prob])[0])
+
+
+# ── Rule table ────────────────────────────────────────
+# Each rule raises `flag` when every (column, op, value) condition holds.
+# `value` is a number, or (column, factor) to compare against factor * column.
+# Several rules may raise the same flag; flags are reported in table order.
+# A rule with 'alert': True also raises an alert on its own: its rows are
+# predicted fraud whatever the model says (the probability is unchanged).
+FRAUD_RULES = [
+    {'flag': 'EXPIRED_GOODS_IN_TRANSIT',
+     'when': [('Is_Expired', '==', 1), ('Status_Risk_Code', '>=', 2)]},
+    {'flag': 'LONG_STORAGE_ANOMALY',
+     'when': [('Transport_Time', '>', FRAUD_THRESHOLDS['Long_Storage']), ('Checkpoint_Count', '<', 3)]},
+    {'flag': 'MISSING_SHIPMENT',
+     'when': [('No_Checkpoint', '==', 1)]},
+    {'flag': 'DUPLICATE_BATCH_ID',
+     'when': [('Is_Duplicate', '==', 1)]},
+    {'flag': 'SUSPICIOUS_BULK_PURCHASE',
+     'when': [('Quantity_Zscore', '>', FRAUD_THRESHOLDS['Bulk_Zscore']), ('Price_Per_Unit', '<', ('Price', 0.4))]},
+    {'flag': 'HOARDING',
+     'when': [('Quantity_Zscore', '>', FRAUD_THRESHOLDS['Bulk_Zscore']), ('Price_Per_Unit', '>=', ('Price', 0.4))]},
+    # Rolling distributor quantities are not model features: this rule alerts by itself
+    {'flag': 'HOARDING', 'alert': True,
+     'when': [('Quantity_Zscore', '<=', FRAUD_THRESHOLDS['Bulk_Zscore']),
+              ('Distributor_Qty_7d', '>', FRAUD_THRESHOLDS['Hoarding_7d_Qty'])]},
+    # Checkpoint trajectory rules (NaN for batches without scans never fire). The
+    # model never sees trajectory columns, so these rules raise their own alerts
+    {'flag': 'MISSING_SHIPMENT', 'alert': True,
+     'when': [('Hours_Since_Last_Scan', '>', FRAUD_THRESHOLDS['Missing_Shipment'])]},
+    {'flag': 'MISSING_SHIPMENT', 'alert': True,
+     'when': [('Max_Scan_Gap_Hours', '>', FRAUD_THRESHOLDS['Missing_Shipment'])]},
+    {'flag': 'WRONG_ROUTE', 'alert': True,
+     'when': [('Max_Speed_Kmh', '>', FRAUD_THRESHOLDS['Max_Speed_Kmh'])]},
+    {'flag': 'TEMPERATURE_EXCURSION', 'alert': True,
+     'when': [('Temp_Excursions', '>=', 1)]},
+]
 
+# Value assumed when a rule column is absent from the input
+RULE_DEFAULTS = {
+    'Is_Expired': 0, 'Status_Risk_Code': 0, 'Transport_Time': 0, 'Checkpoint_Count': 99,
+    'No_Checkpoint': 0, 'Is_Duplicate': 0, 'Quantity_Zscore': 0,
+    'Price_Per_Unit': 999, 'Price': 999, 'Distributor_Qty_7d': 0,
+    'Hours_Since_Last_Scan': 0, 'Max_Scan_Gap_Hours': 0, 'Max_Speed_Kmh': 0, 'Temp_Excursions': 0,
+}
 
-def detect_fraud_type(row: pd.Series) -> list:
-    """Rule-based fraud type labelling (complements ML probability)."""
-    flags = []
+# ── Cascade escalation rules ──────────────────────────
+# The 'cascade' backend sends a record straight to the full forest when
+# any of these holds: the FRAUD_RULES conditions on model features, with
+# numeric thresholds halved so nothing near a rule is left to the screen,
+# plus locations outside LOCATION_CODES.
+ESCALATE_WHEN = [
+    ('Is_Expired',         '==', 1),
+    ('No_Checkpoint',      '==', 1),
+    ('Is_Duplicate',       '==', 1),
+    ('Bulk_Purchase_Flag', '==', 1),
+    ('Transport_Time',     '>',  FRAUD_THRESHOLDS['Long_Storage'] / 2),
+    ('Checkpoint_Count',   '<',  2),
+    ('Quantity_Zscore',    '>',  FRAUD_THRESHOLDS['Bulk_Zscore'] / 2),
+    ('Location_Code',      '<',  0),
+]
 
-    if row.get('Is_Expired', 0) == 1 and row.get('Status_Risk_Code', 0) >= 2:
-        flags.append('EXPIRED_GOODS_IN_TRANSIT')
+RULE_FLAGS    = list(dict.fromkeys(rule['flag'] for rule in FRAUD_RULES))
+NO_RULE_FLAGS = ['ML_DETECTED_ANOMALY']
+ALERT_BIT     = len(RULE_FLAGS)     # mask bit set when an 'alert' rule fired
 
-    if row.get('Transport_Time', 0) > FRAUD_THRESHOLDS['Long_Storage'] \
-       and row.get('Checkpoint_Count', 99) < 3:
-        flags.append('LONG_STORAGE_ANOMALY')
 
-    if row.get('No_Checkpoint', 0) == 1:
-        flags.append('MISSING_SHIPMENT')
+def _rule_column(features, name: str, n: int) -> np.ndarray:
+    if name in features:
+        return np.asarray(features[name], dtype=float).reshape(-1)
+    return np.full(n, RULE_DEFAULTS.get(name, 0), dtype=float)
 
-    if row.get('Is_Duplicate', 0) == 1:
-        flags.append('DUPLICATE_BATCH_ID')
 
-    if row.get('Quantity_Zscore', 0) > FRAUD_THRESHOLDS['Bulk_Zscore']:
-        if row.get('Price_Per_Unit', 999) < row.get('Price', 999) * 0.4:
-            flags.append('SUSPICIOUS_BULK_PURCHASE')
-        else:
-            flags.append('HOARDING')
+def evaluate_rules(features, n: int = None) -> np.ndarray:
+    """
+    Evaluate FRAUD_RULES as boolean masks over a feature frame (or a
+    mapping of column -> array / scalar). Returns one uint32 per row
+    with bit i set when RULE_FLAGS[i] fired, and bit ALERT_BIT when a
+    rule that raises its own alert fired (see rule_alerts).
+    """
+    n = len(features) if n is None else n
+    masks = np.zeros(n, dtype=np.uint32)
+    for rule in FRAUD_RULES:
+        hit = np.ones(n, dtype=bool)
+        for col, op, value in rule['when']:
+            if isinstance(value, tuple):
+                ref_col, factor = value
+                value = _rule_column(features, ref_col, n) * factor
+            hit &= RULE_OPS[op](_rule_column(features, col, n), value)
+        masks |= hit.astype(np.uint32) << np.uint32(RULE_FLAGS.index(rule['flag']))
+        if rule.get('alert'):
+            masks |= hit.astype(np.uint32) << np.uint32(ALERT_BIT)
+    return masks
+
+
+def rule_alerts(masks: np.ndarray, predictions) -> np.ndarray:
+    """Model predictions with every row an 'alert' rule fired for set to fraud (1)."""
+    return np.where(masks >> np.uint32(ALERT_BIT) & 1, 1, predictions)
+
+
+def decode_rule_masks(masks: np.ndarray):
+    """
+    Turn rule bitmasks into flag lists without per-row work: each
+    distinct mask is decoded once. Returns (flag lists per distinct
+    mask, index of each row's mask in that list).
+    """
+    distinct, inverse = np.unique(masks, return_inverse=True)
+    flag_lists = [
+        [flag for bit, flag in enumerate(RULE_FLAGS) if int(m) >> bit & 1] or NO_RULE_FLAGS
+        for m in distinct
+    ]
+    return flag_lists, inverse.reshape(-1)
 
-    return flags if flags else ['ML_DETECTED_ANOMALY']
+
+def detect_fraud_type(row) -> list:
+    """Rule-based fraud type labelling (complements ML probability)."""
+    flag_lists, inverse = decode_rule_masks(evaluate_rules(row, n=1))
+    return list(flag_lists[inverse[0]])
 
 
-def run_fraud_detection(new_records: pd.DataFrame, model) -> pd.DataFrame:
+def run_fraud_detection(new_records: pd.DataFrame, model, store: FeatureStore = None,
+                        backend: str = None, groups: GroupAggregates = None) -> pd.DataFrame:
     """
     Main inference pipeline.
     Accepts raw supply chain records, returns enriched alert DataFrame.
+    With a FeatureStore, records are scored against its population
+    statistics and then folded into them. `backend` picks the
+    inference backend (see INFERENCE_BACKENDS; default: see
+    offline_backend). `groups` scores `new_records` as one chunk of
+    a larger input (see score_file).
     """
-    df_feat = engineer_features(new_records)
-    X_new   = df_feat[FEATURE_COLS].fillna(0)
-
-    probs = model.predict_proba(X_new)[:, 1]
-    preds = model.predict(X_new)
-
-    results = new_records.copy().reset_index(drop=True)
+    model = get_inference_model(model, offline_backend(len(new_records), backend))
+    with STAGE_SECONDS.time('offline', 'engineer_features'):
+        df_feat = engineer_features(new_records, store, groups)
+        X_new   = df_feat[FEATURE_COLS].fillna(0)
+
+    # One forest traversal; labels follow from the probabilities
+    with STAGE_SECONDS.time('offline', 'predict_proba'):
+        proba = model.predict_proba(X_new)
+        probs = proba[:, 1]
+        preds = model.classes_.take(np.argmax(proba, axis=1))
+
+    with STAGE_SECONDS.time('offline', 'rules'):
+        # Window priors must be read before this frame is folded into them
+        add_distributor_windows(df_feat, groups if groups is not None else store)
+    with STAGE_SECONDS.time('offline', 'observe'):
+        if store is not None:
+            store.observe(df_feat)
+        if groups is not None:
+            groups.observe(df_feat)
+
+    with STAGE_SECONDS.time('offline', 'rules'):
+        masks = evaluate_rules(df_feat)
+        preds = rule_alerts(masks, preds)
+        alert_levels = get_alert_levels(probs)
+        flag_lists, inverse = decode_rule_masks(masks)
+        labels = np.array([', '.join(flags) for flags in flag_lists] + ['None'], dtype=object)
+
+    # reset_index already returns a new frame; a .copy() on top doubled peak memory
+    results = new_records.reset_index(drop=True)
     results['Fraud_Probability']  = probs
     results['Is_Fraud_Predicted'] = preds
-    results['Alert_Level']  = [get_alert_level(p) for p in probs]
-    results['Fraud_Types']  = [
-        ', '.join(detect_fraud_type(df_feat.iloc[i])) if preds[i] == 1 else 'None'
-        for i in range(len(preds))
-    ]
+    results['Alert_Level']  = alert_levels
+    results['Fraud_Types']  = labels[np.where(preds == 1, inverse, len(flag_lists))]
     results['Alert_Time'] = datetime.now().isoformat()
+    record_outcomes('offline', alert_levels, preds, flag_lists, inverse)
 
     return results
 
@@ -483,31 +1918,11 @@ def output_alerts(results: pd.DataFrame) -> None:
     print("="*65)
 
 
-def export_alerts_to_json(results: pd.DataFrame, path='alerts_output.json') -> None:
-    """Export alerts as JSON — ready for blockchain API consumption."""
-    flagged = results[results['Is_Fraud_Predicted'] == 1].copy()
-
-    alerts = []
-    for _, row in flagged.iterrows():
-        alerts.append({
-            'batch_id'         : row['Batch_ID'],
-            'product'          : row['Product_Name'],
-            'producer'         : row['Producer_Name'],
-            'distributor_id'   : row['Distributor_ID'],
-            'quantity'         : int(row['Quantity']),
-            'last_location'    : row['Last_Location'],
-            'destination'      : row['Expected_Destination'],
-            'fraud_probability': round(float(row['Fraud_Probability']), 4),
-            'alert_level'      : row['Alert_Level'],
-            'fraud_types'      : row['Fraud_Types'].split(', '),
-            'alert_timestamp'  : row['Alert_Time'],
-        })
-
-    import json
-    with open(path, 'w') as f:
-        json.dump({'total_alerts': len(alerts), 'alerts': alerts}, f, indent=2)
-
-    print(f"\n  📁 Alerts exported → {path}")
+def export_alerts(results: pd.DataFrame, log: AlertLog) -> tuple:
+    """Append flagged records to the alert log — ready for blockchain API consumption."""
+    first, end = log.append(alerts_frame(results))
+    print(f"\n  📁 {end - first} alerts appended → {log.directory} (offsets {first}..{end - 1})")
+    return first, end
 
 
 # ─────────────────────────────────────────────
@@ -542,36 +1957,18 @@ Integration Steps:
   1.  Every checkpoint scan → blockchain transaction recorded
   2.  ML model receives the new record via API trigger
   3.  If fraud_probability > 0.5 → alert raised
-  4.  Alert hash (SHA-256) stored on blockchain for immutability
+  4.  Each run's alerts are Merkle-hashed; only the root is stored on
+      blockchain (one transaction per batch, see anchoring.py) and
+      every alert keeps an inclusion proof against that root
   5.  Government / NGO dashboard polls alerts endpoint
   6.  Smart contract can auto-freeze a batch if CRITICAL alert raised
 """
 
-def simulate_blockchain_api_call(alert: dict) -> dict:
-    """
-    Simulates storing an ML fraud alert hash on-chain.
-    In production: replace with web3.py / fabric-sdk call.
-    """
-    import hashlib, json
-    alert_str  = json.dumps(alert, sort_keys=True)
-    alert_hash = hashlib.sha256(alert_str.encode()).hexdigest()
-
-    tx_record = {
-        'tx_hash'    : f'0x{alert_hash[:40]}',
-        'batch_id'   : alert['batch_id'],
-        'alert_level': alert['alert_level'],
-        'fraud_types': alert['fraud_types'],
-        'block_number': np.random.randint(100000, 999999),
-        'timestamp'  : datetime.now().isoformat(),
-        'status'     : 'CONFIRMED',
-    }
-    return tx_record
-
 
 # ─────────────────────────────────────────────
-# 7. MAIN — DEMO RUN
+# 7. MAIN — DEMO RUN / BATCH SCORING CLI
 # ─────────────────────────────────────────────
-if __name__ == '__main__':
+def run_demo():
 
     print("\n🌿  DIGI TRACEABILITY - Fraud Detection System Starting...\n")
 
@@ -582,29 +1979,95 @@ if __name__ == '__main__':
 
     # Step 2: Train model
     print("🤖 Training Random Forest model...")
-    model, X_test, y_test = train_model(df)
+    model, X_test, y_test = train_model(df, registry, run_cv=True)
 
     # Step 3: Simulate incoming checkpoint records (new unseen data)
     print("\n🔍 Running fraud detection on new checkpoint records...")
     new_data = generate_dataset(n_samples=50, fraud_ratio=0.20)
-    results  = run_fraud_detection(new_data, model)
+    live     = registry.load(registry.live_version(), INFERENCE_BACKEND)
+    results  = run_fraud_detection(new_data, live.scorer, FeatureStore(live.stats))
 
     # Step 4: Output alerts
     output_alerts(results)
 
-    # Step 5: Export JSON alerts (for blockchain API)
-    export_alerts_to_json(results, 'alerts_output.json')
-
-    # Step 6: Simulate blockchain recording of alerts
-    flagged = results[results['Is_Fraud_Predicted'] == 1]
-    print("\n⛓️  Simulating Blockchain Alert Storage:")
-    for _, row in flagged.head(3).iterrows():
-        alert = {
-            'batch_id'    : row['Batch_ID'],
-            'alert_level' : row['Alert_Level'],
-            'fraud_types' : row['Fraud_Types'].split(', '),
-        }
-        tx = simulate_blockchain_api_call(alert)
+    # Step 5: Append alerts to the log (for blockchain API / dashboard polling)
+    first, end = export_alerts(results, alert_log)
+
+    # Step 6: Anchor every alert not yet anchored, this run's included, as one Merkle root
+    anchor = anchor_pending(alert_log, ledger, anchor_store)
+    if anchor is not None:
+        tx = anchor['receipt']
+        print(f"\n⛓️  Anchored {anchor['count']} alerts in one transaction:")
+        print(f"   Merkle root: {anchor['root']}")
         print(f"   TX Hash: {tx['tx_hash']}  |  Block: {tx['block_number']}  |  Status: {tx['status']}")
+    proof = anchor_store.proof_for(first) if end > first else None
+    if proof is not None:
+        alert = alert_log.read(first, 1)['alerts'][0]
+        print(f"   Alert {first} ({alert['batch_id']}) inclusion proof: {len(proof['proof'])} hashes, "
+              f"verified={verify_proof(alert, proof['proof'], proof['root'])}")
+
+    print("\n✅  Digi Traceability ML Pipeline Complete.\n")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Digi Traceability fraud detection')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('demo', help='train on synthetic data and score a sample (default)')
+
+    p = sub.add_parser('train', help='full retrain on synthetic data, published to the registry')
+    p.add_argument('--rows', type=int, default=1200)
+    p.add_argument('--cv', action='store_true', help='also run 5-fold CV on the same features')
+
+    p = sub.add_parser('update', help='incremental retrain: add trees fitted on newly labelled checkpoints')
+    p.add_argument('labelled', help='CSV/Parquet of checkpoint records with an Is_Fraud column')
+    p.add_argument('--trees', type=int, default=50, help='trees to fit on the new data')
+    p.add_argument('--max-trees', type=int, default=None, help='retire the oldest trees beyond this')
+
+    p = sub.add_parser('cv', help='cross-validate a version on its cached features')
+    p.add_argument('version', nargs='?', default=None, help='default: the live version, or the newest with cached features')
+
+    p = sub.add_parser('score', help='score a CSV/Parquet export chunk by chunk')
+    p.add_argument('input', help='checkpoint export (.csv, or .parquet / .pq)')
+    p.add_argument('-o', '--output', required=True, help='results file (.ndjson, or .parquet / .pq)')
+    p.add_argument('--chunk-rows', type=int, default=50_000)
+    p.add_argument('--backend', choices=INFERENCE_BACKENDS, default=None,
+                   help=f'default: {BATCH_INFERENCE_BACKEND} for chunks over {COMPILED_MAX_ROWS} rows, '
+                        f'else {INFERENCE_BACKEND}')
+    p.add_argument('--workers', type=int, default=1, help='score each chunk across this many processes')
+    p.add_argument('--approx-quantile', action='store_true',
+                   help='use the sketched bulk threshold and skip the extra Quantity pass')
+
+    sub.add_parser('anchor', help='anchor alert-log entries not yet on the ledger as one Merkle root')
+
+    args = parser.parse_args(argv)
+    if args.command == 'train':
+        train_model(generate_dataset(args.rows, 0.15), registry, run_cv=args.cv)
+    elif args.command == 'update':
+        read = pd.read_parquet if args.labelled.lower().endswith(('.parquet', '.pq')) else pd.read_csv
+        train_incremental(read(args.labelled), registry, args.trees, args.max_trees)
+    elif args.command == 'cv':
+        try:
+            cross_validate_version(registry, args.version)
+        except ValueError as exc:
+            print(f"❌ {exc}")
+            return 1
+    elif args.command == 'score':
+        from batch_scoring import score_file
+        print(f"\n📂 Scoring {args.input} in chunks of {args.chunk_rows:,} rows...")
+        score_file(args.input, args.output, args.chunk_rows, args.backend,
+                   exact_quantile=not args.approx_quantile, workers=args.workers)
+    elif args.command == 'anchor':
+        anchor = anchor_pending(alert_log, ledger, anchor_store)
+        if anchor is None:
+            print("✅ No new alerts to anchor")
+        else:
+            print(f"⛓️  Anchored alerts {anchor['first_offset']}..{anchor['end_offset'] - 1} "
+                  f"under {anchor['root']}  (tx {anchor['receipt']['tx_hash']})")
+    else:
+        run_demo()
+
 
-    print("\n✅  Digi Traceability ML Pipeline Complete.\n")
\ No newline at end of file
+if __name__ == '__main__':
+    raise SystemExit(main())
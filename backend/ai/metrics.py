@@ -0,0 +1,301 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Service Metrics
+  Low-overhead counters / histograms rendered in the
+  Prometheus text format, plus an opt-in slow-call profiler
+=============================================================
+"""
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds: 100 µs (fast path) up to 10 s (large batches)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(x: float) -> str:
+    if x == float('inf'):
+        return '+Inf'
+    return repr(float(x)) if x != int(x) else str(int(x))
+
+
+# ─────────────────────────────────────────────
+# 1. METRIC TYPES
+# ─────────────────────────────────────────────
+class Counter:
+    """Monotonic count per label combination."""
+    TYPE = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            yield f'{self.name}_total{_label_text(self.labelnames, labels)} {_number(v)}'
+
+
+class Gauge(Counter):
+    """Value that goes up and down (or is set outright)."""
+    TYPE = 'gauge'
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            yield f'{self.name}{_label_text(self.labelnames, labels)} {_number(v)}'
+
+
+class _Timer:
+    __slots__ = ('hist', 'labels', 't0')
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. An observation is one bisect and three
+    additions under a lock; cumulative bucket counts are only built
+    when /metrics is rendered.
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}                 # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *labels) -> _Timer:
+        """`with hist.time('label'):` observes the block's wall-clock seconds."""
+        return _Timer(self, labels)
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += n
+                le = _label_text(self.labelnames, labels, f'le="{_number(bound)}"')
+                yield f'{self.name}_bucket{le} {cumulative}'
+            text = _label_text(self.labelnames, labels)
+            yield f'{self.name}_sum{text} {series[-1]!r}'
+            yield f'{self.name}_count{text} {cumulative}'
+
+
+# ─────────────────────────────────────────────
+# 2. REGISTRY + TEXT EXPOSITION
+# ─────────────────────────────────────────────
+class MetricsRegistry:
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f'# HELP {m.name} {m.documentation}')
+            lines.append(f'# TYPE {m.name} {m.TYPE}')
+            lines.extend(m.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# ── Fraud service metrics (per process) ───────────────
+# pipeline: 'api_fast' (per-record fast path, /predict), 'api_frame' (pandas
+# path behind /predict and /predict_batch), 'api_batch' (per-record
+# validation in /predict_batch), 'offline' (run_fraud_detection)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'fraud_http_request_seconds', 'Whole HTTP request latency, including body parsing',
+    ('route', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'fraud_stage_seconds', 'Latency of each scoring stage', ('pipeline', 'stage'))
+RECORDS_SCORED = REGISTRY.counter(
+    'fraud_records_scored', 'Records scored', ('pipeline',))
+FALLBACKS = REGISTRY.counter(
+    'fraud_predict_fallback', 'Records scored as 0.0 because predict_proba raised', ('pipeline', 'error'))
+ALERTS = REGISTRY.counter(
+    'fraud_alerts', 'Scored records by alert level', ('pipeline', 'level'))
+FRAUD_FLAGS = REGISTRY.counter(
+    'fraud_flags', 'Fraud-type flags raised on predicted-fraud records', ('pipeline', 'flag'))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'fraud_prediction_cache_lookups', 'Prediction cache lookups per row; hit rate = hit / (hit + miss)',
+    ('tier', 'result'))
+CACHE_ENTRIES = REGISTRY.gauge(
+    'fraud_prediction_cache_entries', 'Rows held in the in-process prediction cache')
+BATCH_SIZE = REGISTRY.histogram(
+    'fraud_batcher_batch_size', 'Records per coalesced /predict scoring call', (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+BATCH_QUEUE_SECONDS = REGISTRY.histogram(
+    'fraud_batcher_queue_seconds', 'Time a /predict call waited before its batch was scored')
+BATCH_QUEUE_DEPTH = REGISTRY.gauge(
+    'fraud_batcher_queue_depth', 'Calls still queued when the last batch started')
+BATCH_REJECTED = REGISTRY.counter(
+    'fraud_batcher_rejected', '/predict calls rejected with 503 because the queue was full')
+BATCH_SPLIT = REGISTRY.counter(
+    'fraud_batcher_split', 'Coalesced batches rescored call by call because scoring the batch raised')
+CASCADE_RECORDS = REGISTRY.counter(
+    'fraud_cascade_records', "Records scored by the 'cascade' backend, by the tier that decided them",
+    ('route',))
+PROFILES_CAPTURED = REGISTRY.counter(
+    'fraud_slow_profiles', 'Slow-call profiles written by SlowCallProfiler', ('function',))
+
+
+# ─────────────────────────────────────────────
+# 3. ASGI REQUEST TIMER
+# ─────────────────────────────────────────────
+class RequestTimer:
+    """
+    Pure ASGI middleware observing each HTTP request's total latency
+    (body parsing, handler, serialisation) by route template and
+    status. Cheaper than BaseHTTPMiddleware, which wraps every
+    response in an extra task and stream.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The route template, not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            self.histogram.observe(time.perf_counter() - t0, route, str(status))
+
+
+# ─────────────────────────────────────────────
+# 4. OPT-IN SLOW-CALL PROFILER
+# ─────────────────────────────────────────────
+class SlowCallProfiler:
+    """
+    Runs cProfile on a random `sample_rate` fraction of calls and
+    keeps the profile (pstats .prof file in `directory`) only when the
+    call took at least `slow_ms`. The newest `keep` profiles are kept.
+    With sample_rate 0 the wrapper costs one comparison.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: float = 250.0,
+                 directory: str = 'profiles', keep: int = 50, captured: Counter = None):
+        self.sample_rate = sample_rate
+        self.slow_ms     = slow_ms
+        self.directory   = directory
+        self.keep        = keep
+        self.captured    = captured
+
+    def wrap(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return fn(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:          # another profiler is active in this thread
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                elapsed_ms = (time.perf_counter() - t0) * 1e3
+                if elapsed_ms >= self.slow_ms:
+                    self._save(profiler, fn.__name__, elapsed_ms)
+        return wrapper
+
+    def _save(self, profiler: cProfile.Profile, name: str, elapsed_ms: float) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f'.{time.time_ns() // 1_000_000 % 1000:03d}'
+        profiler.dump_stats(os.path.join(self.directory, f'{stamp}-{name}-{elapsed_ms:.0f}ms-{os.getpid()}.prof'))
+        if self.captured is not None:
+            self.captured.inc(name)
+        profiles = sorted(
+            (os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.prof')),
+            key=os.path.getmtime,
+        )
+        for stale in profiles[:-self.keep]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
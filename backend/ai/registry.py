@@ -0,0 +1,243 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Model Registry
+  Versioned model artifacts + a manifest naming the live one
+
+  model_registry/
+    manifest.json          {"live": "v0002", "versions": {...}}
+    v0001/
+      forest_*.npy         CompiledForest node arrays (memory-mapped)
+      forest.json
+      model.pkl            fitted RandomForestClassifier
+      feature_stats.pkl    training-time FeatureStats
+      features.npz         engineered training rows (X, y), reused by CV jobs
+      holdout.npz          rolling evaluation holdout (X, y)
+      cascade/             screen forest + rules in front of the forest (see cascade.py)
+      drift_reference.pkl  training-time input/output distribution (see drift.py)
+=============================================================
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from cascade import CascadeModel
+from forest import CompiledForest
+
+
+class LoadedModel:
+    """A registry version loaded for serving; swapped in as one object."""
+
+    def __init__(self, version: str, scorer, backend: str, stats=None):
+        self.version = version
+        self.scorer  = scorer          # anything with predict_proba / classes_
+        self.backend = backend
+        self.stats   = stats
+
+
+class ModelRegistry:
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, root: str):
+        self.root = root       # created on first publish, so constructing one is free
+
+    # ── Manifest ──────────────────────────────────────────
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, self.MANIFEST)
+
+    def manifest(self) -> dict:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'live': None, 'versions': {}}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        # Write-then-rename so readers in other workers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.manifest-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def live_version(self):
+        return self.manifest()['live']
+
+    def versions(self) -> dict:
+        return self.manifest()['versions']
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    # ── Locking (publish / training across workers) ───────
+    @contextmanager
+    def lock(self, name: str = 'registry', timeout: float = 30.0, stale_after: float = 3600.0):
+        """Cross-process lock file; a lock older than `stale_after` seconds is broken."""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f'.{name}.lock')
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) > stale_after:
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f'Registry lock {path} is held')
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            os.remove(path)
+
+    # ── Publish / activate ────────────────────────────────
+    def publish(self, model, stats=None, metrics: dict = None, source: str = 'train',
+                activate: bool = False, datasets: dict = None, cascade: CascadeModel = None,
+                drift_reference=None) -> str:
+        """
+        Write a fitted model as a new immutable version. Artifacts are
+        built in a temp directory and renamed into place, so a version
+        directory either exists completely or not at all.
+        `datasets` maps a name ('features', 'holdout') to an (X, y) pair
+        stored with the version; `cascade` is saved for the 'cascade' backend
+        and `drift_reference` for the drift monitor.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        try:
+            CompiledForest.from_sklearn(model).save(staging)
+            joblib.dump(model, os.path.join(staging, 'model.pkl'))
+            if stats is not None:
+                joblib.dump(stats, os.path.join(staging, 'feature_stats.pkl'))
+            for name, (X, y) in (datasets or {}).items():
+                np.savez(os.path.join(staging, f'{name}.npz'),
+                         X=np.asarray(X, dtype=np.float64), y=np.asarray(y))
+            if cascade is not None:
+                cascade.save(os.path.join(staging, 'cascade'))
+            if drift_reference is not None:
+                joblib.dump(drift_reference, os.path.join(staging, 'drift_reference.pkl'))
+
+            with self.lock():
+                manifest = self.manifest()
+                version = f'v{len(manifest["versions"]) + 1:04d}'
+                while os.path.exists(self.path(version)):
+                    version = f'v{int(version[1:]) + 1:04d}'
+                os.rename(staging, self.path(version))
+                manifest['versions'][version] = {
+                    'created'     : datetime.now().isoformat(),
+                    'source'      : source,
+                    'n_estimators': len(model.estimators_),
+                    'metrics'     : metrics or {},
+                }
+                if activate:
+                    manifest['live'] = version
+                self._write_manifest(manifest)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return version
+
+    def update_metrics(self, version: str, metrics: dict) -> None:
+        """Merge metrics computed after publishing (e.g. by a CV job) into the manifest."""
+        with self.lock():
+            manifest = self.manifest()
+            if version not in manifest['versions']:
+                raise KeyError(f'Unknown model version {version!r}')
+            manifest['versions'][version]['metrics'].update(metrics)
+            self._write_manifest(manifest)
+
+    def activate(self, version: str) -> None:
+        with self.lock():
+            manifest = self.manifest()
+            if version not in manifest['versions']:
+                raise KeyError(f'Unknown model version {version!r}')
+            manifest['live'] = version
+            self._write_manifest(manifest)
+
+    # ── Load ──────────────────────────────────────────────
+    def load(self, version: str, backend: str = 'compiled', shm_dir: str = None) -> LoadedModel:
+        """
+        'compiled' memory-maps the node arrays and never touches sklearn;
+        'sklearn' unpickles model.pkl; 'cascade' puts the version's
+        screen in front of the compiled forest (versions without one
+        are served as 'compiled').
+
+        With `shm_dir` (e.g. /dev/shm) the node arrays are first copied
+        once into that tmpfs and mapped from there, so every worker on
+        the host attaches to the same RAM-resident pages.
+        """
+        directory = self.path(version)
+        if backend in ('compiled', 'cascade'):
+            if shm_dir:
+                directory = self._stage_in_shm(version, shm_dir)
+            scorer = CompiledForest.load(directory, mmap=True)
+            cascade = self.load_cascade(version, scorer) if backend == 'cascade' else None
+            if cascade is not None:
+                scorer = cascade
+            elif backend == 'cascade':
+                print(f'⚠️  {version} has no cascade; scoring every record with the full forest')
+                backend = 'compiled'
+        else:
+            scorer = joblib.load(os.path.join(directory, 'model.pkl'))
+        stats_path = os.path.join(directory, 'feature_stats.pkl')
+        stats = joblib.load(stats_path) if os.path.exists(stats_path) else None
+        return LoadedModel(version, scorer, backend, stats)
+
+    def load_cascade(self, version: str, full):
+        """`version`'s CascadeModel in front of `full`; None if it has none."""
+        directory = os.path.join(self.path(version), 'cascade')
+        return CascadeModel.load(directory, full) if os.path.isdir(directory) else None
+
+    def load_drift_reference(self, version: str):
+        """`version`'s DriftReference; None if it was published without one."""
+        path = os.path.join(self.path(version), 'drift_reference.pkl')
+        return joblib.load(path) if os.path.exists(path) else None
+
+    def load_dataset(self, version: str, name: str):
+        """(X, y) stored with a version; FileNotFoundError if it has none."""
+        with np.load(os.path.join(self.path(version), f'{name}.npz')) as data:
+            return data['X'], data['y']
+
+    def has_dataset(self, version: str, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path(version), f'{name}.npz'))
+
+    def latest_with_dataset(self, name: str):
+        """Newest version stored with dataset `name`; None if no version has it."""
+        for version in sorted(self.versions(), reverse=True):
+            if self.has_dataset(version, name):
+                return version
+        return None
+
+    def _stage_in_shm(self, version: str, shm_dir: str) -> str:
+        """Copy a version's node arrays into shm_dir once per host; return the copy's path."""
+        # Namespaced by registry location so two registries never share a copy
+        tag    = hashlib.sha1(os.path.abspath(self.root).encode()).hexdigest()[:8]
+        target = os.path.join(shm_dir, f'fraud-forest-{tag}-{version}')
+        if os.path.isdir(target):
+            return target
+        staging = tempfile.mkdtemp(dir=shm_dir, prefix=f'.fraud-forest-{tag}-')
+        try:
+            source = self.path(version)
+            for name in os.listdir(source):
+                if name.startswith('forest'):
+                    shutil.copyfile(os.path.join(source, name), os.path.join(staging, name))
+            os.rename(staging, target)
+        except OSError:
+            # Another worker won the race (or the copy failed): use theirs if present
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        return target
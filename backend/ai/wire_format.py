@@ -0,0 +1,178 @@
+"""
+=============================================================
+  DIGI TRACEABILITY - Columnar Wire Format
+  Binary request/response bodies for /predict_batch: one
+  contiguous little-endian array per column, read with
+  np.frombuffer (no per-record objects, no date parsing)
+=============================================================
+
+Layout:
+
+  0       4   magic b'FWC1'
+  4       4   uint32 header length H
+  8       H   UTF-8 JSON header:
+                {"rows": n, "columns": [
+                  {"name": "Quantity",  "type": "f64",  "offset": 0},
+                  {"name": "Timestamp", "type": "ts",   "offset": 8n, "tz": "utc"},
+                  {"name": "Batch_ID",  "type": "dict", "offset": 16n,
+                   "dictionary": ["BATCH-0001", "BATCH-0002"]}]}
+  D       ..  data section, starting at the first 8-byte boundary after the
+              header (D = 8 + H rounded up); each column's "offset" is
+              relative to D and 8-byte aligned:
+                f64   n x float64 (NaN = missing)
+                i32   n x int32
+                ts    n x int64 milliseconds since the Unix epoch (INT64_MIN =
+                      missing, which numpy reads as NaT). Without "tz" the
+                      values are naive wall-clock times, like dates without
+                      an offset in a JSON body: the service reads them as its
+                      local time. With "tz": "utc" they are true instants and
+                      are converted to the service's local time on decode,
+                      as JSON dates with an offset are.
+                dict  n x int32 codes into "dictionary" (-1 = missing)
+
+backend/utils/fraudWire.js is the Node encoder/decoder.
+"""
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+
+CONTENT_TYPE = 'application/vnd.fraud.columnar'
+MAGIC        = b'FWC1'
+ALIGN        = 8
+
+# type -> little-endian numpy dtype of its data
+DTYPES = {
+    'f64' : np.dtype('<f8'),
+    'i32' : np.dtype('<i4'),
+    'ts'  : np.dtype('<i8'),
+    'dict': np.dtype('<i4'),
+}
+
+
+class WireFormatError(ValueError):
+    """The buffer is not a well-formed columnar payload."""
+
+
+def _padded(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+# ─────────────────────────────────────────────
+# 1. DECODE
+# ─────────────────────────────────────────────
+def read_header(buf) -> dict:
+    view = memoryview(buf)
+    if len(view) < 8 or bytes(view[:4]) != MAGIC:
+        raise WireFormatError('not a columnar payload (bad magic)')
+    (size,) = struct.unpack_from('<I', view, 4)
+    if 8 + size > len(view):
+        raise WireFormatError('header runs past the end of the payload')
+    try:
+        header = json.loads(bytes(view[8:8 + size]))
+        rows, columns = int(header['rows']), header['columns']
+    except (ValueError, KeyError, TypeError) as exc:
+        raise WireFormatError(f'unreadable header: {exc}') from None
+    if rows < 0:
+        raise WireFormatError('negative row count')
+    return {'rows': rows, 'columns': columns, 'data_offset': _padded(8 + size)}
+
+
+def decode_columns(buf) -> tuple:
+    """
+    (rows, {name: column}) from a payload. f64 / i32 columns are
+    read-only views of `buf`, ts columns views as datetime64[ms]
+    (copies in naive local time for "tz": "utc" columns); dict columns
+    are Categoricals over their codes (missing -> NaN).
+    """
+    header = read_header(buf)
+    rows, columns = header['rows'], {}
+    base = header['data_offset']
+    for col in header['columns']:
+        try:
+            name, kind, offset = str(col['name']), col['type'], int(col['offset'])
+        except (KeyError, TypeError, ValueError):
+            raise WireFormatError(f'malformed column entry: {col!r}') from None
+        dtype = DTYPES.get(kind)
+        if dtype is None:
+            raise WireFormatError(f'column {name!r}: unknown type {kind!r}')
+        if offset % ALIGN or offset < 0 or base + offset + rows * dtype.itemsize > len(buf):
+            raise WireFormatError(f'column {name!r}: data outside the payload or misaligned')
+        data = np.frombuffer(buf, dtype=dtype, count=rows, offset=base + offset)
+        if kind == 'ts':
+            data = data.view('datetime64[ms]')
+            zone = col.get('tz')
+            if zone == 'utc':
+                data = _utc_to_local(data)
+            elif zone is not None:
+                raise WireFormatError(f'column {name!r}: unknown tz {zone!r}')
+        elif kind == 'dict':
+            dictionary = col.get('dictionary')
+            if not isinstance(dictionary, list):
+                raise WireFormatError(f'column {name!r}: dict column without a dictionary')
+            try:
+                data = pd.Categorical.from_codes(data, categories=pd.Index(dictionary, dtype=object),
+                                                 validate=True)
+            except ValueError as exc:
+                raise WireFormatError(f'column {name!r}: {exc}') from None
+        columns[name] = data
+    return rows, columns
+
+
+def _utc_to_local(data: np.ndarray) -> np.ndarray:
+    """UTC instants as naive datetime64[ms] in this host's local time (what normalise_date gives)."""
+    local = pd.DatetimeIndex(data).tz_localize('UTC').tz_convert(tz.tzlocal()).tz_localize(None)
+    return local.to_numpy(dtype='datetime64[ms]')
+
+
+# ─────────────────────────────────────────────
+# 2. ENCODE
+# ─────────────────────────────────────────────
+def _as_wire_column(values):
+    """(type, data array, extra header fields) for a column of values."""
+    if isinstance(getattr(values, 'dtype', None), pd.DatetimeTZDtype):
+        # Timezone-aware: send the instants, flagged so the service converts them
+        ms = pd.DatetimeIndex(values).tz_convert('UTC').tz_localize(None).to_numpy(dtype='datetime64[ms]')
+        return 'ts', ms.view(np.int64).astype('<i8'), {'tz': 'utc'}
+    arr = values if isinstance(values, np.ndarray) else np.asarray(values)
+    if arr.dtype.kind == 'M':
+        ms = arr.astype('datetime64[ms]').view(np.int64)
+        return 'ts', ms.astype('<i8'), {}
+    if arr.dtype.kind in 'biu':
+        return 'i32', arr.astype('<i4'), {}
+    if arr.dtype.kind == 'f':
+        return 'f64', arr.astype('<f8'), {}
+    codes, uniques = pd.factorize(pd.Series(arr, dtype=object), use_na_sentinel=True)
+    return 'dict', codes.astype('<i4'), {'dictionary': [str(u) for u in uniques]}
+
+
+def encode_columns(columns: dict, rows: int = None) -> bytes:
+    """
+    Payload for {name: values}. Floats -> f64, integers/bools -> i32,
+    naive datetime64 -> ts (wall-clock), timezone-aware datetimes -> ts
+    with "tz": "utc", anything else dict-encoded as strings (None/NaN
+    -> missing).
+    """
+    encoded = [(name, *_as_wire_column(values)) for name, values in columns.items()]
+    if rows is None:
+        rows = len(encoded[0][2]) if encoded else 0
+    if any(len(data) != rows for _, _, data, _ in encoded):
+        raise WireFormatError('all columns must have the same number of rows')
+
+    entries, offset = [], 0
+    for name, kind, data, extra in encoded:
+        entries.append({'name': name, 'type': kind, 'offset': offset, **extra})
+        offset = _padded(offset + data.nbytes)
+    header = json.dumps({'rows': rows, 'columns': entries}, separators=(',', ':')).encode()
+
+    base = _padded(8 + len(header))
+    out  = bytearray(base + offset)
+    out[:4] = MAGIC
+    struct.pack_into('<I', out, 4, len(header))
+    out[8:8 + len(header)] = header
+    for (_, _, data, _), entry in zip(encoded, entries):
+        start = base + entry['offset']
+        out[start:start + data.nbytes] = data.tobytes()
+    return bytes(out)
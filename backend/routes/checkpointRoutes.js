@@ -4,11 +4,39 @@ const Checkpoint = require('../models/Checkpoint');
 const Alert = require('../models/Alert');
 const Batch = require('../models/Batch');
 const auth = require('../middleware/authMiddleware');
+const axios = require('axios');
+
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://127.0.0.1:8000';
+
+// Feed the scan to the fraud service's per-batch trajectory state.
+// Fire-and-forget: callers do not await it, so recording a checkpoint never
+// waits on the fraud service, and failures are only logged.
+async function sendTrajectoryEvent(checkpoint) {
+  try {
+    await axios.post(
+      `${AI_SERVICE_URL}/checkpoint_event`,
+      {
+        batchId: checkpoint.batchId,
+        location: {
+          latitude: checkpoint.location.latitude,
+          longitude: checkpoint.location.longitude,
+          accuracy: checkpoint.location.accuracy,
+        },
+        timestamp: checkpoint.timestamp.toISOString(),
+        scannerRole: checkpoint.scannerRole,
+        temperature: checkpoint.temperature,
+      },
+      { timeout: 2000 }
+    );
+  } catch (err) {
+    console.error('[Checkpoint] Trajectory update failed:', err.message);
+  }
+}
 
 // POST / — record a new checkpoint
 router.post('/', auth, async (req, res) => {
   try {
-    const { batchId, location, timestamp, scannerRole } = req.body;
+    const { batchId, location, timestamp, scannerRole, temperature } = req.body;
 
     if (!batchId) {
       return res.status(400).json({ error: 'batchId is required' });
@@ -19,8 +47,9 @@ router.post('/', auth, async (req, res) => {
       return res.status(404).json({ error: `Batch not found: ${batchId}` });
     }
 
-    const checkpoint = new Checkpoint({ batchId, location, timestamp, scannerRole });
+    const checkpoint = new Checkpoint({ batchId, location, timestamp, scannerRole, temperature });
     await checkpoint.save();
+    sendTrajectoryEvent(checkpoint);
 
     // Update batch checkpoint count and location
     await Batch.updateOne(
@@ -38,10 +67,10 @@ router.post('/', auth, async (req, res) => {
     let anomalyType = null;
     let anomalyDetails = null;
 
-    if (req.body.temperature > 10) {
+    if (temperature > 10) {
       anomalyDetected = true;
       anomalyType = 'Temperature Anomaly';
-      anomalyDetails = `Temperature ${req.body.temperature}°C exceeds safe threshold of 10°C.`;
+      anomalyDetails = `Temperature ${temperature}°C exceeds safe threshold of 10°C.`;
       await new Alert({ message: anomalyDetails, batchId, timestamp }).save();
     }
 
@@ -0,0 +1,199 @@
+// Columnar wire format for the fraud service's /predict_batch
+// (layout documented in backend/ai/wire_format.py). Records are sent as
+// one little-endian array per field instead of JSON objects, so the
+// service reads them with np.frombuffer and never parses date strings.
+const axios = require('axios');
+
+const AI_SERVICE_URL = process.env.AI_SERVICE_URL || 'http://127.0.0.1:8000';
+const CONTENT_TYPE = 'application/vnd.fraud.columnar';
+const MAGIC = Buffer.from('FWC1');
+const ALIGN = 8;
+const MISSING_TS = -(2n ** 63n);
+
+// PredictionInput field -> wire type
+const FIELDS = {
+  Quantity: 'f64',
+  Transport_Time: 'f64',
+  Checkpoint_Count: 'f64',
+  Price: 'f64',
+  Production_Date: 'ts',
+  Expiry_Date: 'ts',
+  Timestamp: 'ts',
+  Current_Status: 'dict',
+  Last_Location: 'dict',
+  Batch_ID: 'dict',
+  Distributor_ID: 'dict',
+};
+
+const ITEM_SIZE = { f64: 8, i32: 4, ts: 8, dict: 4 };
+
+const padded = (n) => Math.ceil(n / ALIGN) * ALIGN;
+
+const OFFSET = /(Z|[+-]\d\d:?\d\d)$/i;
+
+// The service reads a date without an offset as its own local wall-clock
+// time and converts one with an offset to it. A ts column holding any Date
+// or offset string is therefore sent as UTC instants flagged "tz": "utc";
+// a column of naive strings is sent as the wall-clock times they spell.
+function holdsInstants(values) {
+  return values.some((v) => v instanceof Date || (typeof v === 'string' && OFFSET.test(v.trim())));
+}
+
+// Epoch milliseconds of a Date or ISO string. In an instant column a naive
+// string is read in this process's local time (the service's, when both run
+// on one host); in a wall-clock column its reading is kept as if it were UTC.
+function toEpochMs(value, instants) {
+  if (value === undefined || value === null || value === '') return null;
+  if (value instanceof Date) return value.getTime();
+  let text = String(value).trim().replace(' ', 'T');
+  if (/^\d{4}-\d{2}-\d{2}$/.test(text)) text += 'T00:00:00';    // date-only strings would parse as UTC
+  if (!instants && !OFFSET.test(text)) text += 'Z';
+  const ms = Date.parse(text);
+  return Number.isNaN(ms) ? null : ms;
+}
+
+function encodeColumn(type, values) {
+  const n = values.length;
+  if (type === 'f64') {
+    const data = new Float64Array(n);
+    values.forEach((v, i) => { data[i] = v === undefined || v === null ? NaN : Number(v); });
+    return { data };
+  }
+  if (type === 'i32') {
+    return { data: Int32Array.from(values, (v) => v | 0) };
+  }
+  if (type === 'ts') {
+    const data = new BigInt64Array(n);
+    const instants = holdsInstants(values);
+    values.forEach((v, i) => {
+      const ms = toEpochMs(v, instants);
+      data[i] = ms === null ? MISSING_TS : BigInt(Math.trunc(ms));
+    });
+    return instants ? { data, tz: 'utc' } : { data };
+  }
+  // dict: each distinct string once, rows as int32 codes (-1 = missing)
+  const codes = new Int32Array(n);
+  const index = new Map();
+  const dictionary = [];
+  values.forEach((v, i) => {
+    if (v === undefined || v === null) { codes[i] = -1; return; }
+    const key = String(v);
+    let code = index.get(key);
+    if (code === undefined) {
+      code = dictionary.length;
+      index.set(key, code);
+      dictionary.push(key);
+    }
+    codes[i] = code;
+  });
+  return { data: codes, dictionary };
+}
+
+// columns: { name: { type: 'f64' | 'i32' | 'ts' | 'dict', values: [...] } }
+function encodeColumns(columns, rows) {
+  const encoded = Object.entries(columns).map(([name, { type, values }]) => {
+    if (values.length !== rows) throw new Error(`column ${name}: ${values.length} values for ${rows} rows`);
+    return { name, type, ...encodeColumn(type, values) };
+  });
+
+  let offset = 0;
+  const entries = encoded.map(({ name, type, data, dictionary, tz }) => {
+    const entry = { name, type, offset };
+    if (dictionary) entry.dictionary = dictionary;
+    if (tz) entry.tz = tz;
+    offset = padded(offset + data.byteLength);
+    return entry;
+  });
+  const header = Buffer.from(JSON.stringify({ rows, columns: entries }));
+  const base = padded(8 + header.length);
+
+  const out = Buffer.alloc(base + offset);
+  MAGIC.copy(out, 0);
+  out.writeUInt32LE(header.length, 4);
+  header.copy(out, 8);
+  encoded.forEach(({ data }, i) => {
+    Buffer.from(data.buffer, data.byteOffset, data.byteLength).copy(out, base + entries[i].offset);
+  });
+  return out;
+}
+
+// /predict_batch records (same shape as the JSON body's entries) -> payload.
+// Fields absent from every record are left out; the service applies the
+// PredictionInput defaults.
+function encodeRecords(records) {
+  const columns = {};
+  for (const [name, type] of Object.entries(FIELDS)) {
+    if (!records.some((r) => r[name] !== undefined)) continue;
+    columns[name] = { type, values: records.map((r) => r[name]) };
+  }
+  return encodeColumns(columns, records.length);
+}
+
+function decodeColumns(payload) {
+  let buf = Buffer.isBuffer(payload) ? payload : Buffer.from(payload);
+  if (buf.length < 8 || !buf.subarray(0, 4).equals(MAGIC)) throw new Error('not a columnar payload');
+  const headerLength = buf.readUInt32LE(4);
+  const { rows, columns } = JSON.parse(buf.toString('utf8', 8, 8 + headerLength));
+  const base = padded(8 + headerLength);
+  if (buf.byteOffset % ALIGN) buf = Buffer.from(buf);     // typed array views need aligned offsets
+
+  const out = {};
+  for (const { name, type, offset, dictionary, tz } of columns) {
+    const start = buf.byteOffset + base + offset;
+    if (base + offset + rows * ITEM_SIZE[type] > buf.length) throw new Error(`column ${name} runs past the payload`);
+    if (type === 'f64') {
+      out[name] = new Float64Array(buf.buffer, start, rows);
+    } else if (type === 'i32') {
+      out[name] = new Int32Array(buf.buffer, start, rows);
+    } else if (type === 'ts') {
+      // Instants as Dates; wall-clock times as naive ISO strings, like JSON dates
+      const ms = new BigInt64Array(buf.buffer, start, rows);
+      const toValue = tz === 'utc'
+        ? (v) => new Date(Number(v))
+        : (v) => new Date(Number(v)).toISOString().slice(0, -1);
+      out[name] = Array.from(ms, (v) => (v === MISSING_TS ? null : toValue(v)));
+    } else {
+      const codes = new Int32Array(buf.buffer, start, rows);
+      out[name] = Array.from(codes, (c) => (c < 0 ? null : dictionary[c]));
+    }
+  }
+  return { rows, columns: out };
+}
+
+// Columnar /predict_batch response -> the JSON endpoint's "results" list
+function decodeResults(payload) {
+  const { rows, columns } = decodeColumns(payload);
+  const results = new Array(rows);
+  for (let i = 0; i < rows; i += 1) {
+    results[i] = columns.fraud_prediction[i] < 0
+      ? { index: i, error: JSON.parse(columns.error[i]) }
+      : {
+        index: i,
+        fraud_prediction: columns.fraud_prediction[i],
+        fraud_probability: columns.fraud_probability[i],
+        alert_level: columns.alert_level[i],
+        fraud_types: columns.fraud_types[i].split(', '),
+      };
+  }
+  return results;
+}
+
+// Score records through the columnar /predict_batch; resolves to the results list
+async function scoreBatch(records, { timeout = 30000 } = {}) {
+  const { data } = await axios.post(`${AI_SERVICE_URL}/predict_batch`, encodeRecords(records), {
+    headers: { 'Content-Type': CONTENT_TYPE },
+    responseType: 'arraybuffer',
+    timeout,
+  });
+  return decodeResults(Buffer.from(data));
+}
+
+module.exports = {
+  CONTENT_TYPE,
+  FIELDS,
+  encodeColumns,
+  encodeRecords,
+  decodeColumns,
+  decodeResults,
+  scoreBatch,
+};